@@ -1,9 +1,17 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, jsonify
 from . import admin_bp
 from models.product import Product
 from models.user import User
-from database import get_db_connection
+from database import get_db_connection, pool_stats
 from services.reports import ReportService
+from services.catalog_cache import catalog_cache
+from services.cart_store import cart_writer
+from services.loyalty import balance_cache
+from services.jobs import job_queue_stats
+from services.stock import stock_stats
+from services.bidding import bid_engine
+from services.auction_maintainer import auction_stats
+from services.auction_events import auction_events
 from functools import wraps
 
 def admin_required(f):
@@ -99,6 +107,8 @@ def add_product():
         # optional daily rate for rentals
         dr_raw = (request.form.get('daily_rate') or '').strip()
         daily_rate = float(dr_raw) if dr_raw else None
+        stock_raw = (request.form.get('stock') or '').strip()
+        stock = max(0, int(stock_raw)) if stock_raw else None
 
         # Enforce tech-only categories
         if (category or '').lower() not in ALLOWED_CATEGORIES:
@@ -113,6 +123,7 @@ def add_product():
             photo=photo,
             seller_id=session['user_id'],
             daily_rate=daily_rate,
+            stock=stock,
         )
         product.save()
         flash('Product added successfully!', 'success')
@@ -124,7 +135,7 @@ def add_product():
 @admin_required
 def edit_product(product_id):
     """Edit product"""
-    product = Product.get_by_id(product_id)
+    product = Product.get_by_id(product_id, 'admin')
     if not product:
         flash('Product not found.', 'error')
         return redirect(url_for('admin.admin_products'))
@@ -136,6 +147,7 @@ def edit_product(product_id):
             return redirect(url_for('admin.edit_product', product_id=product_id))
         dr_raw = (request.form.get('daily_rate') or '').strip()
         daily_rate = float(dr_raw) if dr_raw else None
+        stock_raw = (request.form.get('stock') or '').strip()
         product_obj = Product(
             product_id=product_id,
             title=request.form['title'],
@@ -145,6 +157,7 @@ def edit_product(product_id):
             photo=request.form['photo'],
             status=request.form.get('status', product.get('Status', 'available')),
             daily_rate=daily_rate,
+            stock=max(0, int(stock_raw)) if stock_raw else None,
         )
         product_obj.save()
         flash('Product updated successfully!', 'success')
@@ -167,6 +180,36 @@ def manage_users():
     users = User.get_all()
     return render_template('admin/users.html', users=users)
 
+# monitoring counters served as JSON at /admin/stats/<name>:
+# - db: connection pool (wait time, in-use, created...)
+# - cache: product catalog cache hits / misses
+# - cart: session cart write-through (queued changes, flushes, errors)
+# - loyalty: loyalty balance cache
+# - jobs: background job queue depth per status, oldest due job, latency per job kind
+# - stock: stock reservations (holds, rejections, checkouts blocked from overselling, sweeps)
+# - bids: accepted / rejected bids and average bid latency
+# - auctions: active auctions cache and the last maintenance run
+# - events: live auction stream listeners and events
+STATS = {
+    'db': pool_stats,
+    'cache': catalog_cache.stats,
+    'cart': cart_writer.stats,
+    'loyalty': balance_cache.stats,
+    'jobs': job_queue_stats,
+    'stock': stock_stats,
+    'bids': bid_engine.stats,
+    'auctions': auction_stats,
+    'events': auction_events.stats,
+}
+
+@admin_bp.route('/stats/<name>')
+@admin_required
+def stats(name):
+    """One set of monitoring counters as JSON"""
+    if name not in STATS:
+        return jsonify({'error': 'not_found', 'message': f'No stats named {name}', 'available': sorted(STATS)}), 404
+    return jsonify(STATS[name]())
+
 @admin_bp.route('/reports')
 @admin_required
 def reports():
@@ -1,15 +1,35 @@
 # import all the libraries we need to build our thrift tech website
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from user.routes import user_bp
 from admin import admin_bp
-from database import get_db_connection 
-from models.product import Product
+from database import get_db_connection, init_connection_config, insert_returning_id, SqlExpr
+from models.product import Product, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from models.auction import Auction
+from migrations import run_migrations, ensure_schema
+from services.catalog_cache import catalog_cache
+from services.jobs import job_worker
+from services.stock import StockService
+from services.auction_maintainer import schedule_maintenance
+from services.auction_events import auction_events, sse_stream
+from models.rows import Record
 import os
+import hashlib
+from datetime import timezone
 from werkzeug.security import generate_password_hash
 
+# models hand back compact Record rows; serialize them like the dicts they replace
+class RecordJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o._asdict()
+        return DefaultJSONProvider.default(o)
+
+
 # create our main flask app instance that will handle all requests
 app = Flask(__name__)   
+app.json = RecordJSONProvider(app)
 
 # set up basic app settings like secret key for sessions and debug mode
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
@@ -90,13 +110,10 @@ def _ensure_admin_user():
         else:
             # no user found, create a brand new admin with default password
             pwd_hash = generate_password_hash('Admin@123')
-            cursor.execute(
-                """
-                INSERT INTO Users (FullName, Username, PasswordHash, Email, Role)
-                VALUES (?, ?, ?, ?, 'admin')
-                """,
-                ('Administrator', 'admin', pwd_hash, admin_email)
-            )
+            insert_returning_id(cursor, 'Users', {
+                'FullName': 'Administrator', 'Username': 'admin', 'PasswordHash': pwd_hash,
+                'Email': admin_email, 'Role': 'admin',
+            }, 'UserId')
         conn.commit()
         conn.close()
     except Exception as e:
@@ -108,64 +125,211 @@ def _ensure_admin_user():
             pass
         print(f"Admin bootstrap skipped: {e}")
 
+# work out which database to talk to once, so requests never probe the filesystem
+_db_config = init_connection_config()
+print(f"Database: {_db_config.describe()}")
+
+# bring the schema up to date once, instead of running DDL checks on every request
+try:
+    _applied = run_migrations()
+    if _applied:
+        print(f"Applied schema migrations: {_applied}")
+except Exception as e:
+    # the _ensure_* helpers will retry on first use
+    print(f"Schema migrations skipped: {e}")
+
 # run the admin setup when the app starts
 _ensure_admin_user()
 
+# background job threads (earned points, invoice emails, low stock checks); set
+# THRIFTTECH_JOB_THREADS=0 when scripts/job_worker.py runs them in a separate process
+if job_worker.threads > 0:
+    job_worker.start()
+
+# first expired-reservation sweep; each sweep job queues the next one
+try:
+    StockService.schedule_sweep()
+except Exception as e:
+    print(f"Stock reservation sweep not scheduled: {e}")
+
+# auction upkeep runs once now and then every few minutes (see services/auction_maintainer.py)
+try:
+    schedule_maintenance(now=True)
+except Exception as e:
+    print(f"Auction maintenance not scheduled: {e}")
+
+# default page size for the product api (clients can ask for up to MAX_PAGE_SIZE)
+API_PAGE_SIZE = 50
+
+# shared catalog query for the product page and the api: tech items only, rentals excluded
+# (the page renders the 'list' projection, the api keeps returning full 'detail' rows)
+def _catalog_query(category, sort_by, order, projection='list'):
+    query = (
+        Product.query(projection)
+        .in_categories(TECH_CATEGORIES)
+        .exclude_categories(RENTAL_CATEGORIES)  # rentals have their own page
+        .order_by(sort_by, order)
+    )
+    # if user wants specific category, narrow down to just those items
+    if category:
+        query.category(category)
+    return query
+
+API_SERVICE_INFO = {
+    'endpoint': '/api/products',
+    'description': 'ThriftTech Product Catalog API',
+    'version': '1.0'
+}
+
+# rows fetched from the database cursor per streamed chunk
+STREAM_BATCH_SIZE = 500
+
+def _requested_stream_format():
+    """'ndjson', 'json' or None depending on ?format= / ?stream= / Accept"""
+    if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in (request.headers.get('Accept', '') or ''):
+        return 'ndjson'
+    if (request.args.get('stream') or '').lower() in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+def _stream_products(query, stream_format, filters):
+    """
+    stream the catalog straight from a database cursor, one fetchmany batch at a time,
+    so memory stays flat however big the catalog gets
+    """
+    dumps = app.json.dumps
+
+    def generate_ndjson():
+        # one product per line
+        for batch in query.iter_batches(STREAM_BATCH_SIZE):
+            yield ''.join(dumps(p) + '\n' for p in batch)
+
+    def generate_json():
+        # same envelope as the paged api, but success/count come last because we
+        # only know them once every row has been sent
+        yield '{"products": ['
+        count = 0
+        try:
+            for batch in query.iter_batches(STREAM_BATCH_SIZE):
+                chunk = ','.join(dumps(p) for p in batch)
+                yield (',' if count else '') + chunk
+                count += len(batch)
+        except Exception as e:
+            # headers are already sent, so report the failure inside the body
+            yield '], "success": false, "error": ' + dumps(str(e)) + ', "message": "Failed to retrieve products"}'
+            return
+        yield '], "success": true, "count": %d, "filters": %s, "service_info": %s}' % (
+            count, dumps(filters), dumps(API_SERVICE_INFO))
+
+    if stream_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
+# conditional GET helpers: list pages are validated by (row count, max UpdatedAt),
+# the detail page by the product's UpdatedAt, so an unchanged page costs one small query
+def _make_etag(*parts):
+    raw = '|'.join(str(p) for p in parts)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+def _as_http_date(value):
+    if value is None:
+        return None
+    # UpdatedAt is a naive datetime; http dates have whole seconds only
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+def _not_modified(etag, last_modified):
+    """Return a 304 response if the client's copy is current, else None."""
+    # pending flash messages must be rendered, never answered with a cached page
+    if '_flashes' in session:
+        return None
+    last_modified = _as_http_date(last_modified)
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return _add_validators(Response(status=304), etag, last_modified)
+
+def _add_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_http_date(last_modified)
+    # clients must revalidate, and html bodies depend on the login cookie
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def _session_tag():
+    # html pages show who is logged in, so their tags must differ per user
+    return f"{session.get('user_id')}:{session.get('role')}"
+
 # create an api endpoint that other apps can use to get our product data
 @app.route('/api/products', methods=['GET'])
 def api_products():
     """
     api that returns product data as json so other websites can use our catalog
     lets people filter by category and sort the results different ways
+    pages with ?limit=&cursor=, or streams everything with ?stream=1 (json) / ?format=ndjson
     """
     try:
         # get filter and sort options from the url parameters
         category = request.args.get('category', '')
         sort_by = request.args.get('sort', 'Title')  
         order = request.args.get('order', 'asc')    
+        filters = {'category': category, 'sort_by': sort_by, 'order': order}
         
-        # get all products but only include tech items and exclude rentals
-        products = Product.get_all()
-        products = [
-            p for p in products
-            if p.get('Category', '').lower() in TECH_CATEGORIES
-            and p.get('Category', '').lower() not in RENTAL_CATEGORIES  # rentals don't belong in general product api
-        ]
+        # cheap aggregate first: if nothing changed since the client's copy, answer 304
+        row_count, last_modified = _catalog_query(category, sort_by, order, 'detail').freshness()
+        etag = _make_etag('api', row_count, last_modified, request.full_path)
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
         
-        # if user wants specific category, filter down to just those items
-        if category:
-            products = [
-                p for p in products
-                if p.get('Category', '').lower() == category.lower()
-            ]
+        # bulk consumers can stream the whole filtered catalog instead of paging through it
+        stream_format = _requested_stream_format()
+        if stream_format:
+            response = _stream_products(_catalog_query(category, sort_by, order, 'detail'), stream_format, filters)
+            return _add_validators(response, etag, last_modified)
         
-        # sort the products based on what user requested
-        reverse_order = (order.lower() == 'desc')
-        if sort_by == 'Price':
-            products.sort(key=lambda x: float(x.get('Price', 0)), reverse=reverse_order)
-        elif sort_by == 'Category':
-            products.sort(key=lambda x: x.get('Category', ''), reverse=reverse_order)
-        else:  # default to sorting by title
-            products.sort(key=lambda x: x.get('Title', ''), reverse=reverse_order)
+        cursor = request.args.get('cursor') or None
+        try:
+            limit = int(request.args.get('limit', API_PAGE_SIZE))
+        except ValueError:
+            limit = API_PAGE_SIZE
+        
+        # filtering, sorting and keyset paging run in sql: tech items only, rentals excluded
+        query = _catalog_query(category, sort_by, order, 'detail')
+        try:
+            products, next_cursor, prev_cursor = query.cached_page(cursor, limit)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'invalid_cursor',
+                'message': 'The cursor is not valid for this listing'
+            }), 400
         
         # package up the response with useful info for api users
         response_data = {
             'success': True,
             'count': len(products),
+            'total_estimate': query.estimate_count(),
             'products': products,
-            'filters': {
-                'category': category,
-                'sort_by': sort_by,
-                'order': order
+            'pagination': {
+                'limit': max(1, min(MAX_PAGE_SIZE, limit)),
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             },
-            'service_info': {
-                'endpoint': '/api/products',
-                'description': 'ThriftTech Product Catalog API',
-                'version': '1.0'
-            }
+            'filters': filters,
+            'service_info': API_SERVICE_INFO
         }
         
-        return jsonify(response_data)
+        return _add_validators(jsonify(response_data), etag, last_modified)
         
     except Exception as e:
         # if something breaks, return error message instead of crashing
@@ -180,7 +344,7 @@ def api_products():
 def home(): 
     """grab some products to display on the home page"""
     # get all products but only show tech items, not rental stuff
-    products = Product.get_all()
+    products = Product.get_all_cached()
     products = [
         p for p in products
         if p.get('Category', '').lower() in TECH_CATEGORIES
@@ -197,36 +361,42 @@ def product_catalog():
     sort_by = request.args.get('sort', 'title') 
     order = request.args.get('order', 'asc')    
     
-    # get products either by specific category or all products
-    if category:
-        products = Product.get_by_category(category)
-    else:
-        products = Product.get_all()
-
-    # filter to only tech products and exclude rental items
-    products = [
-        p for p in products
-        if p.get('Category', '').lower() in TECH_CATEGORIES
-        and p.get('Category', '').lower() not in RENTAL_CATEGORIES  # exclude rentals from catalog
-    ]
+    cursor = request.args.get('cursor') or None
+    
+    # filter to tech products (no rentals), sort and page inside the database
+    query = _catalog_query(category, sort_by, order)
     
-    # sort the products based on what the user requested
-    reverse = (order == 'desc')
-    if sort_by == 'price':
-        products.sort(key=lambda x: x['Price'], reverse=reverse)
-    elif sort_by == 'title':
-        products.sort(key=lambda x: x['Title'], reverse=reverse)
-    elif sort_by == 'category':
-        products.sort(key=lambda x: x['Category'], reverse=reverse)
+    # skip the render entirely if the browser's copy is still current
+    row_count, last_modified = query.freshness()
+    etag = _make_etag('catalog', row_count, last_modified, request.full_path, _session_tag())
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    try:
+        products, next_cursor, prev_cursor = query.cached_page(cursor, DEFAULT_PAGE_SIZE)
+    except ValueError:
+        # stale or tampered cursor, just show the first page
+        products, next_cursor, prev_cursor = query.cached_page(None, DEFAULT_PAGE_SIZE)
     
     # send the filtered and sorted products to the template
-    return render_template('product.html', products=products, 
-                         current_category=category, sort_by=sort_by, order=order)
+    html = render_template('product.html', products=products, 
+                         current_category=category, sort_by=sort_by, order=order,
+                         next_cursor=next_cursor, prev_cursor=prev_cursor,
+                         total_estimate=query.estimate_count())
+    return _add_validators(app.make_response(html), etag, last_modified)
 
 # individual product page where people can see details and add to cart
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
     """show detailed info for one specific product"""
+    # the row's UpdatedAt validates the page (plus the catalog version for the recommendations)
+    exists, last_modified = Product.get_updated_at(product_id)
+    etag = _make_etag('detail', product_id, last_modified, catalog_cache.version, _session_tag())
+    if exists:
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+    
     # look up the product by its id number
     product = Product.get_by_id(product_id)
     if not product:
@@ -240,24 +410,17 @@ def product_detail(product_id):
         if p['ProductId'] != product_id and p.get('Category', '').lower() in TECH_CATEGORIES
     ][:4]  # only show 4 recommendations max
     
-    return render_template('product_detail.html', product=product, recommendations=recommendations)
+    html = render_template('product_detail.html', product=product, recommendations=recommendations)
+    return _add_validators(app.make_response(html), etag, last_modified)
 
 # shopping cart page where users can see what they want to buy
 @app.route('/cart')
 def cart():
-    """show the user's shopping cart with all items and totals"""
-    # make sure user is logged in before showing their cart
-    if 'user_id' not in session:
-        flash('Please log in to view your cart', 'error')
-        return redirect(url_for('user.login'))
-    
-    from models.cart import Cart
-    from services.transaction import TransactionService
-    # get all items in this user's cart
-    cart_items = Cart.get_user_cart(session['user_id'])
-    
-    # calculate totals including taxes, discounts, shipping etc
-    totals = TransactionService.calculate_cart_totals(cart_items, session['user_id'])
+    """show the visitor's shopping cart with all items and totals"""
+    from services.cart_store import CartStore
+    # the cart lives in the session (anonymous visitors have one too), products come from the
+    # catalog cache; totals (taxes, discounts, shipping) need at most the loyalty balance query
+    cart_items, totals = CartStore(session).summary()
     
     return render_template('cart.html', cart_items=cart_items, totals=totals)
 
@@ -320,33 +483,8 @@ def sell():
 
 # helper function to make sure rental database table exists
 def _ensure_rental_schema_exists():
-    """create the rentals table if it doesn't exist yet"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            IF OBJECT_ID('dbo.Rentals', 'U') IS NULL
-            BEGIN
-                CREATE TABLE Rentals (
-                    RentalId INT IDENTITY(1,1) PRIMARY KEY,
-                    ProductId INT NOT NULL,
-                    UserId INT NOT NULL,
-                    StartDate DATE NOT NULL,
-                    EndDate DATE NOT NULL,
-                    DailyRate DECIMAL(10,2) NOT NULL,
-                    TotalCost DECIMAL(10,2) NOT NULL,
-                    Status NVARCHAR(20) DEFAULT 'active',
-                    CreatedAt DATETIME DEFAULT GETDATE(),
-                    FOREIGN KEY (ProductId) REFERENCES Products(ProductId),
-                    FOREIGN KEY (UserId) REFERENCES Users(UserId)
-                )
-            END
-            """
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    """create the rentals table if it doesn't exist yet (no-op once migrations have run)"""
+    ensure_schema()
 
 @app.route('/rent', methods=['GET', 'POST'])
 def rent():
@@ -371,7 +509,7 @@ def rent():
                 return redirect(url_for('rent'))
 
             # Look up product to determine authoritative daily rate
-            pr = Product.get_by_id(product_id)
+            pr = Product.get_by_id(product_id, 'list')
             if not pr:
                 flash('Product not found for rental.', 'error')
                 return redirect(url_for('rent'))
@@ -395,13 +533,10 @@ def rent():
             _ensure_rental_schema_exists()
             conn = get_db_connection()
             cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO Rentals (ProductId, UserId, StartDate, EndDate, DailyRate, TotalCost, Status)
-                VALUES (?, ?, ?, ?, ?, ?, 'active')
-                """,
-                (product_id, session['user_id'], start_date, end_date, daily_rate, total),
-            )
+            insert_returning_id(cur, 'Rentals', {
+                'ProductId': product_id, 'UserId': session['user_id'], 'StartDate': start_date,
+                'EndDate': end_date, 'DailyRate': daily_rate, 'TotalCost': total, 'Status': 'active',
+            }, 'RentalId')
             conn.commit()
             conn.close()
             flash(f'Rental confirmed for {days} day(s). Total: R{total:.2f}', 'success')
@@ -419,7 +554,7 @@ def rent():
             return redirect(url_for('rent'))
 
     # Build available rentals list
-    products = Product.get_all()
+    products = Product.get_all_cached()
     rentals = []
     for p in products:
         cat = (p.get('Category') or '').lower()
@@ -474,15 +609,27 @@ def rent():
 @app.route('/auction', methods=['GET'])
 def auction():
     """Auction page"""
-    # show active auctions
-    try:
-        Auction.seed_sample_auctions(6)
-    except Exception:
-        pass
+    # show active auctions (cached; the auction maintainer job opens and closes them)
     auctions = Auction.get_active_auctions()
     return render_template('auction.html', active_auctions=auctions)
 
 
+# live bids and closes for the auction page (server-sent events). listeners wait on
+# the in-process event bus, so an open stream costs no database queries
+@app.route('/auction/stream')
+def auction_stream():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    return Response(
+        stream_with_context(sse_stream(auction_events, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @app.route('/auction/bid', methods=['POST'])
 def auction_bid():
     if 'user_id' not in session:
@@ -503,31 +650,8 @@ def auction_bid():
     return redirect(url_for('auction'))
 
 def _ensure_repair_schema_exists():
-    """Create RepairServices table if it doesn't exist (idempotent)."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            IF OBJECT_ID('dbo.RepairServices', 'U') IS NULL
-            BEGIN
-                CREATE TABLE RepairServices (
-                    ServiceId INT IDENTITY(1,1) PRIMARY KEY,
-                    UserId INT NOT NULL,
-                    DeviceType NVARCHAR(100) NOT NULL,
-                    IssueDescription NVARCHAR(MAX) NOT NULL,
-                    EstimatedCost DECIMAL(10,2),
-                    Status NVARCHAR(20) DEFAULT 'submitted',
-                    SubmittedAt DATETIME DEFAULT GETDATE(),
-                    CompletedAt DATETIME,
-                    FOREIGN KEY (UserId) REFERENCES Users(UserId)
-                )
-            END
-            """
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    """Create RepairServices table if it doesn't exist (no-op once migrations have run)."""
+    ensure_schema()
 
 @app.route('/repair', methods=['GET', 'POST'])
 def repair():
@@ -548,13 +672,10 @@ def repair():
             _ensure_repair_schema_exists()
             conn = get_db_connection()
             cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO RepairServices (UserId, DeviceType, IssueDescription, Status, SubmittedAt)
-                VALUES (?, ?, ?, 'submitted', GETDATE())
-                """,
-                (session['user_id'], device_type, issue_description)
-            )
+            insert_returning_id(cursor, 'RepairServices', {
+                'UserId': session['user_id'], 'DeviceType': device_type, 'IssueDescription': issue_description,
+                'Status': 'submitted', 'SubmittedAt': SqlExpr('GETDATE()'),
+            }, 'ServiceId')
             conn.commit()
             conn.close()
             flash('Your repair request has been submitted. We\'ll notify you with updates.', 'success')
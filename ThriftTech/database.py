@@ -1,19 +1,40 @@
 # import the libraries we need to connect to sql server database
 import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
 import pyodbc
 
-def get_db_connection():
+
+class ConnectionConfig:
     """
     figure out how to connect to our database using different methods
     tries environment variables first, then local files, then default database
     this makes it easy for different people to run the project on their computers
+
+    the answer is worked out once (at app startup) and cached in `dsn`,
+    call reload() after changing THRIFTTECH_SQLSERVER_CONN / THRIFTTECH_MDF_PATH
     """
 
-    # first check if someone set a custom connection string in environment variables
-    conn_str = os.getenv('THRIFTTECH_SQLSERVER_CONN')
+    def __init__(self):
+        self.dsn = None
+        # where the dsn came from: 'env', 'mdf' or 'default'
+        self.source = None
+        # the .mdf file we attached to (only set when source == 'mdf')
+        self.mdf_path = None
+        # every .mdf location we looked at, in order
+        self.candidate_paths = []
+        self.resolved_at = None
+        self.reload()
+
+    def reload(self):
+        """Re-read the environment and probe the .mdf candidates again."""
+        dsn, source, mdf_path = None, None, None
 
-    # if no custom connection, try to find a database file in the project folder
-    if not conn_str:
+        # first check if someone set a custom connection string in environment variables
+        env_conn = os.getenv('THRIFTTECH_SQLSERVER_CONN')
         # let people override where the database file is located
         mdf_override = os.getenv('THRIFTTECH_MDF_PATH')
         project_root = os.path.dirname(os.path.abspath(__file__))
@@ -25,26 +46,469 @@ def get_db_connection():
         # or maybe it's in a db subfolder
         candidate_paths.append(os.path.join(project_root, 'db', 'TTDb.mdf'))
 
-        # check each possible location for the database file
-        for mdf_path in candidate_paths:
-            if os.path.exists(mdf_path):
-                # found a database file, so connect directly to it
-                conn_str = (
-                    r'DRIVER={ODBC Driver 17 for SQL Server};'
-                    r'SERVER=(localdb)\MSSQLLocalDB;'
-                    f'AttachDbFilename={mdf_path};'
-                    r'Trusted_Connection=yes;'
+        if env_conn:
+            dsn, source = env_conn, 'env'
+        else:
+            # check each possible location for the database file
+            for path in candidate_paths:
+                if os.path.exists(path):
+                    # found a database file, so connect directly to it
+                    dsn = (
+                        r'DRIVER={ODBC Driver 17 for SQL Server};'
+                        r'SERVER=(localdb)\MSSQLLocalDB;'
+                        f'AttachDbFilename={path};'
+                        r'Trusted_Connection=yes;'
+                    )
+                    source, mdf_path = 'mdf', path
+                    break
+
+        # if we still don't have a connection, use the default database name
+        if not dsn:
+            dsn = (
+                r'DRIVER={ODBC Driver 17 for SQL Server};'
+                r'SERVER=(localdb)\MSSQLLocalDB;'
+                r'DATABASE=TTDb;'
+                r'Trusted_Connection=yes;'
+            )
+            source = 'default'
+
+        self.dsn = dsn
+        self.source = source
+        self.mdf_path = mdf_path
+        self.candidate_paths = candidate_paths
+        self.resolved_at = time.time()
+        return self
+
+    def describe(self):
+        """Human readable summary of the chosen connection (no secrets from env strings)."""
+        if self.source == 'mdf':
+            return f'attached .mdf at {self.mdf_path}'
+        if self.source == 'env':
+            return 'connection string from THRIFTTECH_SQLSERVER_CONN'
+        return 'default LocalDB database TTDb (no .mdf found in ' + ', '.join(self.candidate_paths) + ')'
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_connection_config():
+    """Return the cached connection config, resolving it on first use."""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = ConnectionConfig()
+    return _config
+
+
+def init_connection_config():
+    """Resolve the connection config at startup (safe to call more than once)."""
+    return get_connection_config()
+
+
+def reload_connection_config():
+    """Re-resolve the dsn and drop idle pooled connections so new ones use it."""
+    config = get_connection_config()
+    with _config_lock:
+        config.reload()
+    if _pool is not None:
+        # connections currently in use keep their old target until they are returned and evicted
+        _pool.close_all()
+    return config
+
+
+def _open_raw_connection():
+    """Open a brand-new pyodbc connection (used by the pool to create connections)."""
+    return pyodbc.connect(get_connection_config().dsn)
+
+
+# sqlite stand-in for pyodbc so the pool (and models) can be exercised without sql server
+class SqliteRow(tuple):
+    """Row that behaves like pyodbc.Row: index access plus attribute access by column name."""
+
+    __slots__ = ()
+    _columns = {}
+
+    def __getattr__(self, name):
+        try:
+            return self[self._columns[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _sqlite_row_factory(cursor, values):
+    # build one row class per result shape and reuse it for every row of the cursor
+    columns = {d[0]: i for i, d in enumerate(cursor.description)}
+    row_cls = _ROW_CLASSES.get(tuple(columns))
+    if row_cls is None:
+        row_cls = type('SqliteRow', (SqliteRow,), {'__slots__': (), '_columns': columns})
+        _ROW_CLASSES[tuple(columns)] = row_cls
+    return row_cls(values)
+
+
+_ROW_CLASSES = {}
+
+
+def sqlite_connect(path=':memory:'):
+    """Open a sqlite3 connection that returns pyodbc-style rows (local stand-in for tests)."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = _sqlite_row_factory
+    return conn
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the checkout timeout."""
+
+
+class PooledConnection:
+    """
+    thin wrapper around a real connection handed out by the pool
+    close() gives the connection back to the pool instead of closing the socket,
+    so existing code that does conn.close() (and the g.db_conn teardown) keeps working
+    """
+
+    def __init__(self, pool, raw, generation=0):
+        self._pool = pool
+        self._raw = raw
+        self._generation = generation
+        self._returned = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def close(self):
+        if not self._returned:
+            self._returned = True
+            self._pool.release(self._raw, self._generation)
+
+    def __getattr__(self, name):
+        # cursor(), commit(), rollback(), autocommit... all go to the real connection
+        if self._returned:
+            # the raw connection may already belong to another request
+            raise pyodbc.ProgrammingError('Attempt to use a closed connection.')
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # safety net for code paths that forget to close: hand the slot back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    bounded pool of reusable database connections
+    - at most max_size connections exist at once; extra callers wait up to `timeout` seconds
+    - idle connections are pinged before reuse if they sat idle longer than `ping_after`
+    - connections idle longer than `max_idle` are closed instead of reused
+    """
+
+    def __init__(self, connect=None, max_size=10, timeout=30.0, max_idle=300.0,
+                 ping_after=30.0, ping_sql='SELECT 1'):
+        self._connect = connect or _open_raw_connection
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.ping_sql = ping_sql
+        self._idle = []  # list of (raw_connection, returned_at) with most recent last
+        self._size = 0
+        # bumped by close_all(); connections from an older generation are closed when returned
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'evicted_idle': 0,
+            'failed_health_checks': 0,
+            'discarded': 0,
+        }
+
+    # pool bookkeeping
+
+    def _healthy(self, raw):
+        """Run the cheap ping query; returns False if the connection is dead."""
+        try:
+            cur = raw.cursor()
+            cur.execute(self.ping_sql)
+            cur.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _close_quietly(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _evict_idle_locked(self, now):
+        """Drop connections that have been idle too long (oldest are at the front)."""
+        evicted = []
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            raw, _ = self._idle.pop(0)
+            self._size -= 1
+            self._stats['evicted_idle'] += 1
+            evicted.append(raw)
+        return evicted
+
+    def acquire(self):
+        """Borrow a connection, waiting for a free slot if the pool is exhausted."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            candidate = None
+            create = False
+            with self._cond:
+                now = time.monotonic()
+                stale = self._evict_idle_locked(now)
+                if self._idle:
+                    candidate, returned_at = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(f'no database connection free after {self.timeout}s')
+                    waited = True
+                    self._cond.wait(remaining)
+            for raw in stale:
+                self._close_quietly(raw)
+
+            if create:
+                try:
+                    candidate = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif candidate is not None:
+                # health check on checkout, skipped for connections that were just returned
+                if now - returned_at > self.ping_after and not self._healthy(candidate):
+                    self._close_quietly(candidate)
+                    with self._cond:
+                        self._size -= 1
+                        self._stats['failed_health_checks'] += 1
+                    continue
+            else:
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+                if waited:
+                    elapsed = time.monotonic() - start
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_total'] += elapsed
+                    self._stats['wait_time_max'] = max(self._stats['wait_time_max'], elapsed)
+                generation = self._generation
+            return PooledConnection(self, candidate, generation)
+
+    def release(self, raw, generation=None):
+        """Return a connection; any uncommitted work is rolled back first."""
+        try:
+            if generation is not None and generation != self._generation:
+                raise LookupError('connection belongs to a retired pool generation')
+            raw.rollback()
+        except Exception:
+            # broken connection, don't hand it to anyone else
+            self._close_quietly(raw)
+            with self._cond:
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection (in-use ones are closed when returned)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._generation += 1
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        """Snapshot of pool counters for monitoring."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self._size
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = self._size - len(self._idle)
+            snapshot['max_size'] = self.max_size
+        checkouts_waited = snapshot['waits']
+        snapshot['wait_time_avg'] = (snapshot['wait_time_total'] / checkouts_waited) if checkouts_waited else 0.0
+        return snapshot
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    max_size=int(os.getenv('THRIFTTECH_POOL_SIZE', '10')),
+                    timeout=float(os.getenv('THRIFTTECH_POOL_TIMEOUT', '30')),
+                    max_idle=float(os.getenv('THRIFTTECH_POOL_MAX_IDLE', '300')),
                 )
-                break
-
-    # if we still don't have a connection, use the default database name
-    if not conn_str:
-        conn_str = (
-            r'DRIVER={ODBC Driver 17 for SQL Server};'
-            r'SERVER=(localdb)\MSSQLLocalDB;'
-            r'DATABASE=TTDb;'
-            r'Trusted_Connection=yes;'
-        )
-
-    # actually connect to the database and return the connection
-    return pyodbc.connect(conn_str)
\ No newline at end of file
+    return _pool
+
+
+def configure_pool(**kwargs):
+    """Replace the process-wide pool (e.g. ConnectionPool(connect=lambda: sqlite_connect(path)))."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(**kwargs)
+    if old is not None:
+        old.close_all()
+    return _pool
+
+
+def get_db_connection():
+    """
+    borrow a connection from the shared pool
+    callers still just call conn.close() when done, which hands it back to the pool
+    """
+    return get_pool().acquire()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+# bulk writes: one parameterized statement sent for many rows at once instead of a
+# round trip per row. with pyodbc, fast_executemany packs each chunk into a single
+# parameter array; sqlite (and any other driver) just uses its own executemany.
+# these never commit, so they run inside whatever transaction the caller is in
+BULK_CHUNK_SIZE = 1000
+
+
+def bulk_execute(cursor, sql, rows, chunk_size=BULK_CHUNK_SIZE):
+    """Run `sql` once per parameter tuple in `rows`, in chunks; returns the number of rows sent."""
+    rows = rows if isinstance(rows, list) else list(rows)
+    if not rows:
+        return 0
+    fast = getattr(cursor, 'fast_executemany', None)
+    if fast is not None:
+        cursor.fast_executemany = True
+    try:
+        for start in range(0, len(rows), chunk_size):
+            cursor.executemany(sql, rows[start:start + chunk_size])
+    finally:
+        if fast is not None:
+            cursor.fast_executemany = fast
+    return len(rows)
+
+
+def bulk_insert(cursor, table, columns, rows, chunk_size=BULK_CHUNK_SIZE):
+    """INSERT many rows into `table`; `rows` are tuples in the same order as `columns`."""
+    placeholders = ', '.join('?' for _ in columns)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    return bulk_execute(cursor, sql, rows, chunk_size)
+
+
+# single-row inserts that need the new key: OUTPUT ... INTO a table variable hands the
+# id back in the same batch, so there's no second round trip for @@IDENTITY (which
+# also returns the wrong id when a trigger inserts into another identity table).
+# INTO is what keeps OUTPUT legal on tables that have triggers.
+# a batch that turns SET NOCOUNT ON must turn it off again before it ends: the setting
+# lasts for the session, and the pool hands the session on to the next borrower, whose
+# cursor.rowcount would then always be -1
+
+
+class SqlExpr(str):
+    """A value passed to insert_returning_id as raw SQL (e.g. SqlExpr('GETDATE()'))."""
+
+
+def insert_returning_id(cursor, table, values, key):
+    """
+    INSERT one row ({column: value}) into `table` and return the new `key` value.
+    runs on the caller's cursor and doesn't commit.
+    """
+    columns = list(values)
+    slots, params = [], []
+    for column in columns:
+        value = values[column]
+        if isinstance(value, SqlExpr):
+            slots.append(value)
+        else:
+            slots.append('?')
+            params.append(value)
+    cursor.execute(
+        f"""
+        SET NOCOUNT ON
+        DECLARE @new_ids TABLE (Id BIGINT);
+        INSERT INTO {table} ({', '.join(columns)}) OUTPUT INSERTED.{key} INTO @new_ids (Id)
+        VALUES ({', '.join(slots)});
+        SELECT Id FROM @new_ids;
+        SET NOCOUNT OFF;
+        """,
+        params,
+    )
+    return int(cursor.fetchone()[0])
+
+
+# table shapes: which columns a table has, read from sys.columns once per process
+# instead of probing before every write. run_migrations() forgets them after applying
+# anything, so a column a migration adds is seen straight away
+
+
+class TableShape(frozenset):
+    """Lower-cased column names of a table; has() checks one case-insensitively."""
+
+    def has(self, column):
+        return column.lower() in self
+
+
+_table_shapes = {}
+_table_shapes_lock = threading.Lock()
+
+
+def table_shape(cursor, table):
+    """The TableShape of dbo.<table> (cached; empty and uncached if the table is missing)."""
+    shape = _table_shapes.get(table)
+    if shape is None:
+        cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?)", (f'dbo.{table}',))
+        shape = TableShape(row[0].lower() for row in cursor.fetchall())
+        if shape:
+            with _table_shapes_lock:
+                _table_shapes[table] = shape
+    return shape
+
+
+def forget_table_shapes():
+    with _table_shapes_lock:
+        _table_shapes.clear()
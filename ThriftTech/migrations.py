@@ -0,0 +1,453 @@
+# versioned schema migrations for the thrifttech database
+# each migration runs once, gets recorded in SchemaVersion, and never runs again.
+# the app runs them at startup (or use scripts/migrate.py), after that the old
+# per-request _ensure_*_exists helpers are no-ops.
+import threading
+
+from database import get_db_connection, forget_table_shapes
+
+
+# (version, name, sql) - append new migrations at the end, never edit applied ones
+MIGRATIONS = [
+    (1, 'cart table', """
+        IF OBJECT_ID('dbo.Cart', 'U') IS NULL
+        BEGIN
+            CREATE TABLE Cart (
+                CartId INT IDENTITY(1,1) PRIMARY KEY,
+                UserId INT NOT NULL,
+                ProductId INT NOT NULL,
+                Quantity INT DEFAULT 1,
+                AddedAt DATETIME DEFAULT GETDATE(),
+                FOREIGN KEY (UserId) REFERENCES Users(UserId),
+                FOREIGN KEY (ProductId) REFERENCES Products(ProductId)
+            )
+        END
+    """),
+    (2, 'orders, order items and invoices', """
+        IF OBJECT_ID('dbo.Orders', 'U') IS NULL
+        BEGIN
+            CREATE TABLE Orders (
+                OrderId INT IDENTITY(1,1) PRIMARY KEY,
+                UserId INT NOT NULL,
+                TotalAmount DECIMAL(10,2) NOT NULL,
+                TaxAmount DECIMAL(10,2) DEFAULT 0,
+                ShippingAmount DECIMAL(10,2) DEFAULT 0,
+                DiscountAmount DECIMAL(10,2) DEFAULT 0,
+                Status NVARCHAR(20) DEFAULT 'pending',
+                ShippingAddress NVARCHAR(MAX),
+                PaymentMethod NVARCHAR(50),
+                PaymentStatus NVARCHAR(20) DEFAULT 'pending',
+                FOREIGN KEY (UserId) REFERENCES Users(UserId)
+            )
+        END
+
+        IF OBJECT_ID('dbo.OrderItems', 'U') IS NULL
+        BEGIN
+            CREATE TABLE OrderItems (
+                OrderItemId INT IDENTITY(1,1) PRIMARY KEY,
+                OrderId INT NOT NULL,
+                ProductId INT NOT NULL,
+                Quantity INT NOT NULL,
+                Price DECIMAL(10,2) NOT NULL,
+                FOREIGN KEY (OrderId) REFERENCES Orders(OrderId),
+                FOREIGN KEY (ProductId) REFERENCES Products(ProductId)
+            )
+        END
+
+        IF OBJECT_ID('dbo.Invoices', 'U') IS NULL
+        BEGIN
+            CREATE TABLE Invoices (
+                InvoiceId INT IDENTITY(1,1) PRIMARY KEY,
+                UserId INT NOT NULL,
+                OrderId INT NOT NULL,
+                Total DECIMAL(10,2) NOT NULL,
+                CreatedAt DATETIME DEFAULT GETDATE(),
+                FOREIGN KEY (UserId) REFERENCES Users(UserId),
+                FOREIGN KEY (OrderId) REFERENCES Orders(OrderId)
+            )
+        END
+    """),
+    (3, 'loyalty points', """
+        IF OBJECT_ID('dbo.LoyaltyPoints', 'U') IS NULL
+        BEGIN
+            CREATE TABLE LoyaltyPoints (
+                UserId INT PRIMARY KEY,
+                Points INT DEFAULT 0,
+                FOREIGN KEY (UserId) REFERENCES Users(UserId)
+            )
+        END
+    """),
+    (4, 'rentals', """
+        IF OBJECT_ID('dbo.Rentals', 'U') IS NULL
+        BEGIN
+            CREATE TABLE Rentals (
+                RentalId INT IDENTITY(1,1) PRIMARY KEY,
+                ProductId INT NOT NULL,
+                UserId INT NOT NULL,
+                StartDate DATE NOT NULL,
+                EndDate DATE NOT NULL,
+                DailyRate DECIMAL(10,2) NOT NULL,
+                TotalCost DECIMAL(10,2) NOT NULL,
+                Status NVARCHAR(20) DEFAULT 'active',
+                CreatedAt DATETIME DEFAULT GETDATE(),
+                FOREIGN KEY (ProductId) REFERENCES Products(ProductId),
+                FOREIGN KEY (UserId) REFERENCES Users(UserId)
+            )
+        END
+    """),
+    (5, 'repair services', """
+        IF OBJECT_ID('dbo.RepairServices', 'U') IS NULL
+        BEGIN
+            CREATE TABLE RepairServices (
+                ServiceId INT IDENTITY(1,1) PRIMARY KEY,
+                UserId INT NOT NULL,
+                DeviceType NVARCHAR(100) NOT NULL,
+                IssueDescription NVARCHAR(MAX) NOT NULL,
+                EstimatedCost DECIMAL(10,2),
+                Status NVARCHAR(20) DEFAULT 'submitted',
+                SubmittedAt DATETIME DEFAULT GETDATE(),
+                CompletedAt DATETIME,
+                FOREIGN KEY (UserId) REFERENCES Users(UserId)
+            )
+        END
+    """),
+    (6, 'products daily rate', """
+        IF COL_LENGTH('dbo.Products', 'DailyRate') IS NULL
+        BEGIN
+            ALTER TABLE dbo.Products ADD DailyRate DECIMAL(10,2) NULL
+        END
+    """),
+    (7, 'auctions table and legacy columns', """
+        IF OBJECT_ID('dbo.Auctions', 'U') IS NULL
+        BEGIN
+            CREATE TABLE Auctions (
+                AuctionId INT IDENTITY(1,1) PRIMARY KEY,
+                ProductId INT NOT NULL,
+                StartingBid DECIMAL(10,2) NOT NULL,
+                CurrentBid DECIMAL(10,2),
+                HighestBidderId INT,
+                Photo NVARCHAR(500) NULL,
+                StartTime DATETIME NOT NULL,
+                EndTime DATETIME NOT NULL,
+                Status NVARCHAR(20) DEFAULT 'active',
+                CreatedAt DATETIME DEFAULT GETDATE(),
+                FOREIGN KEY (ProductId) REFERENCES Products(ProductId),
+                FOREIGN KEY (HighestBidderId) REFERENCES Users(UserId)
+            )
+        END
+
+        -- Add missing columns for older databases
+        IF OBJECT_ID('dbo.Auctions', 'U') IS NOT NULL
+        BEGIN
+            IF COL_LENGTH('dbo.Auctions', 'StartTime') IS NULL
+            BEGIN
+                ALTER TABLE dbo.Auctions ADD StartTime DATETIME CONSTRAINT DF_Auctions_StartTime DEFAULT GETDATE() WITH VALUES;
+                ALTER TABLE dbo.Auctions ALTER COLUMN StartTime DATETIME NOT NULL;
+            END
+
+            IF COL_LENGTH('dbo.Auctions', 'EndTime') IS NULL
+            BEGIN
+                ALTER TABLE dbo.Auctions ADD EndTime DATETIME CONSTRAINT DF_Auctions_EndTime DEFAULT (DATEADD(DAY, 3, GETDATE())) WITH VALUES;
+                ALTER TABLE dbo.Auctions ALTER COLUMN EndTime DATETIME NOT NULL;
+            END
+
+            IF COL_LENGTH('dbo.Auctions', 'Status') IS NULL
+            BEGIN
+                ALTER TABLE dbo.Auctions ADD Status NVARCHAR(20) CONSTRAINT DF_Auctions_Status DEFAULT 'active' WITH VALUES;
+                ALTER TABLE dbo.Auctions ALTER COLUMN Status NVARCHAR(20) NOT NULL;
+            END
+
+            -- Add Photo column for auction-specific images if missing
+            IF COL_LENGTH('dbo.Auctions', 'Photo') IS NULL
+            BEGIN
+                ALTER TABLE dbo.Auctions ADD Photo NVARCHAR(500) NULL;
+            END
+
+            -- Legacy columns: StartDate/EndDate (ensure defaults exist for inserts that don't set them)
+            IF COL_LENGTH('dbo.Auctions', 'StartDate') IS NOT NULL
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM sys.default_constraints dc
+                    JOIN sys.columns c ON c.default_object_id = dc.object_id
+                    WHERE dc.parent_object_id = OBJECT_ID('dbo.Auctions') AND c.name = 'StartDate'
+                )
+                BEGIN
+                    ALTER TABLE dbo.Auctions ADD CONSTRAINT DF_Auctions_StartDate DEFAULT (GETDATE()) FOR StartDate;
+                END
+            END
+            IF COL_LENGTH('dbo.Auctions', 'EndDate') IS NOT NULL
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM sys.default_constraints dc
+                    JOIN sys.columns c ON c.default_object_id = dc.object_id
+                    WHERE dc.parent_object_id = OBJECT_ID('dbo.Auctions') AND c.name = 'EndDate'
+                )
+                BEGIN
+                    ALTER TABLE dbo.Auctions ADD CONSTRAINT DF_Auctions_EndDate DEFAULT (DATEADD(DAY, 3, GETDATE())) FOR EndDate;
+                END
+            END
+        END
+    """),
+    (8, 'shared cache versions', """
+        IF OBJECT_ID('dbo.CacheVersions', 'U') IS NULL
+        BEGIN
+            CREATE TABLE CacheVersions (
+                Name NVARCHAR(50) PRIMARY KEY,
+                Version INT NOT NULL DEFAULT 0
+            )
+        END
+
+        IF NOT EXISTS (SELECT 1 FROM CacheVersions WHERE Name = 'catalog')
+        BEGIN
+            INSERT INTO CacheVersions (Name, Version) VALUES ('catalog', 0)
+        END
+    """),
+    (9, 'products category key', """
+        -- lower-cased category so case-insensitive filters can seek an index on any collation
+        IF COL_LENGTH('dbo.Products', 'CategoryKey') IS NULL
+        BEGIN
+            ALTER TABLE dbo.Products ADD CategoryKey AS LOWER(Category) PERSISTED
+        END
+    """),
+    # separate batch: sql server can't compile an index on a column added in the same batch
+    (10, 'catalog indexes', """
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Products_CategoryKey_Title' AND object_id = OBJECT_ID('dbo.Products'))
+        BEGIN
+            CREATE INDEX IX_Products_CategoryKey_Title ON dbo.Products (CategoryKey, Title, ProductId)
+                INCLUDE (Price, Category, Photo, DailyRate, Stock)
+        END
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Products_CategoryKey_Price' AND object_id = OBJECT_ID('dbo.Products'))
+        BEGIN
+            CREATE INDEX IX_Products_CategoryKey_Price ON dbo.Products (CategoryKey, Price, ProductId)
+                INCLUDE (Title, Category, Photo, DailyRate, Stock)
+        END
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Products_Title' AND object_id = OBJECT_ID('dbo.Products'))
+        BEGIN
+            CREATE INDEX IX_Products_Title ON dbo.Products (Title, ProductId)
+                INCLUDE (Price, Category, CategoryKey, Photo, DailyRate, Stock)
+        END
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Products_Price' AND object_id = OBJECT_ID('dbo.Products'))
+        BEGIN
+            CREATE INDEX IX_Products_Price ON dbo.Products (Price, ProductId)
+                INCLUDE (Title, Category, CategoryKey, Photo, DailyRate, Stock)
+        END
+    """),
+    (11, 'cart unique product per user', """
+        SET NOCOUNT ON
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_Cart_UserId_ProductId' AND object_id = OBJECT_ID('dbo.Cart'))
+        BEGIN
+            -- fold duplicate lines (from racing add-to-cart clicks) into the oldest one first
+            UPDATE c SET Quantity = d.Quantity
+            FROM Cart c
+            JOIN (
+                SELECT MIN(CartId) AS KeepId, SUM(Quantity) AS Quantity
+                FROM Cart GROUP BY UserId, ProductId HAVING COUNT(*) > 1
+            ) d ON c.CartId = d.KeepId
+
+            DELETE c
+            FROM Cart c
+            JOIN (
+                SELECT UserId, ProductId, MIN(CartId) AS KeepId
+                FROM Cart GROUP BY UserId, ProductId HAVING COUNT(*) > 1
+            ) d ON c.UserId = d.UserId AND c.ProductId = d.ProductId AND c.CartId <> d.KeepId
+
+            CREATE UNIQUE INDEX UX_Cart_UserId_ProductId ON dbo.Cart (UserId, ProductId) INCLUDE (Quantity)
+        END
+    """),
+    (12, 'loyalty ledger', """
+        SET NOCOUNT ON
+        IF OBJECT_ID('dbo.LoyaltyTransactions', 'U') IS NULL
+        BEGIN
+            -- append-only: every change to a LoyaltyPoints balance gets a row here
+            CREATE TABLE LoyaltyTransactions (
+                LoyaltyTransactionId INT IDENTITY(1,1) PRIMARY KEY,
+                UserId INT NOT NULL,
+                Points INT NOT NULL,
+                Reason NVARCHAR(30) NOT NULL,
+                OrderId INT NULL,
+                CreatedAt DATETIME NOT NULL DEFAULT GETDATE(),
+                FOREIGN KEY (UserId) REFERENCES Users(UserId)
+            )
+            CREATE INDEX IX_LoyaltyTransactions_UserId ON LoyaltyTransactions (UserId) INCLUDE (Points)
+
+            -- opening balances so the ledger adds up to the balances that already exist
+            INSERT INTO LoyaltyTransactions (UserId, Points, Reason)
+            SELECT UserId, Points, 'opening balance' FROM LoyaltyPoints WHERE ISNULL(Points, 0) <> 0
+        END
+    """),
+    (13, 'job queue', """
+        SET NOCOUNT ON
+        IF OBJECT_ID('dbo.JobQueue', 'U') IS NULL
+        BEGIN
+            -- durable background jobs (services/jobs.py); rows are inserted in the same
+            -- transaction as the change that needs them, e.g. the order at checkout
+            CREATE TABLE JobQueue (
+                JobId INT IDENTITY(1,1) PRIMARY KEY,
+                Kind NVARCHAR(50) NOT NULL,
+                Payload NVARCHAR(MAX) NOT NULL,
+                DedupeKey NVARCHAR(200) NULL,
+                Status NVARCHAR(20) NOT NULL DEFAULT 'queued',
+                Attempts INT NOT NULL DEFAULT 0,
+                RunAfter DATETIME NOT NULL DEFAULT GETDATE(),
+                CreatedAt DATETIME NOT NULL DEFAULT GETDATE(),
+                StartedAt DATETIME NULL,
+                FinishedAt DATETIME NULL,
+                LastError NVARCHAR(1000) NULL
+            )
+            -- workers claim the oldest due job
+            CREATE INDEX IX_JobQueue_Status_RunAfter ON JobQueue (Status, RunAfter, JobId)
+            -- the same job (kind + subject) is only ever enqueued once
+            CREATE UNIQUE INDEX UX_JobQueue_DedupeKey ON JobQueue (DedupeKey) WHERE DedupeKey IS NOT NULL
+        END
+        -- idempotency check for loyalty jobs ("were this order's points already added?")
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_LoyaltyTransactions_OrderId' AND object_id = OBJECT_ID('dbo.LoyaltyTransactions'))
+            CREATE INDEX IX_LoyaltyTransactions_OrderId ON LoyaltyTransactions (OrderId, Reason) WHERE OrderId IS NOT NULL
+    """),
+    (14, 'stock reservations', """
+        SET NOCOUNT ON
+        IF OBJECT_ID('dbo.StockReservations', 'U') IS NULL
+        BEGIN
+            -- short holds on stock while an item sits in a cart (services/stock.py)
+            CREATE TABLE StockReservations (
+                ReservationId INT IDENTITY(1,1) PRIMARY KEY,
+                UserId INT NOT NULL,
+                ProductId INT NOT NULL,
+                Quantity INT NOT NULL,
+                ExpiresAt DATETIME NOT NULL,
+                CreatedAt DATETIME NOT NULL DEFAULT GETDATE(),
+                FOREIGN KEY (UserId) REFERENCES Users(UserId),
+                FOREIGN KEY (ProductId) REFERENCES Products(ProductId)
+            )
+            CREATE UNIQUE INDEX UX_StockReservations_UserId_ProductId ON StockReservations (UserId, ProductId)
+            -- "how much of this product do other carts hold?"
+            CREATE INDEX IX_StockReservations_ProductId ON StockReservations (ProductId, ExpiresAt) INCLUDE (UserId, Quantity)
+            CREATE INDEX IX_StockReservations_ExpiresAt ON StockReservations (ExpiresAt)
+        END
+        -- stock can't go negative, whatever path writes it
+        UPDATE Products SET Stock = 0 WHERE Stock < 0
+        IF NOT EXISTS (SELECT 1 FROM sys.check_constraints WHERE name = 'CK_Products_Stock_NonNegative')
+            ALTER TABLE Products ADD CONSTRAINT CK_Products_Stock_NonNegative CHECK (Stock >= 0)
+    """),
+    (15, 'bid history', """
+        SET NOCOUNT ON
+        IF COL_LENGTH('dbo.Auctions', 'BidCount') IS NULL
+            ALTER TABLE Auctions ADD BidCount INT NOT NULL CONSTRAINT DF_Auctions_BidCount DEFAULT 0
+        IF OBJECT_ID('dbo.BidHistory', 'U') IS NULL
+        BEGIN
+            -- every accepted bid, written in the same batch as the Auctions update
+            CREATE TABLE BidHistory (
+                BidId INT IDENTITY(1,1) PRIMARY KEY,
+                AuctionId INT NOT NULL,
+                UserId INT NOT NULL,
+                Amount DECIMAL(10,2) NOT NULL,
+                PreviousBid DECIMAL(10,2) NULL,
+                PreviousBidderId INT NULL,
+                PlacedAt DATETIME NOT NULL DEFAULT GETDATE(),
+                FOREIGN KEY (AuctionId) REFERENCES Auctions(AuctionId),
+                FOREIGN KEY (UserId) REFERENCES Users(UserId)
+            )
+            CREATE INDEX IX_BidHistory_AuctionId ON BidHistory (AuctionId, BidId) INCLUDE (UserId, Amount, PlacedAt)
+        END
+    """),
+    (16, 'auction maintenance', """
+        SET NOCOUNT ON
+        -- shared version row for the active auctions cache (services/auction_maintainer.py)
+        IF NOT EXISTS (SELECT 1 FROM CacheVersions WHERE Name = 'auctions')
+            INSERT INTO CacheVersions (Name, Version) VALUES ('auctions', 0)
+        -- the active list and the expiry sweep both filter on these
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Auctions_Status_EndTime' AND object_id = OBJECT_ID('dbo.Auctions'))
+            CREATE INDEX IX_Auctions_Status_EndTime ON Auctions (Status, EndTime) INCLUDE (ProductId)
+    """),
+    (17, 'auction settlement', """
+        SET NOCOUNT ON
+        -- when the close-out job (services/auction_settlement.py) settled an auction, and the winner's order
+        IF COL_LENGTH('dbo.Auctions', 'SettledAt') IS NULL
+            ALTER TABLE Auctions ADD SettledAt DATETIME NULL
+        IF COL_LENGTH('dbo.Auctions', 'OrderId') IS NULL
+            ALTER TABLE Auctions ADD OrderId INT NULL CONSTRAINT FK_Auctions_OrderId REFERENCES Orders(OrderId)
+        -- an auction can only ever turn into one order, however often settlement runs
+        IF COL_LENGTH('dbo.Orders', 'AuctionId') IS NULL
+            ALTER TABLE Orders ADD AuctionId INT NULL
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_Orders_AuctionId' AND object_id = OBJECT_ID('dbo.Orders'))
+            CREATE UNIQUE INDEX UX_Orders_AuctionId ON Orders (AuctionId) WHERE AuctionId IS NOT NULL
+        -- the settlement queue: finished auctions nobody has settled yet
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Auctions_Unsettled' AND object_id = OBJECT_ID('dbo.Auctions'))
+            CREATE INDEX IX_Auctions_Unsettled ON Auctions (EndTime)
+                INCLUDE (Status, ProductId, HighestBidderId, CurrentBid) WHERE SettledAt IS NULL
+    """),
+]
+
+_VERSION_TABLE_SQL = """
+    IF OBJECT_ID('dbo.SchemaVersion', 'U') IS NULL
+    BEGIN
+        CREATE TABLE SchemaVersion (
+            Version INT PRIMARY KEY,
+            Name NVARCHAR(200) NOT NULL,
+            AppliedAt DATETIME DEFAULT GETDATE()
+        )
+    END
+"""
+
+# set once every migration is known to be applied in this process
+_schema_ready = False
+_lock = threading.Lock()
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(cursor):
+    """Highest applied migration version (0 for a fresh database)."""
+    cursor.execute("SELECT MAX(Version) FROM SchemaVersion")
+    row = cursor.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def run_migrations(verbose=False):
+    """Apply every pending migration in order. Returns the list of versions applied."""
+    global _schema_ready
+    applied = []
+    with _lock:
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(_VERSION_TABLE_SQL)
+            conn.commit()
+            version = current_version(cur)
+            for number, name, sql in MIGRATIONS:
+                if number <= version:
+                    continue
+                if verbose:
+                    print(f"Applying migration {number}: {name}")
+                # the migration and its version row commit together
+                cur.execute(sql)
+                cur.execute("INSERT INTO SchemaVersion (Version, Name) VALUES (?, ?)", (number, name))
+                conn.commit()
+                applied.append(number)
+            if applied:
+                # migrations SET NOCOUNT ON; don't pass that on with the pooled connection
+                cur.execute("SET NOCOUNT OFF")
+            _schema_ready = True
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+            if applied:
+                # cached table shapes may be missing new columns now
+                forget_table_shapes()
+    return applied
+
+
+def schema_ready():
+    return _schema_ready
+
+
+def ensure_schema():
+    """Make sure migrations ran in this process; free after the first successful call."""
+    if not _schema_ready:
+        run_migrations()
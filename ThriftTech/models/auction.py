@@ -1,5 +1,11 @@
+import os
 from datetime import datetime
-from database import get_db_connection
+from database import get_db_connection, insert_returning_id, SqlExpr, table_shape
+from migrations import ensure_schema
+from models.rows import make_record
+from services.auction_events import auction_events
+from services.bidding import bid_engine, minimum_bid, MIN_INCREMENT
+from services.catalog_cache import CatalogCache
 
 
 TECH_CATEGORIES = (
@@ -12,183 +18,51 @@ TECH_CATEGORIES = (
     'Audio Equipment',
 )
 
+# fields of an auction returned by Auction.get_active_auctions
+AUCTION_FIELDS = (
+    'AuctionId', 'ProductId', 'StartingBid', 'CurrentBid', 'HighestBidderId',
+    'StartTime', 'EndTime', 'Status', 'Title', 'Description', 'Photo',
+    'HighestBidder', 'TimeLeft',
+)
+_END_TIME = AUCTION_FIELDS.index('EndTime')
+
 # auction model
 class Auction:
-    MIN_INCREMENT = 100.0
+    # the bid engine enforces this (services/bidding.py)
+    MIN_INCREMENT = float(MIN_INCREMENT)
 
     @staticmethod
     def _ensure_table_exists():
-        """Create Auctions table if it doesn't exist (idempotent)."""
-        conn = get_db_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                IF OBJECT_ID('dbo.Auctions', 'U') IS NULL
-                BEGIN
-                    CREATE TABLE Auctions (
-                        AuctionId INT IDENTITY(1,1) PRIMARY KEY,
-                        ProductId INT NOT NULL,
-                        StartingBid DECIMAL(10,2) NOT NULL,
-                        CurrentBid DECIMAL(10,2),
-                        HighestBidderId INT,
-                        Photo NVARCHAR(500) NULL,
-                        StartTime DATETIME NOT NULL,
-                        EndTime DATETIME NOT NULL,
-                        Status NVARCHAR(20) DEFAULT 'active',
-                        CreatedAt DATETIME DEFAULT GETDATE(),
-                        FOREIGN KEY (ProductId) REFERENCES Products(ProductId),
-                        FOREIGN KEY (HighestBidderId) REFERENCES Users(UserId)
-                    )
-                END
-                
-                -- Add missing columns for older databases
-                IF OBJECT_ID('dbo.Auctions', 'U') IS NOT NULL
-                BEGIN
-                    IF COL_LENGTH('dbo.Auctions', 'StartTime') IS NULL
-                    BEGIN
-                        ALTER TABLE dbo.Auctions ADD StartTime DATETIME CONSTRAINT DF_Auctions_StartTime DEFAULT GETDATE() WITH VALUES;
-                        ALTER TABLE dbo.Auctions ALTER COLUMN StartTime DATETIME NOT NULL;
-                    END
-
-                    IF COL_LENGTH('dbo.Auctions', 'EndTime') IS NULL
-                    BEGIN
-                        ALTER TABLE dbo.Auctions ADD EndTime DATETIME CONSTRAINT DF_Auctions_EndTime DEFAULT (DATEADD(DAY, 3, GETDATE())) WITH VALUES;
-                        ALTER TABLE dbo.Auctions ALTER COLUMN EndTime DATETIME NOT NULL;
-                    END
-
-                    IF COL_LENGTH('dbo.Auctions', 'Status') IS NULL
-                    BEGIN
-                        ALTER TABLE dbo.Auctions ADD Status NVARCHAR(20) CONSTRAINT DF_Auctions_Status DEFAULT 'active' WITH VALUES;
-                        ALTER TABLE dbo.Auctions ALTER COLUMN Status NVARCHAR(20) NOT NULL;
-                    END
-
-                    -- Add Photo column for auction-specific images if missing
-                    IF COL_LENGTH('dbo.Auctions', 'Photo') IS NULL
-                    BEGIN
-                        ALTER TABLE dbo.Auctions ADD Photo NVARCHAR(500) NULL;
-                    END
-
-                    -- Legacy columns: StartDate/EndDate (ensure defaults exist for inserts that don't set them)
-                    IF COL_LENGTH('dbo.Auctions', 'StartDate') IS NOT NULL
-                    BEGIN
-                        IF NOT EXISTS (
-                            SELECT 1 FROM sys.default_constraints dc
-                            JOIN sys.columns c ON c.default_object_id = dc.object_id
-                            WHERE dc.parent_object_id = OBJECT_ID('dbo.Auctions') AND c.name = 'StartDate'
-                        )
-                        BEGIN
-                            ALTER TABLE dbo.Auctions ADD CONSTRAINT DF_Auctions_StartDate DEFAULT (GETDATE()) FOR StartDate;
-                        END
-                    END
-                    IF COL_LENGTH('dbo.Auctions', 'EndDate') IS NOT NULL
-                    BEGIN
-                        IF NOT EXISTS (
-                            SELECT 1 FROM sys.default_constraints dc
-                            JOIN sys.columns c ON c.default_object_id = dc.object_id
-                            WHERE dc.parent_object_id = OBJECT_ID('dbo.Auctions') AND c.name = 'EndDate'
-                        )
-                        BEGIN
-                            ALTER TABLE dbo.Auctions ADD CONSTRAINT DF_Auctions_EndDate DEFAULT (DATEADD(DAY, 3, GETDATE())) FOR EndDate;
-                        END
-                    END
-                END
-                """
-            )
-            conn.commit()
-        finally:
-            conn.close()
+        """Make sure the Auctions table and its legacy columns exist (no-op once migrations have run)."""
+        ensure_schema()
 
     @staticmethod
-    def _insert_auction(cur, product_id: int, starting_bid: float):
-        """Insert auction row handling legacy StartDate/EndDate columns if present."""
-        cur.execute("SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('dbo.Auctions') AND name = 'StartDate'")
-        has_startdate = cur.fetchone() is not None
-        cur.execute("SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('dbo.Auctions') AND name = 'EndDate'")
-        has_enddate = cur.fetchone() is not None
-        cur.execute("SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('dbo.Auctions') AND name = 'Photo'")
-        has_photo_col = cur.fetchone() is not None
-
-        # try to use the product's current photo as the auction photo (if column exists)
-        auction_photo = None
-        if has_photo_col:
-            cur.execute("SELECT Photo FROM Products WHERE ProductId = ?", (product_id,))
-            pr = cur.fetchone()
-            if pr:
-                auction_photo = pr.Photo
-
-        if has_startdate and has_enddate:
-            if has_photo_col:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, Photo, StartTime, EndTime, StartDate, EndDate, Status)
-                    VALUES (?, ?, ?, NULL, ?, GETDATE(), DATEADD(DAY, 3, GETDATE()), GETDATE(), DATEADD(DAY, 3, GETDATE()), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid, auction_photo),
-                )
-            else:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, StartTime, EndTime, StartDate, EndDate, Status)
-                    VALUES (?, ?, ?, NULL, GETDATE(), DATEADD(DAY, 3, GETDATE()), GETDATE(), DATEADD(DAY, 3, GETDATE()), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid),
-                )
-        elif has_startdate:
-            if has_photo_col:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, Photo, StartTime, EndTime, StartDate, Status)
-                    VALUES (?, ?, ?, NULL, ?, GETDATE(), DATEADD(DAY, 3, GETDATE()), GETDATE(), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid, auction_photo),
-                )
-            else:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, StartTime, EndTime, StartDate, Status)
-                    VALUES (?, ?, ?, NULL, GETDATE(), DATEADD(DAY, 3, GETDATE()), GETDATE(), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid),
-                )
-        elif has_enddate:
-            if has_photo_col:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, Photo, StartTime, EndTime, EndDate, Status)
-                    VALUES (?, ?, ?, NULL, ?, GETDATE(), DATEADD(DAY, 3, GETDATE()), DATEADD(DAY, 3, GETDATE()), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid, auction_photo),
-                )
-            else:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, StartTime, EndTime, EndDate, Status)
-                    VALUES (?, ?, ?, NULL, GETDATE(), DATEADD(DAY, 3, GETDATE()), DATEADD(DAY, 3, GETDATE()), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid),
-                )
-        else:
-            if has_photo_col:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, Photo, StartTime, EndTime, Status)
-                    VALUES (?, ?, ?, NULL, ?, GETDATE(), DATEADD(DAY, 3, GETDATE()), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid, auction_photo),
-                )
-            else:
-                cur.execute(
-                    """
-                    INSERT INTO Auctions (ProductId, StartingBid, CurrentBid, HighestBidderId, StartTime, EndTime, Status)
-                    VALUES (?, ?, ?, NULL, GETDATE(), DATEADD(DAY, 3, GETDATE()), 'active')
-                    """,
-                    (product_id, starting_bid, starting_bid),
-                )
+    def _insert_auction(cur, product_id: int, starting_bid: float, photo=None):
+        """
+        Insert an auction row and return its AuctionId. columns only older databases have
+        (StartDate/EndDate) or newer ones (Photo) are included when the cached table shape
+        has them, so this is a single statement.
+        """
+        in_three_days = SqlExpr('DATEADD(DAY, 3, GETDATE())')
+        values = {
+            'ProductId': product_id,
+            'StartingBid': starting_bid,
+            'CurrentBid': starting_bid,
+            'HighestBidderId': None,
+            'Photo': photo,
+            'StartTime': SqlExpr('GETDATE()'),
+            'EndTime': in_three_days,
+            'StartDate': SqlExpr('GETDATE()'),
+            'EndDate': in_three_days,
+            'Status': 'active',
+        }
+        shape = table_shape(cur, 'Auctions')
+        values = {column: value for column, value in values.items() if shape.has(column)}
+        return insert_returning_id(cur, 'Auctions', values, 'AuctionId')
 
     @staticmethod
     def seed_sample_auctions(min_active: int = 4):
-        """Ensure at least `min_active` active tech auctions exist (idempotent and non-duplicating)."""
+        """Ensure at least `min_active` active tech auctions exist (idempotent and non-duplicating); returns how many were created."""
         Auction._ensure_table_exists()
         conn = get_db_connection()
         try:
@@ -206,7 +80,7 @@ class Auction:
             )
             current_cnt = int(cur.fetchone()[0] or 0)
             if current_cnt >= min_active:
-                return
+                return 0
 
             need = min_active - current_cnt
 
@@ -232,7 +106,7 @@ class Auction:
 
             cur.execute(
                 f"""
-                SELECT TOP {need} ProductId, Price
+                SELECT TOP {need} ProductId, Price, Photo
                 FROM Products
                 WHERE Category IN ({placeholders})
                 {not_in_clause}
@@ -248,14 +122,16 @@ class Auction:
                 except Exception:
                     price = 1000.0
                 starting = round(max(500.0, price * 0.6), 2)
-                Auction._insert_auction(cur, product_id, starting)
+                # the product's current photo becomes the auction photo
+                Auction._insert_auction(cur, product_id, starting, row.Photo)
             conn.commit()
+            return len(rows)
         finally:
             conn.close()
 
     @staticmethod
-    def get_active_auctions():
-        """Return list of active auctions joined with product and highest bidder info."""
+    def load_active_auctions():
+        """Active tech auctions as value tuples in AUCTION_FIELDS order, minus TimeLeft (uncached)."""
         Auction._ensure_table_exists()
         conn = get_db_connection()
         try:
@@ -276,82 +152,89 @@ class Auction:
                 """,
                 TECH_CATEGORIES,
             )
-            auctions = []
-            now = datetime.now()
-            for r in cur.fetchall():
-                end_time = r.EndTime
-                # compute time left as a friendly string
-                delta = end_time - now
-                if delta.total_seconds() < 0:
-                    time_left = 'Ended'
-                else:
-                    days = delta.days
-                    hours = int(delta.seconds // 3600)
-                    minutes = int((delta.seconds % 3600) // 60)
-                    parts = []
-                    if days:
-                        parts.append(f"{days}d")
-                    if hours or days:
-                        parts.append(f"{hours}h")
-                    parts.append(f"{minutes}m")
-                    time_left = ' '.join(parts)
-
-                auctions.append({
-                    'AuctionId': r.AuctionId,
-                    'ProductId': r.ProductId,
-                    'StartingBid': float(r.StartingBid) if r.StartingBid is not None else 0.0,
-                    'CurrentBid': float(r.CurrentBid) if r.CurrentBid is not None else 0.0,
-                    'HighestBidderId': r.HighestBidderId,
-                    'StartTime': r.StartTime,
-                    'EndTime': r.EndTime,
-                    'Status': r.Status,
-                    'Title': r.Title,
-                    'Description': r.Description,
-                    'Photo': r.Photo,
-                    'HighestBidder': r.HighestBidder,
-                    'TimeLeft': time_left,
-                })
-            return auctions
+            return [
+                (
+                    r.AuctionId,
+                    r.ProductId,
+                    float(r.StartingBid) if r.StartingBid is not None else 0.0,
+                    float(r.CurrentBid) if r.CurrentBid is not None else 0.0,
+                    r.HighestBidderId,
+                    r.StartTime,
+                    r.EndTime,
+                    r.Status,
+                    r.Title,
+                    r.Description,
+                    r.Photo,
+                    r.HighestBidder,
+                )
+                for r in cur.fetchall()
+            ]
         finally:
             conn.close()
 
     @staticmethod
-    def place_bid(auction_id: int, user_id: int, bid_amount: float):
-        """Place a bid. Returns (success: bool, message: str)."""
-        Auction._ensure_table_exists()
-        conn = get_db_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT AuctionId, CurrentBid, StartingBid, HighestBidderId, EndTime, Status
-                FROM Auctions WHERE AuctionId = ?
-                """,
-                (auction_id,),
-            )
-            row = cur.fetchone()
-            if not row:
-                return False, 'Auction not found.'
-            if row.Status != 'active' or row.EndTime <= datetime.now():
-                return False, 'This auction has ended.'
+    def get_active_auctions(use_cache=True):
+        """
+        Return list of active auctions joined with product and highest bidder info.
+        the rows come from auction_cache; TimeLeft is worked out per call and auctions
+        that ended since the rows were loaded are left out.
+        """
+        rows = auction_cache.get('active', Auction.load_active_auctions) if use_cache else Auction.load_active_auctions()
+        # so live listeners get a 'close' the moment each of these ends
+        auction_events.track((row[0], row[_END_TIME]) for row in rows)
+        now = datetime.now()
+        return [
+            make_record(AUCTION_FIELDS, row + (time_left(row[_END_TIME], now),))
+            for row in rows if row[_END_TIME] > now
+        ]
 
-            current = float(row.CurrentBid) if row.CurrentBid is not None else 0.0
-            base = current if current > 0 else float(row.StartingBid)
-            min_bid = base + Auction.MIN_INCREMENT
-            if bid_amount < min_bid:
-                return False, f'Minimum bid is R{min_bid:.2f}.'
+    @staticmethod
+    def place_bid(auction_id: int, user_id: int, bid_amount):
+        """Place a bid through the bid engine. Returns (success: bool, message: str)."""
+        ok, message, _state = bid_engine.place(auction_id, user_id, bid_amount)
+        return ok, message
+
+
+def time_left(end_time, now):
+    """Friendly time remaining, e.g. '2d 4h 10m'."""
+    delta = end_time - now
+    if delta.total_seconds() < 0:
+        return 'Ended'
+    days = delta.days
+    hours = int(delta.seconds // 3600)
+    minutes = int((delta.seconds % 3600) // 60)
+    parts = []
+    if days:
+        parts.append(f"{days}d")
+    if hours or days:
+        parts.append(f"{hours}h")
+    parts.append(f"{minutes}m")
+    return ' '.join(parts)
+
+
+# active auctions, shared across requests. a bid in this process drops the local copy
+# right away; other processes see it within the ttl. the auction maintainer invalidates
+# it everywhere (via CacheVersions) when it opens or closes auctions
+auction_cache = CatalogCache(
+    loader=Auction.load_active_auctions,
+    ttl=float(os.getenv('THRIFTTECH_AUCTION_TTL', '15')),
+    name='auctions',
+    max_entries=4,
+)
 
-            cur.execute(
-                "UPDATE Auctions SET CurrentBid = ?, HighestBidderId = ? WHERE AuctionId = ?",
-                (bid_amount, user_id, auction_id),
-            )
-            conn.commit()
-            return True, 'Your bid has been placed.'
-        except Exception as e:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            return False, 'Error placing bid.'
-        finally:
-            conn.close()
+
+@bid_engine.on_accepted
+def _drop_cached_auctions(state):
+    auction_cache.invalidate(shared=False)
+
+
+@bid_engine.on_accepted
+def _publish_bid(state):
+    auction_events.publish('bid', {
+        'AuctionId': state.AuctionId,
+        'CurrentBid': state.CurrentBid,
+        'HighestBidder': state.HighestBidder,
+        'BidCount': state.BidCount,
+        'EndTime': state.EndTime,
+        'MinimumBid': minimum_bid(state.CurrentBid, state.StartingBid),
+    })
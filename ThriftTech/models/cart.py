@@ -1,30 +1,40 @@
 from database import get_db_connection
+from migrations import ensure_schema
+from models.rows import map_rows
+from models.columns import PRODUCT_COLUMNS
+
+# fields of a cart line built by CartStore.items (Total = Price * Quantity)
+CART_ITEM_FIELDS = ('CartId', 'UserId', 'ProductId', 'Quantity', 'Title', 'Price', 'Photo', 'Description', 'Total')
 
 
 def _ensure_cart_table_exists():
-    """Create Cart table if it doesn't exist (idempotent)."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            IF OBJECT_ID('dbo.Cart', 'U') IS NULL
-            BEGIN
-                CREATE TABLE Cart (
-                    CartId INT IDENTITY(1,1) PRIMARY KEY,
-                    UserId INT NOT NULL,
-                    ProductId INT NOT NULL,
-                    Quantity INT DEFAULT 1,
-                    AddedAt DATETIME DEFAULT GETDATE(),
-                    FOREIGN KEY (UserId) REFERENCES Users(UserId),
-                    FOREIGN KEY (ProductId) REFERENCES Products(ProductId)
-                )
-            END
-            """
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    """Make sure the Cart table exists (no-op once migrations have run)."""
+    ensure_schema()
+
+
+# products per MERGE in Cart.add_many (3 parameters each, sql server allows 2100)
+UPSERT_CHUNK_SIZE = 500
+
+
+def _upsert_sql(count, replace=False):
+    """
+    MERGE that adds `count` (UserId, ProductId, Quantity) rows to the cart
+    (replace=True sets the quantity instead of adding to it).
+    HOLDLOCK keeps the key range locked between the match and the insert, and the
+    unique index on (UserId, ProductId) backs it up, so concurrent adds of the same
+    product can't create two lines.
+    """
+    values = ', '.join('(?, ?, ?)' for _ in range(count))
+    quantity = 'source.Quantity' if replace else 'target.Quantity + source.Quantity'
+    return f"""
+        MERGE Cart WITH (HOLDLOCK) AS target
+        USING (VALUES {values}) AS source (UserId, ProductId, Quantity)
+            ON target.UserId = source.UserId AND target.ProductId = source.ProductId
+        WHEN MATCHED THEN
+            UPDATE SET Quantity = {quantity}
+        WHEN NOT MATCHED THEN
+            INSERT (UserId, ProductId, Quantity) VALUES (source.UserId, source.ProductId, source.Quantity);
+    """
 
 class Cart:
     def __init__(self, cart_id=None, user_id=None, product_id=None, quantity=1):
@@ -33,43 +43,6 @@ class Cart:
         self.product_id = product_id
         self.quantity = quantity
 
-    @staticmethod
-    def get_user_cart(user_id):
-        """Get all cart items for a user"""
-        _ensure_cart_table_exists()
-        conn = get_db_connection()
-        if not conn:
-            return []
-            
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT c.CartId, c.UserId, c.ProductId, c.Quantity,
-                       p.Title, p.Price, p.Photo, p.Description
-                FROM Cart c
-                JOIN Products p ON c.ProductId = p.ProductId
-                WHERE c.UserId = ?
-            """, (user_id,))
-            cart_items = []
-            for row in cursor.fetchall():
-                cart_items.append({
-                    'CartId': row.CartId,
-                    'UserId': row.UserId,
-                    'ProductId': row.ProductId,
-                    'Quantity': row.Quantity,
-                    'Title': row.Title,
-                    'Price': float(row.Price),
-                    'Photo': row.Photo,
-                    'Description': row.Description,
-                    'Total': float(row.Price) * float(row.Quantity)
-                })
-            conn.close()
-            return cart_items
-        except Exception as e:
-            print(f"Error getting cart: {e}")
-            conn.close()
-            return []
-
     def save(self):
         """Add item to cart or update quantity if exists"""
         _ensure_cart_table_exists()
@@ -79,28 +52,8 @@ class Cart:
             
         try:
             cursor = conn.cursor()
-            
-            # check if item already exists in cart
-            cursor.execute("""
-                SELECT CartId, Quantity FROM Cart 
-                WHERE UserId = ? AND ProductId = ?
-            """, (self.user_id, self.product_id))
-            existing_item = cursor.fetchone()
-            
-            if existing_item:
-                # update quantity
-                new_quantity = existing_item.Quantity + self.quantity
-                cursor.execute("""
-                    UPDATE Cart SET Quantity = ? 
-                    WHERE CartId = ?
-                """, (new_quantity, existing_item.CartId))
-            else:
-                # insert new item
-                cursor.execute("""
-                    INSERT INTO Cart (UserId, ProductId, Quantity)
-                    VALUES (?, ?, ?)
-                """, (self.user_id, self.product_id, self.quantity))
-            
+            # one atomic upsert: bump the existing line or insert a new one
+            cursor.execute(_upsert_sql(1), (self.user_id, self.product_id, self.quantity))
             conn.commit()
             conn.close()
             return True
@@ -111,6 +64,104 @@ class Cart:
             conn.close()
             return False
 
+    @staticmethod
+    def add_many(user_id, items):
+        """
+        Add several (product_id, quantity) pairs to a user's cart (reorder, bundles):
+        one MERGE per chunk of products and a single commit.
+        Returns the number of lines written (0 on error).
+        """
+        _ensure_cart_table_exists()
+        # MERGE can't touch the same target row twice, so fold duplicate products together
+        quantities = {}
+        for product_id, quantity in items:
+            quantities[product_id] = quantities.get(product_id, 0) + int(quantity)
+        if not quantities:
+            return 0
+        rows = [(user_id, pid, q) for pid, q in quantities.items()]
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+                chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+                cursor.execute(_upsert_sql(len(chunk)), [value for row in chunk for value in row])
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            print(f"Error adding cart items: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_summary(user_id, product_ids=()):
+        """
+        One round trip for pricing a cart: ({ProductId: product} for product_ids, the
+        user's loyalty points). Points are None for anonymous visitors, 0 without a row.
+        """
+        _ensure_cart_table_exists()
+        ids = sorted({int(pid) for pid in product_ids})
+        product_filter = f"p.ProductId IN ({', '.join('?' for _ in ids)})" if ids else '1 = 0'
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            # the one-row derived table keeps the loyalty balance even when no product matches
+            cursor.execute(f"""
+                SELECT {PRODUCT_COLUMNS.select('list', 'p')}, lp.Points AS LoyaltyPoints
+                FROM (SELECT ? AS UserId) u
+                LEFT JOIN Products p ON {product_filter}
+                LEFT JOIN LoyaltyPoints lp ON lp.UserId = u.UserId
+            """, [user_id] + ids)
+            rows = map_rows(cursor, cursor.fetchall())
+        finally:
+            conn.close()
+        products = {row['ProductId']: row for row in rows if row['ProductId'] is not None}
+        points = None
+        if user_id is not None:
+            points = int(rows[0]['LoyaltyPoints'] or 0) if rows else 0
+        return products, points
+
+    @staticmethod
+    def get_quantities(user_id):
+        """{ProductId: Quantity} for a user's saved cart (used to load the session cart)."""
+        _ensure_cart_table_exists()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ProductId, Quantity FROM Cart WHERE UserId = ?", (user_id,))
+            return {row.ProductId: int(row.Quantity) for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    @staticmethod
+    def apply_quantities(user_id, quantities):
+        """
+        Write final quantities for a user's cart lines in one transaction
+        ({ProductId: Quantity}; 0 or less deletes the line). Raises on error.
+        """
+        _ensure_cart_table_exists()
+        keep = [(user_id, pid, q) for pid, q in quantities.items() if q > 0]
+        drop = [pid for pid, q in quantities.items() if q <= 0]
+        if not keep and not drop:
+            return
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(keep), UPSERT_CHUNK_SIZE):
+                chunk = keep[start:start + UPSERT_CHUNK_SIZE]
+                cursor.execute(_upsert_sql(len(chunk), replace=True), [value for row in chunk for value in row])
+            for start in range(0, len(drop), UPSERT_CHUNK_SIZE):
+                chunk = drop[start:start + UPSERT_CHUNK_SIZE]
+                placeholders = ', '.join('?' for _ in chunk)
+                cursor.execute(f"DELETE FROM Cart WHERE UserId = ? AND ProductId IN ({placeholders})", [user_id] + chunk)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
     @staticmethod
     def remove_item(cart_id, user_id):
         """Remove item from cart"""
@@ -0,0 +1,70 @@
+# named column lists ("projections") per table so every query fetches only what its
+# caller actually uses instead of SELECT * (which drags NVARCHAR(MAX) descriptions,
+# password hashes and other wide columns across the wire for list pages)
+
+
+class ColumnRegistry:
+    """
+    Projections for one table, e.g. ColumnRegistry('Users', list=(...), auth=(...)).
+    entries are column names or sql expressions with an AS alias; expressions can use
+    {prefix} where the table alias goes (see select()).
+    """
+
+    def __init__(self, table, **projections):
+        self.table = table
+        self._projections = {name: tuple(cols) for name, cols in projections.items()}
+
+    def names(self):
+        return tuple(self._projections)
+
+    def columns(self, projection):
+        """The raw entries of one projection."""
+        try:
+            return self._projections[projection]
+        except KeyError:
+            raise ValueError(f"Unknown {self.table} projection: {projection!r}") from None
+
+    def select(self, projection, alias=None):
+        """Comma separated select list, optionally qualified with a table alias ('p' -> p.Title)."""
+        prefix = f"{alias}." if alias else ''
+        parts = []
+        for column in self.columns(projection):
+            if '{prefix}' in column:
+                parts.append(column.format(prefix=prefix))
+            else:
+                parts.append(prefix + column)
+        return ', '.join(parts)
+
+
+# list pages only show the first 100 characters of a description; the 101st
+# keeps the templates' "longer than 100 -> add ..." check working
+DESCRIPTION_SUMMARY = "SUBSTRING({prefix}Description, 1, 101) AS Description"
+
+PRODUCT_COLUMNS = ColumnRegistry(
+    'Products',
+    list=('ProductId', 'Title', DESCRIPTION_SUMMARY, 'Price', 'Category', 'Photo', 'DailyRate', 'Stock'),
+    detail=('ProductId', 'Title', 'Description', 'Price', 'Category', 'Photo', 'DailyRate', 'Stock',
+            'CreatedAt', 'UpdatedAt'),
+    # the admin edit page also keeps the product's Status (e.g. 'unavailable' after a soft delete)
+    admin=('ProductId', 'Title', 'Description', 'Price', 'Category', 'Photo', 'DailyRate', 'Stock',
+           'Status', 'CreatedAt', 'UpdatedAt'),
+)
+
+_USER_FIELDS = ('UserId', 'FullName', 'Username', 'Email', 'Role')
+USER_COLUMNS = ColumnRegistry(
+    'Users',
+    list=_USER_FIELDS,
+    detail=_USER_FIELDS,
+    # login only: the one place PasswordHash is read
+    auth=('UserId', 'FullName', 'Username', 'Email', 'PasswordHash', 'Role'),
+)
+
+# invoices are narrow already; listing the columns keeps them from growing silently
+_INVOICE_FIELDS = ('InvoiceId', 'UserId', 'OrderId', 'Total', 'CreatedAt')
+INVOICE_COLUMNS = ColumnRegistry('Invoices', list=_INVOICE_FIELDS, detail=_INVOICE_FIELDS)
+
+# the order pages only render the amounts, never the address/payment columns
+ORDER_COLUMNS = ColumnRegistry(
+    'Orders',
+    list=('OrderId', 'UserId', 'TotalAmount', 'TaxAmount', 'ShippingAmount', 'DiscountAmount', 'Status'),
+)
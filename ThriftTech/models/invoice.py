@@ -1,4 +1,6 @@
-from database import get_db_connection
+from database import get_db_connection, insert_returning_id
+from migrations import ensure_schema
+from models.columns import INVOICE_COLUMNS
 from datetime import datetime
 
 class Invoice:
@@ -11,45 +13,29 @@ class Invoice:
 
     @staticmethod
     def create(user_id, order_id, total):
-        # ensure table exists
+        # ensure table exists (no-op once migrations have run)
+        ensure_schema()
         conn = get_db_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute(
-                """
-                IF OBJECT_ID('dbo.Invoices', 'U') IS NULL
-                BEGIN
-                    CREATE TABLE Invoices (
-                        InvoiceId INT IDENTITY(1,1) PRIMARY KEY,
-                        UserId INT NOT NULL,
-                        OrderId INT NOT NULL,
-                        Total DECIMAL(10,2) NOT NULL,
-                        CreatedAt DATETIME DEFAULT GETDATE(),
-                        FOREIGN KEY (UserId) REFERENCES Users(UserId),
-                        FOREIGN KEY (OrderId) REFERENCES Orders(OrderId)
-                    )
-                END
-                """
+            invoice_id = insert_returning_id(
+                cursor, 'Invoices',
+                {'UserId': user_id, 'OrderId': order_id, 'Total': total, 'CreatedAt': datetime.now()},
+                'InvoiceId',
             )
             conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         finally:
             conn.close()
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO Invoices (UserId, OrderId, Total, CreatedAt)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, order_id, total, datetime.now()))
-        conn.commit()
-        invoice_id = cursor.execute("SELECT @@IDENTITY").fetchone()[0]
-        conn.close()
         return invoice_id
 
     @staticmethod
     def get_by_user(user_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Invoices WHERE UserId = ? ORDER BY CreatedAt DESC", (user_id,))
+        cursor.execute(f"SELECT {INVOICE_COLUMNS.select('list')} FROM Invoices WHERE UserId = ? ORDER BY CreatedAt DESC", (user_id,))
         invoices = cursor.fetchall()
         conn.close()
         return invoices
@@ -58,7 +44,7 @@ class Invoice:
     def get_by_id(invoice_id):
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Invoices WHERE InvoiceId = ?", (invoice_id,))
+        cursor.execute(f"SELECT {INVOICE_COLUMNS.select('detail')} FROM Invoices WHERE InvoiceId = ?", (invoice_id,))
         invoice = cursor.fetchone()
         conn.close()
         return invoice
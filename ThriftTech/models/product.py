@@ -1,11 +1,27 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
 # importing database connection to talk to our product storage
-from database import get_db_connection
+from database import get_db_connection, bulk_insert, insert_returning_id, table_shape
+from migrations import ensure_schema
+# in-process catalog cache that write paths must invalidate
+from services.catalog_cache import catalog_cache, invalidate_catalog
+# compact per-row records instead of a dict per row
+from models.rows import map_row, map_rows
+# named column lists ('list' for listings, 'detail' for a single product page)
+from models.columns import PRODUCT_COLUMNS
+
+# 'name' is an alias of Title kept for compatibility with older code
+PRODUCT_ALIASES = {'name': 'Title'}
+
+# units on hand for a new product when the admin doesn't give a count
+DEFAULT_STOCK = 10
 
 # product model class that represents items people can buy, rent or auction
 class Product:
     # setting up a new product object with all the details about an item
     def __init__(self, product_id=None, title=None, description=None, price=None,
-                 category=None, photo=None, seller_id=None, status='available', daily_rate=None):
+                 category=None, photo=None, seller_id=None, status='available', daily_rate=None, stock=None):
         # unique number to identify this product
         self.product_id = product_id
         # the name/title of the item being sold
@@ -24,96 +40,93 @@ class Product:
         self.status = status
         # how much it costs per day if renting
         self.daily_rate = daily_rate
+        # units on hand (None = leave as is / DEFAULT_STOCK for new products)
+        self.stock = stock
 
     # making sure the database has a daily rate column for rental prices
     @staticmethod
     def _ensure_daily_rate_column(cur):
-        """Add Products.DailyRate column if missing (idempotent)."""
+        """Add Products.DailyRate column if missing (no-op once migrations have run)."""
         try:
-            # checking if daily rate column already exists in products table
-            cur.execute("SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('dbo.Products') AND name = 'DailyRate'")
-            if cur.fetchone() is None:
-                # adding the daily rate column if it's missing
-                cur.execute("ALTER TABLE dbo.Products ADD DailyRate DECIMAL(10,2) NULL")
+            ensure_schema()
         except Exception:
             # ignoring errors because column might not exist in some setups
             pass
 
     # getting all products from database to display on website
     @staticmethod
-    def get_all():
+    def get_all(projection='list'):
         """Get all products from database"""
         # connecting to database to fetch all available products
         conn = get_db_connection()
         cursor = conn.cursor()
-        # asking database for every single product record
-        cursor.execute("SELECT * FROM Products")
-        products = []
-        # going through each product and building a nice dictionary for each one
-        for row in cursor.fetchall():
-            products.append({
-                'ProductId': row.ProductId,
-                'Title': row.Title,
-                'Description': row.Description,
-                'Price': row.Price,
-                'Category': row.Category,
-                'Photo': row.Photo,
-                'DailyRate': getattr(row, 'DailyRate', None),
-                'Stock': row.Stock,
-                'CreatedAt': row.CreatedAt,
-                'UpdatedAt': row.UpdatedAt,
-                'name': row.Title  # alias for compatibility with older code
-            })
+        # asking database for every product, only the columns the listings use
+        cursor.execute(f"SELECT {PRODUCT_COLUMNS.select(projection)} FROM Products")
+        # wrapping each row in a compact product record (works like a dictionary in templates)
+        products = map_rows(cursor, cursor.fetchall(), PRODUCT_ALIASES)
         conn.close()
         # returning the complete list of all products
         return products
+    # start a catalog query that filters/sorts/pages in sql (see ProductQuery below)
+    @staticmethod
+    def query(projection='list'):
+        """Build a product query"""
+        return ProductQuery(projection)
+
+    # same as get_all but served from the in-process catalog cache (shared list, don't mutate it)
+    @staticmethod
+    def get_all_cached():
+        """Get all products from the catalog cache"""
+        return catalog_cache.get_products()
+
 # get product by ID
     @staticmethod
-    def get_by_id(product_id):
+    def get_by_id(product_id, projection='detail'):
         """Get product by ID"""
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Products WHERE ProductId = ?", (product_id,))
-        row = cursor.fetchone()
+        cursor.execute(f"SELECT {PRODUCT_COLUMNS.select(projection)} FROM Products WHERE ProductId = ?", (product_id,))
+        product = map_row(cursor, cursor.fetchone(), PRODUCT_ALIASES)
         conn.close()
-        if row:
-            return {
-                'ProductId': row.ProductId,
-                'Title': row.Title,
-                'Description': row.Description,
-                'Price': row.Price,
-                'Category': row.Category,
-                'Photo': row.Photo,
-                'DailyRate': getattr(row, 'DailyRate', None),
-                'Stock': row.Stock,
-                'CreatedAt': row.CreatedAt,
-                'UpdatedAt': row.UpdatedAt,
-                'name': row.Title  # Alias for compatibility
-            }
-        return None
+        return product
+
+# get several products by ID in one query (ProductId -> product)
+    @staticmethod
+    def get_by_ids(product_ids, projection='list'):
+        """Get products by ID"""
+        ids = sorted({int(pid) for pid in product_ids})
+        if not ids:
+            return {}
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' for _ in ids)
+            cursor.execute(f"SELECT {PRODUCT_COLUMNS.select(projection)} FROM Products WHERE ProductId IN ({placeholders})", ids)
+            return {p['ProductId']: p for p in map_rows(cursor, cursor.fetchall(), PRODUCT_ALIASES)}
+        finally:
+            conn.close()
+
+# when was a product last changed (for conditional GET on the detail page)
+    @staticmethod
+    def get_updated_at(product_id):
+        """Return (exists, UpdatedAt) for one product"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT UpdatedAt FROM Products WHERE ProductId = ?", (product_id,))
+            row = cursor.fetchone()
+            return (True, row.UpdatedAt) if row else (False, None)
+        finally:
+            conn.close()
 
 # get products by category
     @staticmethod
-    def get_by_category(category):
+    def get_by_category(category, projection='list'):
         """Get products by category"""
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Products WHERE Category = ?", (category,))
-        products = []
-        for row in cursor.fetchall():
-            products.append({
-                'ProductId': row.ProductId,
-                'Title': row.Title,
-                'Description': row.Description,
-                'Price': row.Price,
-                'Category': row.Category,
-                'Photo': row.Photo,
-                'DailyRate': getattr(row, 'DailyRate', None),
-                'Stock': row.Stock,
-                'CreatedAt': row.CreatedAt,
-                'UpdatedAt': row.UpdatedAt,
-                'name': row.Title  # Alias for compatibility
-            })
+        cursor.execute(f"SELECT {PRODUCT_COLUMNS.select(projection)} FROM Products WHERE Category = ?", (category,))
+        products = map_rows(cursor, cursor.fetchall(), PRODUCT_ALIASES)
         conn.close()
         return products
 # save product
@@ -121,49 +134,34 @@ class Product:
         """Save product to database"""
         conn = get_db_connection()
         cursor = conn.cursor()
+        # ensure column exists before referencing it
+        Product._ensure_daily_rate_column(cursor)
+        values = {
+            'Title': self.title, 'Description': self.description, 'Price': self.price,
+            'Category': self.category, 'Photo': self.photo,
+        }
+        if self.daily_rate is not None:
+            values['DailyRate'] = self.daily_rate
+        # older databases have no Status column
+        if self.status is not None and table_shape(cursor, 'Products').has('Status'):
+            values['Status'] = self.status
         if self.product_id:
-            # Update existing product
-            # ensure column exists before referencing it
-            Product._ensure_daily_rate_column(cursor)
-            if self.daily_rate is not None:
-                cursor.execute(
-                    """
-                    UPDATE Products 
-                    SET Title=?, Description=?, Price=?, Category=?, Photo=?, DailyRate=?
-                    WHERE ProductId=?
-                    """,
-                    (self.title, self.description, self.price, self.category, self.photo, self.daily_rate, self.product_id),
-                )
-            else:
-                cursor.execute(
-                    """
-                    UPDATE Products 
-                    SET Title=?, Description=?, Price=?, Category=?, Photo=?
-                    WHERE ProductId=?
-                    """,
-                    (self.title, self.description, self.price, self.category, self.photo, self.product_id),
-                )
+            # Update existing product; stock is only touched when the form sent a count
+            if self.stock is not None:
+                values['Stock'] = self.stock
+            assignments = ', '.join(f"{column}=?" for column in values)
+            cursor.execute(
+                f"UPDATE Products SET {assignments}, UpdatedAt=GETDATE() WHERE ProductId=?",
+                (*values.values(), self.product_id),
+            )
         else:
             # Insert new product - match actual database schema
-            Product._ensure_daily_rate_column(cursor)
-            if self.daily_rate is not None:
-                cursor.execute(
-                    """
-                    INSERT INTO Products (Title, Description, Price, Category, Photo, Stock, DailyRate)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (self.title, self.description, self.price, self.category, self.photo, 10, self.daily_rate),
-                )
-            else:
-                cursor.execute(
-                    """
-                    INSERT INTO Products (Title, Description, Price, Category, Photo, Stock)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (self.title, self.description, self.price, self.category, self.photo, 10),
-                )
+            values['Stock'] = self.stock if self.stock is not None else DEFAULT_STOCK
+            self.product_id = insert_returning_id(cursor, 'Products', values, 'ProductId')
         conn.commit()
         conn.close()
+        # catalog changed, drop cached copies in every worker
+        invalidate_catalog()
 
 # delete product
     @staticmethod
@@ -191,8 +189,9 @@ class Product:
 
             if has_order_refs or has_auction_refs or has_rental_refs:
                 # Soft delete to maintain referential integrity and preserve history
-                cur.execute("UPDATE Products SET Status='unavailable' WHERE ProductId = ?", (product_id,))
+                cur.execute("UPDATE Products SET Status='unavailable', UpdatedAt=GETDATE() WHERE ProductId = ?", (product_id,))
                 conn.commit()
+                invalidate_catalog()
                 reason = []
                 if has_order_refs:
                     reason.append('orders')
@@ -207,6 +206,11 @@ class Product:
                 cur.execute("DELETE FROM Cart WHERE ProductId = ?", (product_id,))
             except Exception:
                 pass
+            # and any stock held for those carts
+            try:
+                cur.execute("DELETE FROM StockReservations WHERE ProductId = ?", (product_id,))
+            except Exception:
+                pass
             # No historical references: it's safe to drop auctions entirely (ignore if table missing)
             try:
                 cur.execute("DELETE FROM Auctions WHERE ProductId = ?", (product_id,))
@@ -215,6 +219,7 @@ class Product:
             # Now delete the product
             cur.execute("DELETE FROM Products WHERE ProductId = ?", (product_id,))
             conn.commit()
+            invalidate_catalog()
             return True, "Product deleted."
         except Exception as e:
             try:
@@ -227,20 +232,45 @@ class Product:
 
 # add new product 
     @staticmethod
-    def add(title, description, price, category, photo):
-        """Add a new product to the database (admin)"""
+    def add(title, description, price, category, photo, stock=DEFAULT_STOCK):
+        """Add a new product to the database (admin); returns its ProductId"""
         conn = get_db_connection()
         cursor = conn.cursor()
         Product._ensure_daily_rate_column(cursor)
-        cursor.execute(
-            """
-            INSERT INTO Products (Title, Description, Price, Category, Photo, Stock)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (title, description, price, category, photo, 10),
-        )
+        product_id = insert_returning_id(cursor, 'Products', {
+            'Title': title, 'Description': description, 'Price': price,
+            'Category': category, 'Photo': photo, 'Stock': stock,
+        }, 'ProductId')
         conn.commit()
         conn.close()
+        invalidate_catalog()
+        return product_id
+
+# add many products at once (admin imports / seeding)
+    @staticmethod
+    def add_many(products):
+        """
+        Bulk insert products in one transaction.
+        products: iterable of (title, description, price, category, photo) tuples.
+        Returns the number of rows inserted.
+        """
+        rows = [(title, description, price, category, photo, DEFAULT_STOCK)
+                for title, description, price, category, photo in products]
+        if not rows:
+            return 0
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            Product._ensure_daily_rate_column(cursor)
+            count = bulk_insert(cursor, 'Products', ('Title', 'Description', 'Price', 'Category', 'Photo', 'Stock'), rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        invalidate_catalog()
+        return count
 
 # update existing product
     @staticmethod
@@ -251,10 +281,258 @@ class Product:
         Product._ensure_daily_rate_column(cursor)
         cursor.execute(
             """
-            UPDATE Products SET Title=?, Description=?, Price=?, Category=?, Photo=?
+            UPDATE Products SET Title=?, Description=?, Price=?, Category=?, Photo=?, UpdatedAt=GETDATE()
             WHERE ProductId=?
             """,
             (title, description, price, category, photo, product_id),
         )
         conn.commit()
-        conn.close()
\ No newline at end of file
+        conn.close()
+        invalidate_catalog()
+
+
+# page sizes for keyset paging (ProductQuery.page)
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+
+# columns the catalog can be sorted by (request value, lower-cased -> SQL column)
+SORT_COLUMNS = {
+    'title': 'Title',
+    'price': 'Price',
+    'category': 'Category',
+}
+
+# nullable sort columns sort (and seek) on a stand-in for NULL, so NULL rows still get a
+# place in the order that keyset paging can reach: column -> (sort expression, stand-in)
+NULL_SORT_VALUES = {
+    'Category': ("ISNULL(Category, N'')", ''),
+}
+
+
+# builds catalog queries so filtering, sorting and paging run inside the database
+class ProductQuery:
+    def __init__(self, projection='list'):
+        self._columns = PRODUCT_COLUMNS.select(projection)
+        self._where = []
+        self._params = []
+        self._sort = 'Title'
+        self._descending = False
+        self._limit = None
+        self._offset = 0
+
+    def _category_filter(self, categories, negate=False):
+        # CategoryKey is LOWER(Category) (persisted + indexed), so lower-case the inputs too
+        keys = sorted({(c or '').lower() for c in categories})
+        if not keys:
+            # nothing to include means no rows, nothing to exclude means no filter
+            if not negate:
+                self._where.append('1 = 0')
+            return self
+        placeholders = ','.join('?' for _ in keys)
+        self._where.append(f"CategoryKey {'NOT IN' if negate else 'IN'} ({placeholders})")
+        self._params.extend(keys)
+        return self
+
+    def in_categories(self, categories):
+        """Only products whose category (case-insensitive) is in `categories`."""
+        return self._category_filter(categories)
+
+    def exclude_categories(self, categories):
+        """Drop products whose category (case-insensitive) is in `categories`."""
+        return self._category_filter(categories, negate=True)
+
+    def category(self, name):
+        """Only products in one category (case-insensitive)."""
+        return self._category_filter([name])
+
+    def order_by(self, sort='title', order='asc'):
+        """Sort by a whitelisted column; unknown columns fall back to Title."""
+        self._sort = SORT_COLUMNS.get((sort or '').lower(), 'Title')
+        self._descending = (order or '').lower() == 'desc'
+        return self
+
+    def limit(self, limit, offset=0):
+        self._limit = int(limit) if limit is not None else None
+        self._offset = max(0, int(offset or 0))
+        return self
+
+    def _where_sql(self):
+        return (' WHERE ' + ' AND '.join(self._where)) if self._where else ''
+
+    def _sort_expr(self):
+        return NULL_SORT_VALUES[self._sort][0] if self._sort in NULL_SORT_VALUES else self._sort
+
+    def sql(self):
+        """Return (sql, params) for the row query."""
+        direction = 'DESC' if self._descending else 'ASC'
+        # ProductId breaks ties so paging is stable
+        sql = (
+            f"SELECT {self._columns} FROM Products{self._where_sql()}"
+            f" ORDER BY {self._sort_expr()} {direction}, ProductId {direction}"
+        )
+        params = list(self._params)
+        if self._limit is not None:
+            sql += ' OFFSET ? ROWS FETCH NEXT ? ROWS ONLY'
+            params.extend([self._offset, self._limit])
+        elif self._offset:
+            sql += ' OFFSET ? ROWS'
+            params.append(self._offset)
+        return sql, params
+
+    def count_sql(self):
+        return f"SELECT COUNT(*) FROM Products{self._where_sql()}", list(self._params)
+
+    def _fetch(self, sql, params):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return map_rows(cursor, cursor.fetchall(), PRODUCT_ALIASES)
+        finally:
+            conn.close()
+
+    def iter_batches(self, batch_size=500):
+        """
+        Yield the query's products in lists of up to batch_size using cursor.fetchmany,
+        so only one batch is in memory at a time. The connection is held until the
+        generator is exhausted or closed.
+        """
+        sql, params = self.sql()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield map_rows(cursor, rows, PRODUCT_ALIASES)
+        finally:
+            conn.close()
+
+    def all(self):
+        """Run the query and return product dicts (same shape as Product.get_all)."""
+        return self._fetch(*self.sql())
+
+    # keyset (cursor) paging: page N costs the same as page 1 because we seek
+    # past the last row seen instead of skipping OFFSET rows
+
+    def _encode_cursor(self, product, direction):
+        value = product[self._sort]
+        if value is None and self._sort in NULL_SORT_VALUES:
+            value = NULL_SORT_VALUES[self._sort][1]
+        payload = {
+            's': self._sort,
+            'o': 'desc' if self._descending else 'asc',
+            'v': str(value) if value is not None else None,
+            'id': product['ProductId'],
+            'd': direction,
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def _decode_cursor(self, token):
+        """Return (value, product_id, direction); raises ValueError for a bad cursor."""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw.decode('utf-8'))
+            sort, order, value = payload['s'], payload['o'], payload['v']
+            product_id, direction = int(payload['id']), payload['d']
+        except Exception:
+            raise ValueError('Invalid cursor') from None
+        if value is None and sort in NULL_SORT_VALUES:
+            # cursors handed out before NULLs were sorted as their stand-in
+            value = NULL_SORT_VALUES[sort][1]
+        if sort not in SORT_COLUMNS.values() or direction not in ('next', 'prev') or value is None:
+            raise ValueError('Invalid cursor')
+        if sort != self._sort or order != ('desc' if self._descending else 'asc'):
+            # cursor came from a different sort order, start again from the first page
+            return None
+        if sort == 'Price':
+            try:
+                value = Decimal(value)
+            except InvalidOperation:
+                raise ValueError('Invalid cursor') from None
+        return value, product_id, direction
+
+    def page(self, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Return one page as (products, next_cursor, prev_cursor).
+        cursors are opaque strings; None means there is no page in that direction.
+        """
+        limit = max(1, min(MAX_PAGE_SIZE, int(limit or DEFAULT_PAGE_SIZE)))
+        position = self._decode_cursor(cursor) if cursor else None
+        where = list(self._where)
+        params = list(self._params)
+        direction = 'next'
+        descending = self._descending
+        if position is not None:
+            value, product_id, direction = position
+            # walking backwards is the same query with the order flipped
+            if direction == 'prev':
+                descending = not descending
+            op = '<' if descending else '>'
+            sort = self._sort_expr()
+            where.append(f"({sort} {op} ? OR ({sort} = ? AND ProductId {op} ?))")
+            params.extend([value, value, product_id])
+
+        order = 'DESC' if descending else 'ASC'
+        where_sql = (' WHERE ' + ' AND '.join(where)) if where else ''
+        # one extra row tells us whether another page exists
+        sql = (
+            f"SELECT TOP (?) {self._columns} FROM Products{where_sql}"
+            f" ORDER BY {self._sort_expr()} {order}, ProductId {order}"
+        )
+        rows = self._fetch(sql, [limit + 1] + params)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        if direction == 'prev':
+            rows.reverse()
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = position is not None, has_more
+        next_cursor = self._encode_cursor(rows[-1], 'next') if rows and has_next else None
+        prev_cursor = self._encode_cursor(rows[0], 'prev') if rows and has_prev else None
+        return rows, next_cursor, prev_cursor
+
+    def cached_page(self, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Like page(), but served from the catalog cache."""
+        key = ('page', self.sql()[0], tuple(self._params), cursor, limit)
+        return catalog_cache.get(key, lambda: self.page(cursor, limit))
+
+    def estimate_count(self):
+        """Total rows matching the filters, cached with the catalog so it's usually free."""
+        sql, params = self.count_sql()
+        return catalog_cache.get(('count', sql, tuple(params)), self.count)
+
+    def count(self):
+        sql, params = self.count_sql()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return int(cursor.fetchone()[0] or 0)
+        finally:
+            conn.close()
+
+    def freshness(self):
+        """(row count, newest UpdatedAt) for the filtered rows - one aggregate query for ETags."""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*), MAX(UpdatedAt) FROM Products{self._where_sql()}", self._params)
+            row = cursor.fetchone()
+            return int(row[0] or 0), row[1]
+        finally:
+            conn.close()
+
+    def cache_key(self):
+        """Key for caching this query's result in the catalog cache."""
+        sql, params = self.sql()
+        return ('query', sql, tuple(params))
+
+    def cached(self):
+        """Like all(), but served from the catalog cache (shared list, don't mutate it)."""
+        return catalog_cache.get(self.cache_key(), self.all)
+
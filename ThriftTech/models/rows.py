@@ -0,0 +1,127 @@
+# compact row mapping shared by the models
+# instead of building an 11-key dict per row, each result shape (cursor.description)
+# gets one small record class, built once and cached. A record only stores the row's
+# values and looks names up in the class's column index. Records also act like
+# read-only dicts (record['Title'], record.get('Photo'), dict(record), keys()),
+# so templates, jsonify and older code keep working.
+import threading
+
+
+class Record:
+    """Base class for generated record classes (see record_class)."""
+
+    __slots__ = ('_values',)
+    _fields = ()
+    _index = {}
+
+    def __init__(self, values):
+        self._values = values
+
+    # dict-compatible view
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._index[key]]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return [self._values[i] for i in self._index.values()]
+
+    def items(self):
+        return [(k, self._values[i]) for k, i in self._index.items()]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _asdict(self):
+        values = self._values
+        return {k: values[i] for k, i in self._index.items()}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._asdict() == other._asdict()
+        if isinstance(other, dict):
+            return self._asdict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Record({self._asdict()!r})"
+
+    def __getstate__(self):
+        return self._values
+
+    def __setstate__(self, state):
+        self._values = state
+
+
+def _column_property(i):
+    return property(lambda self: self._values[i])
+
+
+_classes = {}
+_lock = threading.Lock()
+
+
+def record_class(fields, aliases=None):
+    """
+    Return the record class for these column names (created once, then cached).
+    aliases maps extra names onto existing columns, e.g. {'name': 'Title'}.
+    """
+    fields = tuple(fields)
+    alias_items = tuple(sorted((aliases or {}).items()))
+    key = (fields, alias_items)
+    cls = _classes.get(key)
+    if cls is not None:
+        return cls
+    with _lock:
+        cls = _classes.get(key)
+        if cls is None:
+            index = {name: i for i, name in enumerate(fields)}
+            for alias, target in alias_items:
+                index[alias] = index[target]
+            namespace = {'__slots__': (), '_fields': fields, '_index': index}
+            for name, i in index.items():
+                # attribute access (product.Title) for jinja; never shadow the mapping methods
+                if not hasattr(Record, name):
+                    namespace[name] = _column_property(i)
+            cls = type('Record', (Record,), namespace)
+            _classes[key] = cls
+    return cls
+
+
+def columns(cursor):
+    return tuple(d[0] for d in cursor.description)
+
+
+def map_rows(cursor, rows, aliases=None):
+    """Wrap every row of a fetchall()/fetchmany() result in one shared record class."""
+    cls = record_class(columns(cursor), aliases)
+    return [cls(row) for row in rows]
+
+
+def map_row(cursor, row, aliases=None):
+    """Wrap a single fetchone() result (None stays None)."""
+    if row is None:
+        return None
+    return record_class(columns(cursor), aliases)(row)
+
+
+def make_record(fields, values, aliases=None):
+    """Build a record from computed values (for rows that need python-side conversions)."""
+    return record_class(fields, aliases)(tuple(values))
@@ -1,5 +1,9 @@
 # importing database connection function to talk to our database
-from database import get_db_connection
+from database import get_db_connection, insert_returning_id
+# compact per-row records instead of a dict per row
+from models.rows import map_rows
+# named column lists ('auth' is the only one that includes PasswordHash)
+from models.columns import USER_COLUMNS
 # importing password hashing tools to keep passwords secure
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -29,7 +33,7 @@ class User:
         conn = get_db_connection()
         cursor = conn.cursor()
         # asking database to find user with this specific id
-        cursor.execute("SELECT * FROM Users WHERE UserId = ?", (user_id,))
+        cursor.execute(f"SELECT {USER_COLUMNS.select('detail')} FROM Users WHERE UserId = ?", (user_id,))
         row = cursor.fetchone()
         conn.close()
         # if we found someone, return their info as a dictionary
@@ -52,7 +56,7 @@ class User:
         conn = get_db_connection()
         cursor = conn.cursor()
         # searching for someone with this exact username
-        cursor.execute("SELECT * FROM Users WHERE Username = ?", (username,))
+        cursor.execute(f"SELECT {USER_COLUMNS.select('auth')} FROM Users WHERE Username = ?", (username,))
         row = cursor.fetchone()
         conn.close()
         # if found, return all their details including password hash
@@ -95,11 +99,11 @@ class User:
                 WHERE UserId=?
             """, (self.fullname, self.username, self.email, self.role, self.user_id))
         else:
-            # creating a brand new user record in database
-            cursor.execute("""
-                INSERT INTO Users (FullName, Username, Email, PasswordHash, Role)
-                VALUES (?, ?, ?, ?, ?)
-            """, (self.fullname, self.username, self.email, self.password_hash, self.role))
+            # creating a brand new user record in database (and keeping its new id)
+            self.user_id = insert_returning_id(cursor, 'Users', {
+                'FullName': self.fullname, 'Username': self.username, 'Email': self.email,
+                'PasswordHash': self.password_hash, 'Role': self.role,
+            }, 'UserId')
         # making sure changes are permanently saved
         conn.commit()
         conn.close()
@@ -112,17 +116,9 @@ class User:
         conn = get_db_connection()
         cursor = conn.cursor()
         # asking database for all user records
-        cursor.execute("SELECT * FROM Users")
-        users = []
-        # going through each person found and adding them to our list
-        for row in cursor.fetchall():
-            users.append({
-                'UserId': row.UserId,
-                'FullName': row.FullName,
-                'Username': row.Username,
-                'Email': row.Email,
-                'Role': row.Role
-            })
+        cursor.execute(f"SELECT {USER_COLUMNS.select('list')} FROM Users")
+        # wrapping each person found in a compact record (works like a dictionary)
+        users = map_rows(cursor, cursor.fetchall())
         conn.close()
         # returning the complete list of all users
         return users
\ No newline at end of file
@@ -0,0 +1,69 @@
+import time, threading
+from bench_common import percentile, run_main
+from services.auction_events import EventBus
+
+# fan-out of the live auction stream, no database needed: `listeners` threads each hold
+# a subscription (like an open /auction/stream) while `events` bids are published at
+# `rate` per second. reports how long each event took to reach a listener and whether
+# any were dropped.
+# usage: python scripts/bench_auction_fanout.py [listeners] [events] [rate]
+
+
+def main(listeners: int = 500, events: int = 200, rate: int = 50):
+    bus = EventBus(queue_size=events)
+    latencies = []
+    received = [0] * listeners
+    lock = threading.Lock()
+    # publish time of each event id, filled in just before publishing
+    sent_at = {}
+    ready = threading.Barrier(listeners + 1)
+    done = threading.Event()
+
+    def listener(index):
+        subscription = bus.subscribe()
+        ready.wait()
+        local = []
+        try:
+            while received[index] < events and not done.is_set():
+                for event_id, _type, _data in subscription.get(timeout=1.0):
+                    local.append((time.perf_counter() - sent_at[event_id]) * 1000)
+                    received[index] += 1
+        finally:
+            subscription.close()
+            with lock:
+                latencies.extend(local)
+
+    threads = [threading.Thread(target=listener, args=(i,), daemon=True) for i in range(listeners)]
+    for t in threads:
+        t.start()
+    ready.wait()
+
+    start = time.perf_counter()
+    for n in range(events):
+        sent_at[n + 1] = time.perf_counter()
+        bus.publish('bid', {'AuctionId': 1 + n % 6, 'CurrentBid': 1000 + 100 * n, 'HighestBidder': 'bench'})
+        if rate:
+            # pace against the start time so publishing cost doesn't slow the rate
+            delay = start + (n + 1) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    publish_s = time.perf_counter() - start
+    for t in threads:
+        t.join(timeout=10)
+    done.set()
+    elapsed = time.perf_counter() - start
+
+    delivered = sum(received)
+    expected = listeners * events
+    stats = bus.stats()
+    print(f"{listeners} listeners, {events} events published in {publish_s:.2f}s "
+          f"({events / publish_s:.0f}/s), all delivered after {elapsed:.2f}s")
+    print(f"  delivered {delivered} of {expected} ({delivered / elapsed:.0f} deliveries/s), "
+          f"dropped {stats['dropped']}")
+    print(f"  latency p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms, "
+          f"max {max(latencies) if latencies else 0.0:.2f} ms")
+    return 0 if delivered == expected else 1
+
+
+if __name__ == '__main__':
+    run_main(main)
@@ -0,0 +1,87 @@
+import time, random
+from datetime import datetime, timedelta
+from bench_common import run_main
+from database import get_db_connection, bulk_insert
+from migrations import run_migrations
+from services.auction_settlement import settle_expired_auctions
+
+# closes out `auctions` already-finished auctions (about `won`% of them with a winner)
+# and times it, then settles again to check nothing is settled or ordered twice.
+# everything it creates is deleted afterwards and product stock is put back. any real
+# finished auctions waiting in the database get settled along the way.
+# usage: python scripts/bench_auction_settlement.py [auctions] [won] [batch_size]
+
+
+def main(auctions: int = 2000, won: int = 70, batch_size: int = 500):
+    run_migrations()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT TOP 50 ProductId, Stock FROM Products ORDER BY ProductId")
+    products = [(r.ProductId, r.Stock) for r in cur.fetchall()]
+    cur.execute("SELECT TOP 50 UserId FROM Users ORDER BY UserId")
+    users = [r.UserId for r in cur.fetchall()]
+    if not products or not users:
+        conn.close()
+        print('Need some products and users in the database.')
+        return 2
+    cur.execute("SELECT ISNULL(MAX(AuctionId), 0) FROM Auctions")
+    first_id = int(cur.fetchone()[0]) + 1
+
+    # finished a minute ago
+    started, ended = datetime.now() - timedelta(days=3), datetime.now() - timedelta(minutes=1)
+    rows = []
+    for _ in range(auctions):
+        product_id = random.choice(products)[0]
+        winner = random.choice(users) if random.randrange(100) < won else None
+        bid = 1000 + 100 * random.randrange(50)
+        rows.append((product_id, 1000, bid if winner else 1000, winner, started, ended, 'active'))
+    bulk_insert(cur, 'Auctions',
+                ('ProductId', 'StartingBid', 'CurrentBid', 'HighestBidderId', 'StartTime', 'EndTime', 'Status'),
+                rows)
+    conn.commit()
+    expected_sold = sum(1 for row in rows if row[3] is not None)
+
+    try:
+        start = time.perf_counter()
+        first = settle_expired_auctions(batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"settled {first['closed']} auctions ({first['sold']} sold, {first['unsold']} unsold) "
+              f"in {first['batches']} batches, {elapsed:.2f}s ({first['closed'] / elapsed:.0f}/s)")
+
+        second = settle_expired_auctions(batch_size=batch_size)
+        cur.execute("""
+            SELECT COUNT(*) AS Orders, COUNT(DISTINCT o.AuctionId) AS Auctions,
+                   (SELECT COUNT(*) FROM Invoices i JOIN Orders x ON x.OrderId = i.OrderId
+                    WHERE x.AuctionId >= ?) AS Invoices
+            FROM Orders o WHERE o.AuctionId >= ?
+        """, (first_id, first_id))
+        check = cur.fetchone()
+        ok = (second['closed'] == 0 and check.Orders == expected_sold
+              and check.Auctions == expected_sold and check.Invoices == expected_sold)
+        print(f"  second run settled {second['closed']}; {check.Orders} orders and {check.Invoices} invoices "
+              f"for {expected_sold} won auctions: {'OK' if ok else 'MISMATCH'}")
+    finally:
+        cur.execute("""
+            DELETE FROM JobQueue WHERE
+                (Kind = 'invoice.email' AND DedupeKey IN (
+                    SELECT CONCAT('invoice.email:', i.InvoiceId) FROM Invoices i
+                    JOIN Orders o ON o.OrderId = i.OrderId WHERE o.AuctionId >= ?))
+                OR (Kind = 'stock.low_stock' AND DedupeKey IN (
+                    SELECT CONCAT('stock.low_stock:', OrderId) FROM Orders WHERE AuctionId >= ?))
+        """, (first_id, first_id))
+        cur.execute("DELETE FROM Invoices WHERE OrderId IN (SELECT OrderId FROM Orders WHERE AuctionId >= ?)",
+                    (first_id,))
+        cur.execute("DELETE FROM OrderItems WHERE OrderId IN (SELECT OrderId FROM Orders WHERE AuctionId >= ?)",
+                    (first_id,))
+        cur.execute("UPDATE Auctions SET OrderId = NULL WHERE AuctionId >= ?", (first_id,))
+        cur.execute("DELETE FROM Orders WHERE AuctionId >= ?", (first_id,))
+        cur.execute("DELETE FROM Auctions WHERE AuctionId >= ?", (first_id,))
+        for product_id, stock in products:
+            cur.execute("UPDATE Products SET Stock = ? WHERE ProductId = ?", (stock, product_id))
+        conn.commit()
+        conn.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    run_main(main)
@@ -0,0 +1,110 @@
+import time, threading, random
+from decimal import Decimal
+from bench_common import percentile, run_main
+from database import get_db_connection
+from migrations import run_migrations
+from services.bidding import BidEngine, MIN_INCREMENT
+
+# fire thousands of bids at one auction from many threads and check the invariants:
+# the auction ends on the highest accepted bid, BidHistory has exactly one row per
+# accepted bid, and every accepted bid beats the one before it by MIN_INCREMENT.
+# the auction's bids and history are reset first and restored after.
+# usage: python scripts/bench_bid_contention.py <auction_id> [threads] [bids_per_thread]
+
+
+def main(auction_id: int, threads: int = 16, bids: int = 200):
+    run_migrations()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT StartingBid, CurrentBid, HighestBidderId, BidCount, EndTime, Status FROM Auctions WHERE AuctionId = ?",
+        (auction_id,),
+    )
+    original = cur.fetchone()
+    cur.execute("SELECT TOP (?) UserId FROM Users ORDER BY UserId", (threads,))
+    user_ids = [r.UserId for r in cur.fetchall()]
+    if original is None or not user_ids:
+        print('Auction or users not found.')
+        return 2
+    cur.execute("SELECT ISNULL(MAX(BidId), 0) FROM BidHistory WHERE AuctionId = ?", (auction_id,))
+    last_bid_id = int(cur.fetchone()[0])
+    # keep it open for the run, starting from the starting bid
+    cur.execute(
+        """
+        UPDATE Auctions SET CurrentBid = StartingBid, HighestBidderId = NULL, Status = 'active',
+            EndTime = CASE WHEN EndTime < DATEADD(hour, 1, GETDATE()) THEN DATEADD(hour, 1, GETDATE()) ELSE EndTime END
+        WHERE AuctionId = ?
+        """,
+        (auction_id,),
+    )
+    conn.commit()
+    conn.close()
+
+    engine = BidEngine()
+    starting = Decimal(original.StartingBid)
+    accepted, latencies = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def bidder(n):
+        rng = random.Random(n)
+        user_id = user_ids[n % len(user_ids)]
+        barrier.wait()
+        for i in range(bids):
+            # bids climb overall but overlap heavily between threads
+            amount = starting + MIN_INCREMENT * (i + 1) + Decimal(rng.randint(-150, 150))
+            start = time.perf_counter()
+            ok, _message, state = engine.place(auction_id, user_id, amount)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if ok:
+                    accepted.append(state.CurrentBid)
+
+    workers = [threading.Thread(target=bidder, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT CurrentBid FROM Auctions WHERE AuctionId = ?", (auction_id,))
+    final_bid = cur.fetchone()[0]
+    cur.execute(
+        "SELECT Amount, PreviousBid FROM BidHistory WHERE AuctionId = ? AND BidId > ? ORDER BY BidId",
+        (auction_id, last_bid_id),
+    )
+    history = cur.fetchall()
+
+    total = threads * bids
+    print(f"Bids: {total} from {threads} threads in {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+    print(f"  latency p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms, "
+          f"p99 {percentile(latencies, 99):.1f} ms")
+    print(f"  accepted {len(accepted)}, rejected {total - len(accepted)}")
+    increasing = all(
+        row.Amount >= row.PreviousBid + MIN_INCREMENT for row in history if row.PreviousBid is not None
+    ) and all(a.Amount < b.Amount for a, b in zip(history, history[1:]))
+    ok = (
+        len(history) == len(accepted)
+        and (not accepted or final_bid == max(accepted))
+        and increasing
+    )
+    print(f"  history rows {len(history)}, final bid R{final_bid}, highest accepted R{max(accepted) if accepted else '-'}")
+    print('OK' if ok else 'LOST OR OUT-OF-ORDER BIDS FOUND')
+
+    # put the auction back the way it was (the run's history goes with it)
+    cur.execute("DELETE FROM BidHistory WHERE AuctionId = ? AND BidId > ?", (auction_id, last_bid_id))
+    cur.execute(
+        "UPDATE Auctions SET CurrentBid = ?, HighestBidderId = ?, BidCount = ?, EndTime = ?, Status = ? WHERE AuctionId = ?",
+        (original.CurrentBid, original.HighestBidderId, original.BidCount, original.EndTime, original.Status, auction_id),
+    )
+    conn.commit()
+    conn.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    run_main(main, 'python scripts/bench_bid_contention.py <auction_id> [threads] [bids_per_thread]', required=1)
@@ -0,0 +1,60 @@
+import sys, os, time, tempfile
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from database import sqlite_connect, bulk_insert
+
+# compare the old multi-row write patterns against bulk_insert at 10/100/1000 rows
+# on a file-backed sqlite stand-in (commits hit the disk like they would on a server):
+#   commit per row  - reorder() calling Cart.save per item
+#   row by row      - the old checkout loop (one INSERT per line, one commit)
+#   bulk_insert     - one executemany batch, one commit
+SIZES = (10, 100, 1000)
+COLUMNS = ('OrderId', 'ProductId', 'Quantity', 'Price')
+
+
+def make_rows(count):
+    return [(1, i, 1 + i % 3, 99.99) for i in range(count)]
+
+
+def commit_per_row(conn, rows):
+    cursor = conn.cursor()
+    for row in rows:
+        cursor.execute("INSERT INTO OrderItems (OrderId, ProductId, Quantity, Price) VALUES (?, ?, ?, ?)", row)
+        conn.commit()
+
+
+def row_by_row(conn, rows):
+    cursor = conn.cursor()
+    for row in rows:
+        cursor.execute("INSERT INTO OrderItems (OrderId, ProductId, Quantity, Price) VALUES (?, ?, ?, ?)", row)
+    conn.commit()
+
+
+def bulk(conn, rows):
+    cursor = conn.cursor()
+    bulk_insert(cursor, 'OrderItems', COLUMNS, rows)
+    conn.commit()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite_connect(os.path.join(tmp, 'bench.db'))
+        conn.execute("CREATE TABLE OrderItems (OrderItemId INTEGER PRIMARY KEY, OrderId INT, ProductId INT, Quantity INT, Price NUMERIC)")
+        conn.commit()
+        print(f"{'rows':>6}  {'commit per row':>16}  {'row by row':>12}  {'bulk_insert':>12}")
+        for size in SIZES:
+            rows = make_rows(size)
+            timings = []
+            for writer in (commit_per_row, row_by_row, bulk):
+                conn.execute("DELETE FROM OrderItems")
+                conn.commit()
+                start = time.perf_counter()
+                writer(conn, rows)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{size:>6}  {timings[0]:>13.2f} ms  {timings[1]:>9.2f} ms  {timings[2]:>9.2f} ms")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
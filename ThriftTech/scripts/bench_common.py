@@ -0,0 +1,27 @@
+import sys, os
+
+# shared bits of the benchmark and load scripts. importing this puts the app directory
+# on sys.path, so the app's modules can be imported right after it
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (0.0 when there are none)."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run_main(main, usage=None, required=0, max_args=3):
+    """
+    Call main() with the command line's arguments as ints and exit with what it returns.
+    with fewer than `required` arguments, print the usage line and exit 2 instead.
+    """
+    args = sys.argv[1:]
+    if len(args) < required:
+        print(f'usage: {usage}')
+        sys.exit(2)
+    sys.exit(main(*(int(a) for a in args[:max_args])))
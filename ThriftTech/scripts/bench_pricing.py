@@ -0,0 +1,82 @@
+import sys, os, time, random
+from decimal import Decimal
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from services.pricing import PricingEngine, BulkDiscountRule, DEFAULT_RULES, cart_totals
+
+# spot-check the pricing rules, compare them with the old float implementation and
+# time per-cart pricing against the batch mode (default 100k carts)
+
+
+def legacy_totals(subtotal, points):
+    # the float cart totals checkout used before the pricing engine
+    subtotal = float(subtotal)
+    tax = subtotal * 0.15
+    shipping = 0.0 if subtotal > 500.0 else 85.0
+    loyalty = min(float(points) * 0.10, subtotal * 0.10) if points is not None else 0
+    bulk = subtotal * 0.05 if subtotal > 1000.0 else 0
+    total_discount = loyalty + bulk
+    return {
+        'subtotal': round(subtotal, 2), 'tax': round(tax, 2), 'shipping': round(shipping, 2),
+        'loyalty_discount': round(loyalty, 2), 'bulk_discount': round(bulk, 2),
+        'total_discount': round(total_discount, 2), 'total': round(subtotal + tax + shipping - total_discount, 2),
+    }
+
+
+def check_rules():
+    assert cart_totals(Decimal('100')) == {
+        'subtotal': Decimal('100.00'), 'tax': Decimal('15.00'), 'shipping': Decimal('85.00'),
+        'loyalty_discount': Decimal('0.00'), 'bulk_discount': Decimal('0.00'),
+        'total_discount': Decimal('0.00'), 'total': Decimal('200.00'),
+    }
+    assert cart_totals(Decimal('600'))['shipping'] == 0
+    big = cart_totals(Decimal('2000'), loyalty_points=5000)
+    assert big['loyalty_discount'] == Decimal('200.00') and big['bulk_discount'] == Decimal('100.00')
+    assert big['total'] == Decimal('2000.00')
+    # VAT on R0.10 is 1.5c, which rounds half-up to 2c (float round() gave 1c)
+    assert cart_totals(Decimal('0.10'))['tax'] == Decimal('0.02')
+    # pluggable tiers: 10% off over R5000
+    tiered = PricingEngine(DEFAULT_RULES[:3] + (BulkDiscountRule([(1000, '0.05'), (5000, '0.10')]),))
+    assert tiered.price(Decimal('6000'))['bulk_discount'] == Decimal('600.00')
+    print('Pricing rules: ok')
+
+
+def main(carts: int = 100_000):
+    check_rules()
+    rng = random.Random(42)
+    batch = [
+        (sum(Decimal(rng.randint(5000, 90000)) / 100 * rng.randint(1, 3) for _ in range(rng.randint(1, 6))),
+         rng.choice([None, 0, 120, 4000]))
+        for _ in range(carts)
+    ]
+    engine = PricingEngine()
+
+    start = time.perf_counter()
+    for subtotal, points in batch:
+        legacy_totals(subtotal, points)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [engine.price(subtotal, points) for subtotal, points in batch]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = engine.price_many(batch)
+    batch_time = time.perf_counter() - start
+    assert batched == single
+
+    # cents where the old float rounding disagrees with exact half-up rounding
+    differences = sum(
+        1 for (subtotal, points), totals in zip(batch, batched)
+        if any(abs(Decimal(str(value)) - totals[key]) > 0 for key, value in legacy_totals(subtotal, points).items())
+    )
+    print(f"Carts: {carts}")
+    print(f"  float (old)          {legacy_time * 1000:8.1f} ms")
+    print(f"  engine, per cart     {single_time * 1000:8.1f} ms")
+    print(f"  engine, price_many   {batch_time * 1000:8.1f} ms")
+    print(f"  carts where the old float rounding was off by a cent: {differences}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
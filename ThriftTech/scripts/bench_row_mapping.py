@@ -0,0 +1,85 @@
+import sys, os, time, tracemalloc
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from database import sqlite_connect
+from models.rows import map_rows
+
+# compare the old per-row dict building against the shared record classes
+# on an in-memory catalog (default 100k rows): time per row and memory held
+COLUMNS = 'ProductId, Title, Description, Price, Category, Photo, Quantity, SellerId, CreatedAt, UpdatedAt, DailyRate'
+
+
+def build_catalog(rows):
+    conn = sqlite_connect()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE Products (
+            ProductId INTEGER PRIMARY KEY, Title TEXT, Description TEXT, Price REAL,
+            Category TEXT, Photo TEXT, Quantity INTEGER, SellerId INTEGER,
+            CreatedAt TEXT, UpdatedAt TEXT, DailyRate REAL
+        )
+    """)
+    cur.executemany(
+        "INSERT INTO Products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, f"Product {i}", 'Refurbished and tested', 100.0 + i % 900, 'laptops',
+          f"img/{i}.jpg", 1, i % 50, '2024-01-01', '2024-01-01', None) for i in range(1, rows + 1))
+    )
+    conn.commit()
+    return conn
+
+
+def as_dicts(cursor, rows):
+    # what the models used to do
+    products = []
+    for r in rows:
+        products.append({
+            'ProductId': r.ProductId,
+            'Title': r.Title,
+            'name': r.Title,
+            'Description': r.Description,
+            'Price': r.Price,
+            'Category': r.Category,
+            'Photo': r.Photo,
+            'Quantity': r.Quantity,
+            'SellerId': r.SellerId,
+            'CreatedAt': r.CreatedAt,
+            'UpdatedAt': r.UpdatedAt,
+            'DailyRate': r.DailyRate,
+        })
+    return products
+
+
+def as_records(cursor, rows):
+    return map_rows(cursor, rows, {'name': 'Title'})
+
+
+def measure(conn, mapper):
+    cur = conn.cursor()
+    cur.execute(f"SELECT {COLUMNS} FROM Products")
+    rows = cur.fetchall()
+    # time without tracemalloc (it slows every allocation), then measure memory separately
+    start = time.perf_counter()
+    mapped = mapper(cur, rows)
+    elapsed = time.perf_counter() - start
+    del mapped
+    tracemalloc.start()
+    mapped = mapper(cur, rows)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # touch a field the way a template would
+    assert mapped[-1]['Title'] == mapped[-1].get('name')
+    return elapsed, current, len(mapped)
+
+
+def main(rows: int = 100_000):
+    conn = build_catalog(rows)
+    print(f"Catalog rows: {rows}")
+    for label, mapper in (('dict per row', as_dicts), ('record class', as_records)):
+        elapsed, memory, count = measure(conn, mapper)
+        print(f"  {label:<13} {elapsed * 1e9 / count:8.0f} ns/row   {memory / count:6.0f} bytes/row   ({memory / 1e6:.1f} MB total)")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,130 @@
+import time, threading
+from bench_common import percentile, run_main
+from database import get_db_connection
+from migrations import run_migrations
+from services.stock import StockService, OutOfStock
+
+# many buyers racing for one hot product: each reserves a unit (add to cart) and then
+# takes it (the checkout's stock step), all released at once. checks that exactly
+# `stock` buyers succeed and stock never goes below 0, then does the same with the old
+# read-then-write approach to show how it oversells. restores the product's stock after.
+# usage: python scripts/bench_stock_contention.py <product_id> [buyers] [stock]
+
+
+def set_stock(product_id, stock):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE Products SET Stock = ? WHERE ProductId = ?", (stock, product_id))
+    cur.execute("DELETE FROM StockReservations WHERE ProductId = ?", (product_id,))
+    conn.commit()
+    conn.close()
+
+
+def get_stock(product_id):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT Stock FROM Products WHERE ProductId = ?", (product_id,))
+    stock = cur.fetchone()[0]
+    conn.close()
+    return stock
+
+
+def buy_with_reservation(user_id, product_id):
+    if StockService.reserve(user_id, product_id, 1) is not None:
+        return 'no reservation'
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        StockService.take_for_order(cur, user_id, [(product_id, 1)])
+        conn.commit()
+        return 'bought'
+    except OutOfStock:
+        conn.rollback()
+        return 'out of stock'
+    finally:
+        conn.close()
+
+
+def buy_read_then_write(user_id, product_id):
+    # what a naive checkout would do: read, check in python, write back
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT Stock FROM Products WHERE ProductId = ?", (product_id,))
+        stock = cur.fetchone()[0]
+        if stock < 1:
+            return 'out of stock'
+        cur.execute("UPDATE Products SET Stock = ? WHERE ProductId = ?", (stock - 1, product_id))
+        conn.commit()
+        return 'bought'
+    finally:
+        conn.close()
+
+
+def race(label, buy, user_ids, product_id):
+    results, latencies = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(user_ids))
+
+    def buyer(user_id):
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            outcome = buy(user_id, product_id)
+        except Exception as e:
+            outcome = f"error: {type(e).__name__}"
+        with lock:
+            results.append(outcome)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=buyer, args=(uid,)) for uid in user_ids]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    counts = {outcome: results.count(outcome) for outcome in set(results)}
+    print(f"{label}: {len(user_ids)} buyers in {elapsed:.2f}s, "
+          f"p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms")
+    print(f"  outcomes: {counts}")
+    return counts.get('bought', 0)
+
+
+def main(product_id: int, buyers: int = 50, stock: int = 5):
+    run_migrations()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT Stock FROM Products WHERE ProductId = ?", (product_id,))
+    row = cur.fetchone()
+    cur.execute("SELECT TOP (?) UserId FROM Users ORDER BY UserId", (buyers,))
+    user_ids = [r.UserId for r in cur.fetchall()]
+    conn.close()
+    if row is None or not user_ids:
+        print('Product or users not found.')
+        return 2
+    original = row[0]
+    if len(user_ids) < buyers:
+        # one reservation per user, so fewer users means fewer distinct buyers
+        print(f"Only {len(user_ids)} users in the database; using {len(user_ids)} buyers.")
+
+    try:
+        set_stock(product_id, stock)
+        bought = race('reserve + conditional decrement', buy_with_reservation, user_ids, product_id)
+        left = get_stock(product_id)
+        expected = min(stock, len(user_ids))
+        ok = bought == expected and left == stock - bought and left >= 0
+        print(f"  sold {bought} of {stock}, stock left {left}: {'OK' if ok else 'OVERSOLD OR LOST SALES'}")
+
+        set_stock(product_id, stock)
+        bought = race('read then write (old)', buy_read_then_write, user_ids, product_id)
+        left = get_stock(product_id)
+        print(f"  sold {bought} of {stock}, stock left {left}"
+              f"{f' - oversold by {bought - stock}' if bought > stock else ''}")
+    finally:
+        set_stock(product_id, original)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    run_main(main, 'python scripts/bench_stock_contention.py <product_id> [buyers] [stock]', required=1)
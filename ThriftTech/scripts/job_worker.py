@@ -0,0 +1,40 @@
+import sys, os, time
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from migrations import run_migrations
+from services.jobs import JobWorker, purge_finished, job_queue_stats
+
+# run background jobs in their own process instead of (or next to) the web app's threads
+# usage: python scripts/job_worker.py [threads]   - run until interrupted
+#        python scripts/job_worker.py --drain     - run what's due now, print stats, exit
+#        python scripts/job_worker.py --purge [days] - delete jobs finished over N days ago
+
+
+def main(argv):
+    run_migrations()
+    if '--purge' in argv:
+        rest = argv[argv.index('--purge') + 1:]
+        print(f"Purged {purge_finished(int(rest[0]) if rest else 7)} finished jobs.")
+        return 0
+    if '--drain' in argv:
+        worker = JobWorker(threads=0)
+        worker.start()
+        print(f"Ran {worker.drain()} jobs.")
+        print(job_queue_stats()['queue'])
+        print(worker.stats())
+        return 0
+    worker = JobWorker(threads=int(argv[0]) if argv else 4)
+    worker.start()
+    print(f"Job worker running with {worker.threads} threads (Ctrl+C to stop).")
+    try:
+        while True:
+            time.sleep(60)
+            print(worker.stats())
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
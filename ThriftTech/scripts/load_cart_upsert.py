@@ -0,0 +1,58 @@
+import time, threading
+from bench_common import run_main
+from database import get_db_connection
+from migrations import run_migrations
+from models.cart import Cart
+
+# hammer Cart.save for one (user, product) from many threads at once, like repeated
+# add-to-cart clicks, then check the cart still has exactly one line with the summed quantity
+# usage: python scripts/load_cart_upsert.py <user_id> <product_id> [threads] [clicks_per_thread]
+
+
+def cart_lines(user_id, product_id):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(Quantity), 0) FROM Cart WHERE UserId = ? AND ProductId = ?", (user_id, product_id))
+    row = cur.fetchone()
+    conn.close()
+    return int(row[0]), int(row[1])
+
+
+def main(user_id: int, product_id: int, threads: int = 8, clicks: int = 25):
+    run_migrations()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM Cart WHERE UserId = ? AND ProductId = ?", (user_id, product_id))
+    conn.commit()
+    conn.close()
+
+    failures = []
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(clicks):
+            if not Cart(user_id=user_id, product_id=product_id, quantity=1).save():
+                failures.append(1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    saves = threads * clicks
+    lines, quantity = cart_lines(user_id, product_id)
+    print(f"Saves: {saves} from {threads} threads in {elapsed:.2f}s ({elapsed * 1000 / saves:.1f} ms each, 1 statement per save)")
+    print(f"Failed saves: {len(failures)}")
+    print(f"Cart lines: {lines} (expected 1), quantity: {quantity} (expected {saves - len(failures)})")
+    ok = lines == 1 and quantity == saves - len(failures)
+    print('OK' if ok else 'DUPLICATES OR LOST UPDATES FOUND')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    run_main(main, 'python scripts/load_cart_upsert.py <user_id> <product_id> [threads] [clicks_per_thread]',
+             required=2, max_args=4)
@@ -0,0 +1,31 @@
+import sys, os
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from database import get_db_connection
+from migrations import MIGRATIONS, current_version, latest_version, run_migrations
+
+# apply pending schema migrations (or just show status with --status)
+def main(status_only: bool = False):
+    if status_only:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            version = current_version(cur)
+        except Exception:
+            version = 0
+        conn.close()
+        print(f"Schema version: {version} (latest: {latest_version()})")
+        for number, name, _ in MIGRATIONS:
+            print(f"  [{'x' if number <= version else ' '}] {number}: {name}")
+        return
+    applied = run_migrations(verbose=True)
+    if applied:
+        print(f"Applied migrations: {applied}")
+    else:
+        print('Schema already up to date.')
+    print(f"Schema version: {latest_version()}")
+
+
+if __name__ == '__main__':
+    main(status_only='--status' in sys.argv)
@@ -0,0 +1,26 @@
+import sys, os
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from services.loyalty import LoyaltyLedger
+
+# nightly check: every LoyaltyPoints balance must equal the sum of its ledger rows
+# exits 1 when mismatches are found (so a scheduler can alert); --fix resets the
+# balances to the ledger totals
+
+
+def main(fix: bool = False):
+    mismatches = LoyaltyLedger.reconcile(fix=fix)
+    if not mismatches:
+        print('Loyalty balances match the ledger.')
+        return 0
+    print(f"Mismatched balances: {len(mismatches)}")
+    for user_id, balance, ledger_points in mismatches:
+        print(f"  user {user_id}: balance {balance}, ledger {ledger_points} ({ledger_points - balance:+d})")
+    if fix:
+        print('Balances reset to the ledger totals.')
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(fix='--fix' in sys.argv))
@@ -0,0 +1,191 @@
+import heapq
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from decimal import Decimal
+
+# live auction updates: an in-process pub/sub bus that /auction/stream (server-sent
+# events) listens on.
+# - 'bid' events come from the bid engine after a bid commits
+# - 'close' events come from auction settlement (services/auction_settlement.py), and
+#   from a timer on the end times the bus has seen, so listeners hear about an auction
+#   ending on time without anything polling the database
+# every listener has its own bounded queue, so one slow client can't hold up the rest
+# (it just misses its oldest events). the bus only reaches listeners in the process
+# that published; other worker processes pick changes up from the auction cache.
+
+# events kept for clients that reconnect with Last-Event-ID
+REPLAY_SIZE = 256
+# events a listener can fall behind by before its oldest are dropped
+LISTENER_QUEUE_SIZE = 100
+# comment line sent to idle streams so proxies don't close them
+HEARTBEAT_SECONDS = 15.0
+# how long a closed auction is remembered so it isn't announced twice (the timer and
+# settlement both report it, a maintenance interval or so apart)
+CLOSED_MEMORY_SECONDS = 3600
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class Subscription:
+    """One listener's queue of (id, type, json data) events."""
+
+    def __init__(self, bus, maxlen):
+        self._bus = bus
+        self._events = deque(maxlen=maxlen)
+        self._ready = threading.Event()
+        self.dropped = 0
+
+    def push(self, event):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    def get(self, timeout=None):
+        """Pending events (waits up to `timeout` seconds for one; [] if none came)."""
+        if not self._events:
+            self._ready.wait(timeout)
+        self._ready.clear()
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, replay_size=REPLAY_SIZE, queue_size=LISTENER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._replay = deque(maxlen=replay_size)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'subscribed': 0, 'dropped': 0}
+        # auction end-time timer: heap of (EndTime, AuctionId), and AuctionId -> when its
+        # 'close' went out (oldest first, dropped after CLOSED_MEMORY_SECONDS)
+        self._ends = []
+        self._tracked = {}
+        self._closed = OrderedDict()
+        self._timer = None
+        self._wake = threading.Condition(self._lock)
+
+    def subscribe(self, last_event_id=None):
+        """New listener; with last_event_id it first gets the newer events still kept."""
+        subscription = Subscription(self, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._replay:
+                    if event[0] > last_event_id:
+                        subscription.push(event)
+            self._subscribers.add(subscription)
+            self._stats['subscribed'] += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                self._stats['dropped'] += subscription.dropped
+
+    def publish(self, event_type, data):
+        """Send an event to every listener; returns its id."""
+        payload = json.dumps(data, default=_json_default)
+        with self._lock:
+            event = (self._next_id, event_type, payload)
+            self._next_id += 1
+            self._replay.append(event)
+            subscribers = list(self._subscribers)
+            self._stats['published'] += 1
+            self._stats['delivered'] += len(subscribers)
+        for subscription in subscribers:
+            subscription.push(event)
+        return event[0]
+
+    # close events
+
+    def track(self, auctions):
+        """Remember (AuctionId, EndTime) pairs so a 'close' goes out when each one ends."""
+        with self._lock:
+            for auction_id, end_time in auctions:
+                if auction_id in self._closed or self._tracked.get(auction_id) == end_time:
+                    continue
+                self._tracked[auction_id] = end_time
+                heapq.heappush(self._ends, (end_time, auction_id))
+            self._start_timer()
+            self._wake.notify()
+
+    def closed(self, auction_ids, reason='ended'):
+        """Publish 'close' for auctions that haven't had one yet."""
+        now = time.monotonic()
+        with self._lock:
+            while self._closed and now - next(iter(self._closed.values())) > CLOSED_MEMORY_SECONDS:
+                self._closed.popitem(last=False)
+            fresh = [auction_id for auction_id in auction_ids if auction_id not in self._closed]
+            for auction_id in fresh:
+                self._closed[auction_id] = now
+                self._tracked.pop(auction_id, None)
+        for auction_id in fresh:
+            self.publish('close', {'AuctionId': auction_id, 'reason': reason})
+        return len(fresh)
+
+    def _start_timer(self):
+        # called with the lock held
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Thread(target=self._run_timer, name='auction-close-timer', daemon=True)
+            self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            with self._lock:
+                due = []
+                now = datetime.now()
+                while self._ends and self._ends[0][0] <= now:
+                    end_time, auction_id = heapq.heappop(self._ends)
+                    # skip entries that were re-tracked with a different end time
+                    if self._tracked.get(auction_id) == end_time:
+                        due.append(auction_id)
+                wait = (self._ends[0][0] - now).total_seconds() if self._ends else 60.0
+                if not due:
+                    self._wake.wait(min(max(wait, 0.05), 60.0))
+                    continue
+            self.closed(due)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['listeners'] = len(self._subscribers)
+            snapshot['tracked_auctions'] = len(self._tracked)
+            snapshot['dropped'] += sum(s.dropped for s in self._subscribers)
+            snapshot['last_event_id'] = self._next_id - 1
+        return snapshot
+
+
+auction_events = EventBus()
+
+
+def sse_stream(bus, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    """Generator of server-sent event text for one client; unsubscribes when the client goes."""
+    subscription = bus.subscribe(last_event_id)
+    try:
+        # tell EventSource how long to wait before reconnecting
+        yield 'retry: 3000\n\n'
+        while True:
+            events = subscription.get(timeout=heartbeat)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            yield ''.join(f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+                          for event_id, event_type, data in events)
+    finally:
+        subscription.close()
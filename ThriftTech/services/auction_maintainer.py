@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+
+from models.auction import Auction, auction_cache
+from services.auction_settlement import settle_expired_auctions, settlement_stats
+from services.jobs import job_handler, schedule_periodic
+
+# auction lifecycle, run as a recurring job (every MAINTAIN_SECONDS, once per slot
+# across all processes) instead of on every /auction page view:
+# - close and settle auctions whose EndTime has passed (winners get an order and an
+#   invoice, see services/auction_settlement.py)
+# - top the pool of active auctions back up to ACTIVE_AUCTION_TARGET
+# - drop the cached list everywhere if anything changed, then reload it here
+
+MAINTAIN_SECONDS = int(os.getenv('THRIFTTECH_AUCTION_MAINTAIN', '60'))
+ACTIVE_AUCTION_TARGET = 6
+
+_last_run = {}
+_lock = threading.Lock()
+
+
+def maintain_auctions():
+    start = time.perf_counter()
+    settled = settle_expired_auctions()
+    closed = settled['closed']
+    created = Auction.seed_sample_auctions(ACTIVE_AUCTION_TARGET)
+    if closed or created:
+        auction_cache.invalidate()
+    active = len(Auction.get_active_auctions())
+    with _lock:
+        _last_run.update({
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'closed': closed,
+            'sold': settled['sold'],
+            'created': created,
+            'active': active,
+            'ms': round((time.perf_counter() - start) * 1000, 1),
+        })
+    return closed, created
+
+
+def schedule_maintenance(now=False):
+    return schedule_periodic('auction.maintain', MAINTAIN_SECONDS, now=now)
+
+
+@job_handler('auction.maintain')
+def run_maintenance(payload):
+    try:
+        maintain_auctions()
+    finally:
+        # keep the chain going even if this run failed (the retry is harmless)
+        schedule_maintenance()
+
+
+def auction_stats():
+    with _lock:
+        last_run = dict(_last_run)
+    return {
+        'cache': auction_cache.stats(),
+        'last_maintenance': last_run,
+        'interval': MAINTAIN_SECONDS,
+        'settlement': settlement_stats(),
+    }
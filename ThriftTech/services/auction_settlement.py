@@ -0,0 +1,135 @@
+import threading
+import time
+
+from database import get_db_connection
+from migrations import ensure_schema
+from services.auction_events import auction_events
+from services.catalog_cache import invalidate_catalog
+from services.jobs import job_worker
+from services.order_jobs import enqueue_many_order_jobs
+
+# auction close-out: finished auctions are settled in batches of SETTLE_BATCH_SIZE, each
+# batch one set-based statement batch in its own transaction on a single connection:
+# - claim the batch (READPAST, so two settlement runs never take the same auction) and
+#   mark it ended + settled
+# - an order (pending payment), an order item and an invoice for every auction with a
+#   winner, all via INSERT ... SELECT with OUTPUT INTO to carry the new ids along
+# - one unit of each sold product comes off the shelf
+# then, still in the batch's transaction, the invoice email and low stock jobs are
+# queued the way checkout queues them
+# a batch commits or rolls back as a whole and SettledAt is the "done" flag, so a run
+# that dies half way just leaves the rest for the next run. UX_Orders_AuctionId makes
+# a second order for the same auction impossible.
+
+SETTLE_BATCH_SIZE = 500
+
+_SETTLE_SQL = """
+    SET NOCOUNT ON
+    DECLARE @batch TABLE (AuctionId INT PRIMARY KEY, ProductId INT, WinnerId INT, Amount DECIMAL(10,2));
+    DECLARE @orders TABLE (OrderId INT, AuctionId INT, UserId INT, Amount DECIMAL(10,2));
+    DECLARE @invoices TABLE (InvoiceId INT PRIMARY KEY, OrderId INT);
+
+    WITH due AS (
+        SELECT TOP (?) * FROM Auctions WITH (ROWLOCK, READPAST, UPDLOCK)
+        WHERE SettledAt IS NULL AND Status IN ('active', 'ended') AND EndTime <= GETDATE()
+        ORDER BY EndTime, AuctionId
+    )
+    UPDATE due SET Status = 'ended', SettledAt = GETDATE()
+    OUTPUT INSERTED.AuctionId, INSERTED.ProductId, INSERTED.HighestBidderId, INSERTED.CurrentBid INTO @batch;
+
+    INSERT INTO Orders (UserId, TotalAmount, Status, AuctionId)
+    OUTPUT INSERTED.OrderId, INSERTED.AuctionId, INSERTED.UserId, INSERTED.TotalAmount INTO @orders
+    SELECT b.WinnerId, b.Amount, 'pending', b.AuctionId
+    FROM @batch b
+    WHERE b.WinnerId IS NOT NULL AND b.Amount > 0
+      AND NOT EXISTS (SELECT 1 FROM Orders o WHERE o.AuctionId = b.AuctionId);
+
+    INSERT INTO OrderItems (OrderId, ProductId, Quantity, Price)
+    SELECT o.OrderId, b.ProductId, 1, o.Amount
+    FROM @orders o JOIN @batch b ON b.AuctionId = o.AuctionId;
+
+    INSERT INTO Invoices (UserId, OrderId, Total, CreatedAt)
+    OUTPUT INSERTED.InvoiceId, INSERTED.OrderId INTO @invoices
+    SELECT o.UserId, o.OrderId, o.Amount, GETDATE() FROM @orders o;
+
+    UPDATE a SET OrderId = o.OrderId
+    FROM Auctions a JOIN @orders o ON o.AuctionId = a.AuctionId;
+
+    UPDATE p SET Stock = CASE WHEN p.Stock >= s.Sold THEN p.Stock - s.Sold ELSE 0 END, UpdatedAt = GETDATE()
+    FROM Products p
+    JOIN (SELECT b.ProductId, COUNT(*) AS Sold
+          FROM @orders o JOIN @batch b ON b.AuctionId = o.AuctionId
+          GROUP BY b.ProductId) s ON s.ProductId = p.ProductId
+    WHERE p.Stock IS NOT NULL;
+
+    SELECT b.AuctionId, o.UserId, o.OrderId, i.InvoiceId
+    FROM @batch b
+    LEFT JOIN @orders o ON o.AuctionId = b.AuctionId
+    LEFT JOIN @invoices i ON i.OrderId = o.OrderId;
+    SET NOCOUNT OFF;
+"""
+
+_stats = {'runs': 0, 'batches': 0, 'closed': 0, 'sold': 0, 'unsold': 0, 'errors': 0}
+_last_run = {}
+_stats_lock = threading.Lock()
+
+
+def settle_expired_auctions(batch_size=SETTLE_BATCH_SIZE, max_batches=None):
+    """
+    Close and settle every finished auction (or `max_batches` batches of them).
+    returns {'closed', 'sold', 'unsold', 'batches'}; a failing batch is rolled back and
+    the error re-raised, with the batches before it kept.
+    """
+    ensure_schema()
+    start = time.perf_counter()
+    result = {'closed': 0, 'sold': 0, 'unsold': 0, 'batches': 0}
+    sold, unsold = [], []
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        while max_batches is None or result['batches'] < max_batches:
+            try:
+                cursor.execute(_SETTLE_SQL, (batch_size,))
+                rows = cursor.fetchall()
+                # auction wins earn no loyalty points
+                enqueue_many_order_jobs(cursor, [
+                    (row.UserId, row.OrderId, row.InvoiceId, 0) for row in rows if row.OrderId is not None
+                ])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                with _stats_lock:
+                    _stats['errors'] += 1
+                raise
+            if not rows:
+                break
+            result['batches'] += 1
+            for row in rows:
+                (sold if row.OrderId is not None else unsold).append(row.AuctionId)
+            if len(rows) < batch_size:
+                break
+    finally:
+        conn.close()
+        result.update(closed=len(sold) + len(unsold), sold=len(sold), unsold=len(unsold))
+        with _stats_lock:
+            _stats['runs'] += 1
+            for key in ('batches', 'closed', 'sold', 'unsold'):
+                _stats[key] += result[key]
+            _last_run.update(result, at=time.strftime('%Y-%m-%d %H:%M:%S'),
+                             ms=round((time.perf_counter() - start) * 1000, 1))
+
+    auction_events.closed(sold, reason='sold')
+    auction_events.closed(unsold)
+    if sold:
+        # sold products have less stock now
+        invalidate_catalog()
+        job_worker.wake()
+    return result
+
+
+def settlement_stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+        snapshot['last_run'] = dict(_last_run)
+    snapshot['batch_size'] = SETTLE_BATCH_SIZE
+    return snapshot
@@ -0,0 +1,149 @@
+import threading
+import time
+from decimal import Decimal
+
+from database import get_db_connection
+from migrations import ensure_schema
+from models.rows import make_record
+from services.pricing import to_cents, to_decimal
+
+# auction bids: a bid is accepted only by the conditional UPDATE itself (auction still
+# active, not ended, bid at least the current price + MIN_INCREMENT), so two racing bids
+# can never both pass the check and a lower one can never overwrite a higher one.
+# the same batch appends the accepted bid to BidHistory and hands back the auction's new
+# (or, for a rejected bid, current) state: one round trip, one transaction.
+
+MIN_INCREMENT = Decimal('100')
+
+# state of an auction after a bid
+BID_STATE_FIELDS = (
+    'AuctionId', 'CurrentBid', 'StartingBid', 'HighestBidderId', 'HighestBidder', 'EndTime', 'Status', 'BidCount',
+    'ServerTime',
+)
+
+_BID_SQL = """
+    SET NOCOUNT ON
+    DECLARE @accepted TABLE (
+        AuctionId INT, CurrentBid DECIMAL(10,2), StartingBid DECIMAL(10,2), HighestBidderId INT,
+        EndTime DATETIME, Status NVARCHAR(20), BidCount INT,
+        PreviousBid DECIMAL(10,2), PreviousBidderId INT
+    );
+
+    UPDATE Auctions
+    SET CurrentBid = ?, HighestBidderId = ?, BidCount = BidCount + 1
+    OUTPUT INSERTED.AuctionId, INSERTED.CurrentBid, INSERTED.StartingBid, INSERTED.HighestBidderId,
+           INSERTED.EndTime, INSERTED.Status, INSERTED.BidCount,
+           DELETED.CurrentBid, DELETED.HighestBidderId
+    INTO @accepted
+    WHERE AuctionId = ? AND Status = 'active' AND EndTime > GETDATE()
+      AND COALESCE(NULLIF(CurrentBid, 0), StartingBid) <= ? - ?;
+
+    INSERT INTO BidHistory (AuctionId, UserId, Amount, PreviousBid, PreviousBidderId)
+    SELECT AuctionId, HighestBidderId, CurrentBid, PreviousBid, PreviousBidderId FROM @accepted;
+
+    IF EXISTS (SELECT 1 FROM @accepted)
+        SELECT CAST(1 AS BIT) AS Accepted, a.AuctionId, a.CurrentBid, a.StartingBid, a.HighestBidderId,
+               u.FullName AS HighestBidder, a.EndTime, a.Status, a.BidCount, GETDATE() AS ServerTime
+        FROM @accepted a LEFT JOIN Users u ON u.UserId = a.HighestBidderId
+    ELSE
+        SELECT CAST(0 AS BIT) AS Accepted, a.AuctionId, a.CurrentBid, a.StartingBid, a.HighestBidderId,
+               u.FullName AS HighestBidder, a.EndTime, a.Status, a.BidCount, GETDATE() AS ServerTime
+        FROM Auctions a LEFT JOIN Users u ON u.UserId = a.HighestBidderId
+        WHERE a.AuctionId = ?;
+    SET NOCOUNT OFF;
+"""
+
+
+def minimum_bid(current_bid, starting_bid):
+    """Lowest acceptable next bid: the current bid (or the starting bid) + MIN_INCREMENT."""
+    current = to_decimal(current_bid)
+    base = current if current > 0 else to_decimal(starting_bid)
+    return base + MIN_INCREMENT
+
+
+class BidEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {'accepted': 0, 'too_low': 0, 'ended': 0, 'not_found': 0, 'errors': 0, 'total_ms': 0.0}
+        # callbacks(state) run after an accepted bid commits (e.g. live auction updates)
+        self._listeners = []
+
+    def on_accepted(self, callback):
+        self._listeners.append(callback)
+        return callback
+
+    def _count(self, outcome, elapsed_ms=0.0):
+        with self._lock:
+            self._stats[outcome] += 1
+            self._stats['total_ms'] += elapsed_ms
+
+    def place(self, auction_id, user_id, amount):
+        """
+        Try a bid. returns (accepted, message, state) where state is the auction after
+        the attempt (a record with BID_STATE_FIELDS, None if the auction doesn't exist).
+        """
+        ensure_schema()
+        amount = to_cents(to_decimal(amount))
+        start = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_BID_SQL, (amount, user_id, auction_id, amount, MIN_INCREMENT, auction_id))
+            row = cursor.fetchone()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Bid on auction {auction_id} failed: {e}")
+            self._count('errors')
+            return False, 'Error placing bid.', None
+        finally:
+            conn.close()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if row is None:
+            self._count('not_found', elapsed_ms)
+            return False, 'Auction not found.', None
+        state = make_record(BID_STATE_FIELDS, tuple(getattr(row, field) for field in BID_STATE_FIELDS))
+        if row.Accepted:
+            self._count('accepted', elapsed_ms)
+            for callback in self._listeners:
+                try:
+                    callback(state)
+                except Exception as e:
+                    print(f"Bid listener failed: {e}")
+            return True, 'Your bid has been placed.', state
+        if row.Status != 'active' or row.EndTime <= row.ServerTime:
+            self._count('ended', elapsed_ms)
+            return False, 'This auction has ended.', state
+        self._count('too_low', elapsed_ms)
+        return False, f'Minimum bid is R{minimum_bid(row.CurrentBid, row.StartingBid):.2f}.', state
+
+    def history(self, auction_id, limit=20):
+        """Latest accepted bids for an auction, newest first."""
+        ensure_schema()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT TOP (?) b.BidId, b.UserId, u.FullName AS Bidder, b.Amount, b.PlacedAt
+                FROM BidHistory b LEFT JOIN Users u ON u.UserId = b.UserId
+                WHERE b.AuctionId = ?
+                ORDER BY b.BidId DESC
+                """,
+                (limit, auction_id),
+            )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        attempts = sum(snapshot[key] for key in ('accepted', 'too_low', 'ended', 'not_found'))
+        total_ms = snapshot.pop('total_ms')
+        snapshot['avg_ms'] = round(total_ms / attempts, 2) if attempts else 0.0
+        return snapshot
+
+
+bid_engine = BidEngine()
@@ -0,0 +1,279 @@
+import os
+import threading
+import time
+
+from models.cart import Cart, CART_ITEM_FIELDS
+from models.product import Product
+from models.rows import make_record
+from services.catalog_cache import catalog_cache
+from services.pricing import cart_totals, cart_subtotal, to_decimal
+from services.loyalty import LoyaltyLedger, balance_cache
+from services.stock import StockService
+
+# the cart lives in the flask session (a signed cookie), so adding, changing and
+# viewing it never touches the Cart table:
+# - anonymous visitors get a cart too; it merges into the saved cart when they log in
+# - for logged-in users every change is queued on cart_writer, which writes the final
+#   quantities to the Cart table in coalesced batches (every flush_interval seconds,
+#   and right away at login, logout and checkout)
+# - logged-in changes also hold stock (services/stock.py); a line that doesn't fit in
+#   what's left isn't added, and the line's quantity stays as it was
+
+# lines per cart, keeps the cookie small
+MAX_CART_LINES = 50
+# failed write-throughs are retried this many times before the batch is dropped
+# (the session still holds the cart, and login reloads/merges it)
+MAX_WRITE_ATTEMPTS = 3
+
+
+class CartWriter:
+    """Background write-through of session carts to the Cart table."""
+
+    def __init__(self, flush_interval=2.0):
+        self.flush_interval = flush_interval
+        # user_id -> {ProductId: final quantity}; later changes overwrite earlier ones
+        self._pending = {}
+        self._lock = threading.Lock()
+        # one flush at a time, so an older batch can never land after a newer one
+        self._flush_lock = threading.Lock()
+        self._failures = {}
+        self._thread = None
+        self._stats = {
+            'changes_queued': 0,
+            'flushes': 0,
+            'rows_written': 0,
+            'errors': 0,
+            'dropped': 0,
+        }
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='cart-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def enqueue(self, user_id, changes):
+        """Queue {ProductId: quantity} for a user (0 removes the line)."""
+        if not changes:
+            return
+        with self._lock:
+            self._pending.setdefault(user_id, {}).update(changes)
+            self._stats['changes_queued'] += len(changes)
+        self.start()
+
+    def flush(self, user_id=None):
+        """Write pending changes now (just one user's when user_id is given)."""
+        with self._flush_lock:
+            with self._lock:
+                if user_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {user_id: self._pending.pop(user_id)} if user_id in self._pending else {}
+            for uid, changes in batch.items():
+                try:
+                    Cart.apply_quantities(uid, changes)
+                    self._failures.pop(uid, None)
+                    self._stats['flushes'] += 1
+                    self._stats['rows_written'] += len(changes)
+                except Exception as e:
+                    print(f"Cart write-through failed for user {uid}: {e}")
+                    self._stats['errors'] += 1
+                    attempts = self._failures.get(uid, 0) + 1
+                    if attempts >= MAX_WRITE_ATTEMPTS:
+                        self._failures.pop(uid, None)
+                        self._stats['dropped'] += 1
+                        continue
+                    self._failures[uid] = attempts
+                    # put it back under anything newer that arrived meanwhile
+                    with self._lock:
+                        newer = self._pending.get(uid, {})
+                        self._pending[uid] = {**changes, **newer}
+
+    def pending(self, user_id):
+        with self._lock:
+            return dict(self._pending.get(user_id, {}))
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['pending_users'] = len(self._pending)
+        snapshot['flush_interval'] = self.flush_interval
+        return snapshot
+
+
+cart_writer = CartWriter(flush_interval=float(os.getenv('THRIFTTECH_CART_FLUSH', '2')))
+
+
+class CartStore:
+    """The current visitor's cart, kept in the session ({product id: quantity})."""
+
+    SESSION_KEY = 'cart'
+
+    def __init__(self, session, writer=cart_writer):
+        self._session = session
+        self._writer = writer
+        # {ProductId: units available} for lines the last change couldn't reserve
+        self.rejected = {}
+
+    @property
+    def user_id(self):
+        return self._session.get('user_id')
+
+    def quantities(self):
+        """{ProductId: Quantity} (loads the saved cart once for sessions that predate the store)."""
+        raw = self._session.get(self.SESSION_KEY)
+        if raw is None:
+            saved = Cart.get_quantities(self.user_id) if self.user_id else {}
+            self._save(saved)
+            return saved
+        # session json turns the keys into strings
+        return {int(pid): int(q) for pid, q in raw.items()}
+
+    def _save(self, quantities):
+        # reassign so flask notices the change and re-signs the cookie
+        self._session[self.SESSION_KEY] = {str(pid): q for pid, q in quantities.items() if q > 0}
+
+    def _reserve(self, changes, user_id=None):
+        """Hold stock for a logged-in user's changed lines; returns the lines that don't fit."""
+        user_id = user_id or self.user_id
+        if not user_id or not changes:
+            return {}
+        try:
+            return StockService.reserve_many(user_id, changes)
+        except Exception as e:
+            # checkout checks stock again, so a failed hold doesn't block the cart
+            print(f"Stock reservation failed for user {user_id}: {e}")
+            return {}
+
+    def _write(self, quantities, changes):
+        self._save(quantities)
+        if self.user_id:
+            self._writer.enqueue(self.user_id, changes)
+
+    def count(self):
+        return sum(self.quantities().values())
+
+    def add(self, product_id, quantity=1):
+        """Add to a line; False if the cart already has MAX_CART_LINES other lines."""
+        return self.add_many([(product_id, quantity)]) > 0
+
+    def add_many(self, items):
+        """
+        Add (product_id, quantity) pairs; returns how many lines were added or bumped.
+        lines that would go over the stock left end up in self.rejected.
+        """
+        quantities = self.quantities()
+        changes = {}
+        lines = len(quantities)
+        for product_id, quantity in items:
+            product_id, quantity = int(product_id), int(quantity)
+            if quantity <= 0:
+                continue
+            current = changes.get(product_id, quantities.get(product_id, 0))
+            if not current:
+                if lines >= MAX_CART_LINES:
+                    continue
+                lines += 1
+            changes[product_id] = current + quantity
+        self.rejected = self._reserve(changes)
+        for product_id in self.rejected:
+            del changes[product_id]
+        quantities.update(changes)
+        self._write(quantities, changes)
+        return len(changes)
+
+    def set_quantity(self, product_id, quantity):
+        """Set a line's quantity; 0 or less removes it. False if the stock can't cover it."""
+        self.rejected = {}
+        quantities = self.quantities()
+        product_id = int(product_id)
+        if product_id not in quantities:
+            return False
+        self.rejected = self._reserve({product_id: max(0, int(quantity))})
+        if product_id in self.rejected:
+            return False
+        if quantity > 0:
+            quantities[product_id] = int(quantity)
+        else:
+            del quantities[product_id]
+        self._write(quantities, {product_id: max(0, int(quantity))})
+        return True
+
+    def remove(self, product_id):
+        return self.set_quantity(product_id, 0)
+
+    def clear(self):
+        """Empty the session cart (after checkout already deleted the saved lines)."""
+        self._save({})
+
+    def _lines(self, quantities, products):
+        lines = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                # product was deleted since it went into the cart
+                continue
+            price = to_decimal(product['Price'])
+            lines.append(make_record(CART_ITEM_FIELDS, (
+                None, self.user_id, product_id, quantity, product['Title'],
+                price, product['Photo'], product['Description'], price * quantity,
+            )))
+        return lines
+
+    def items(self, fresh=False):
+        """
+        Cart lines (CART_ITEM_FIELDS records). product details come from the catalog
+        cache (fresh=True reads current prices from the database, e.g. for checkout).
+        products that no longer exist are dropped.
+        """
+        quantities = self.quantities()
+        if not quantities:
+            return []
+        products = Product.get_by_ids(quantities) if fresh else catalog_cache.get_product_index()
+        return self._lines(quantities, products)
+
+    def summary(self, fresh=False):
+        """
+        (cart lines, totals) with at most one database round trip. with fresh=True the
+        current product rows and loyalty balance come from Cart.get_summary; otherwise
+        products come from the catalog cache and the balance from the loyalty cache.
+        """
+        quantities = self.quantities()
+        if fresh:
+            products, points = Cart.get_summary(self.user_id, quantities)
+            if points is not None:
+                balance_cache.set(self.user_id, points)
+        else:
+            products = catalog_cache.get_product_index()
+            points = LoyaltyLedger.balance(self.user_id) if self.user_id else None
+        items = self._lines(quantities, products)
+        return items, cart_totals(cart_subtotal(items), points)
+
+    def persist(self):
+        """Write this user's queued changes now (before checkout reads the saved cart)."""
+        if self.user_id:
+            self._writer.flush(self.user_id)
+
+    def merge_on_login(self, user_id):
+        """
+        Call at login before session['user_id'] is set: folds an anonymous cart into the
+        user's saved cart and loads the result into the session.
+        """
+        if self.user_id:
+            # someone else was logged in on this session: save their cart, don't merge it
+            self._writer.flush(self.user_id)
+            anonymous = []
+        else:
+            raw = self._session.get(self.SESSION_KEY) or {}
+            anonymous = [(int(pid), int(q)) for pid, q in raw.items()]
+        self._writer.flush(user_id)
+        if anonymous:
+            Cart.add_many(user_id, anonymous)
+        quantities = Cart.get_quantities(user_id)
+        self._save(quantities)
+        # hold what we can; checkout re-checks whatever couldn't be held
+        self.rejected = self._reserve(quantities, user_id)
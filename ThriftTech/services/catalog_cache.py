@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db_connection
+
+# in-process cache of the product catalog (the full list plus catalog query results)
+# - entries expire after `ttl` seconds no matter what
+# - Product write paths call invalidate_catalog(), which drops the local copy and
+#   bumps the shared 'catalog' row in CacheVersions so other worker processes
+#   notice on their next version check (at most every `check_interval` seconds)
+# - loads run outside the cache lock, one per key at a time: other threads that miss
+#   the same key wait for that load, misses on other keys don't wait at all
+# - past max_entries the least recently used entry goes
+
+
+def _load_catalog():
+    # imported here to avoid a circular import (models.product invalidates this cache)
+    from models.product import Product
+    return Product.get_all()
+
+
+class _PendingLoad:
+    """A load in progress; threads that miss the same key wait on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CatalogCache:
+    def __init__(self, loader=_load_catalog, ttl=60.0, check_interval=2.0, name='catalog', max_entries=256):
+        self._loader = loader
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.name = name
+        self.max_entries = max_entries
+        # key -> (value, loaded_at); 'all' is the full product list, other keys are query results
+        self._entries = OrderedDict()
+        # key -> _PendingLoad for keys being loaded right now
+        self._loading = {}
+        # bumped whenever entries are dropped, so a load that started before can't store
+        # what it read
+        self._generation = 0
+        # (product list, {ProductId: product}) built from the 'all' entry on demand
+        self._index = None
+        self._checked_at = 0.0
+        # last version of the shared row we saw (None = unknown / no table)
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'reloads': 0,
+            'invalidations': 0,
+            'stale_detected': 0,
+            'version_checks': 0,
+        }
+
+    # shared version row
+
+    def _read_shared_version(self):
+        """Current version from CacheVersions, or None if the table isn't there."""
+        try:
+            conn = get_db_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT Version FROM CacheVersions WHERE Name = ?", (self.name,))
+                row = cur.fetchone()
+                return int(row[0]) if row else None
+            finally:
+                conn.close()
+        except Exception:
+            return None
+
+    def _bump_shared_version(self):
+        """Bump the shared row; returns the new version (None if the bump failed)."""
+        try:
+            conn = get_db_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute(
+                    "UPDATE CacheVersions SET Version = Version + 1 OUTPUT INSERTED.Version WHERE Name = ?",
+                    (self.name,),
+                )
+                row = cur.fetchone()
+                conn.commit()
+                return int(row[0]) if row else None
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Catalog version bump failed: {e}")
+            return None
+
+    def _check_version(self, now):
+        """Cheap cross-process staleness check (one single-row read every check_interval)."""
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        self._stats['version_checks'] += 1
+        version = self._read_shared_version()
+        if version != self._version:
+            with self._lock:
+                if self._entries and self._version is not None:
+                    self._stats['stale_detected'] += 1
+                self._entries.clear()
+                self._generation += 1
+                self._version = version
+
+    # cache api
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss (shared value - don't mutate it)."""
+        now = time.monotonic()
+        self._check_version(now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+            pending = self._loading.get(key)
+            loading = pending is None
+            if loading:
+                pending = self._loading[key] = _PendingLoad()
+            generation = self._generation
+
+        if not loading:
+            # someone is already loading this key; use their result
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = loader()
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            pending.value = value
+            with self._lock:
+                # an invalidation during the load means the value may already be stale
+                if generation == self._generation:
+                    self._entries[key] = (value, time.monotonic())
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                self._stats['reloads'] += 1
+            return value
+        finally:
+            with self._lock:
+                if self._loading.get(key) is pending:
+                    del self._loading[key]
+            pending.done.set()
+
+    def get_products(self):
+        """Return the cached full product list (shared - callers must not mutate it)."""
+        return self.get('all', self._loader)
+
+    def get_product_index(self):
+        """ProductId -> product for the cached list (rebuilt once per catalog load, shared)."""
+        products = self.get_products()
+        index = self._index
+        # keyed on the list itself so a reload (or invalidation) can never serve an old index
+        if index is None or index[0] is not products:
+            index = (products, {p['ProductId']: p for p in products})
+            self._index = index
+        return index[1]
+
+    def invalidate(self, shared=True):
+        """Drop every cached entry; with shared=True other processes are told too."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._stats['invalidations'] += 1
+        if shared:
+            version = self._bump_shared_version()
+            if version is not None:
+                # our own bump; the next version check shouldn't clear the cache again
+                with self._lock:
+                    self._version = version
+
+    @property
+    def version(self):
+        """Last shared catalog version seen by this process (None if unknown)."""
+        return self._version
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = (snapshot['hits'] / lookups) if lookups else 0.0
+        snapshot['entries'] = len(self._entries)
+        snapshot['loading'] = len(self._loading)
+        all_entry = self._entries.get('all')
+        snapshot['cached_products'] = len(all_entry[0]) if all_entry else 0
+        snapshot['version'] = self._version
+        snapshot['ttl'] = self.ttl
+        return snapshot
+
+
+catalog_cache = CatalogCache(ttl=float(os.getenv('THRIFTTECH_CATALOG_TTL', '60')))
+
+
+def invalidate_catalog():
+    catalog_cache.invalidate()
@@ -0,0 +1,88 @@
+from datetime import datetime
+from decimal import Decimal
+
+from database import get_db_connection, bulk_insert, insert_returning_id
+from migrations import ensure_schema
+from services.pricing import to_decimal
+from services.loyalty import LoyaltyLedger, balance_cache
+from services.jobs import job_worker
+from services.order_jobs import enqueue_order_jobs
+from services.stock import StockService
+from services.catalog_cache import invalidate_catalog
+
+# places an order in one transaction on one connection: stock, order, order items, invoice,
+# points redemption, emptying the cart and queueing the follow-up jobs (earned points,
+# invoice email, low stock check - see services/order_jobs.py) either all happen or
+# none of them do. the request only waits for that commit
+class CheckoutService:
+    @staticmethod
+    def points_for(total):
+        """Loyalty points earned for an order total (1 point per R10 spent)."""
+        return int(to_decimal(total) / 10)
+
+    @staticmethod
+    def points_redeemed(loyalty_discount):
+        """Loyalty points spent to get a discount (each point = R0.10)."""
+        # decimal division: R0.30 is exactly 3 points (float math made it 2.999...)
+        return int(to_decimal(loyalty_discount) / Decimal('0.10')) if loyalty_discount else 0
+
+    @staticmethod
+    def place_order(user_id, cart_items, totals):
+        """
+        Write the whole order and commit once.
+        Returns {'order_id', 'invoice_id', 'points_earned', 'points_used'}; on any error
+        (OutOfStock, InsufficientPoints, ...) the transaction is rolled back and the
+        exception re-raised.
+        """
+        ensure_schema()
+        points_earned = CheckoutService.points_for(totals['total'])
+        points_used = CheckoutService.points_redeemed(totals.get('loyalty_discount'))
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            # take the stock first: raises OutOfStock (and nothing is written) if another
+            # buyer got there first
+            StockService.take_for_order(cursor, user_id, [(item['ProductId'], item['Quantity']) for item in cart_items])
+            order_id = insert_returning_id(
+                cursor, 'Orders', {'UserId': user_id, 'TotalAmount': totals['total'], 'Status': 'completed'}, 'OrderId',
+            )
+
+            # all order lines in one batch
+            bulk_insert(
+                cursor, 'OrderItems', ('OrderId', 'ProductId', 'Quantity', 'Price'),
+                [(order_id, item['ProductId'], item['Quantity'], item['Price']) for item in cart_items],
+            )
+
+            invoice_id = insert_returning_id(
+                cursor, 'Invoices',
+                {'UserId': user_id, 'OrderId': order_id, 'Total': totals['total'], 'CreatedAt': datetime.now()},
+                'InvoiceId',
+            )
+
+            # redeeming stays in the transaction: it's checked against the balance the
+            # order was priced with. earned points are credited by a job
+            balance = None
+            if points_used:
+                balance = LoyaltyLedger.record(cursor, user_id, -points_used, 'redeem', order_id)
+
+            cursor.execute("DELETE FROM Cart WHERE UserId = ?", (user_id,))
+            enqueue_order_jobs(cursor, user_id, order_id, invoice_id, points_earned)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        if balance is not None:
+            balance_cache.set(user_id, balance)
+        # product pages and their validators show stock
+        invalidate_catalog()
+        job_worker.wake()
+
+        return {
+            'order_id': order_id,
+            'invoice_id': invoice_id,
+            'points_earned': points_earned,
+            'points_used': points_used,
+        }
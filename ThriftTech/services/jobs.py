@@ -0,0 +1,334 @@
+import importlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from database import get_db_connection, bulk_execute
+from migrations import ensure_schema
+
+# durable background jobs, kept in the JobQueue table:
+# - enqueue() runs on the caller's cursor, so a job is saved in the same transaction as
+#   the change it follows up on (an order that rolls back leaves no jobs behind)
+# - a dedupe key makes enqueueing idempotent, and handlers must be idempotent too: a job
+#   can run more than once if a worker dies after finishing it but before marking it done
+# - JobWorker threads claim jobs with READPAST, so any number of threads or worker
+#   processes (scripts/job_worker.py) can share the queue without double-claiming
+# - failed jobs are retried with backoff, then parked as 'failed'
+
+# attempts before a job is parked as 'failed'
+MAX_JOB_ATTEMPTS = 5
+# first retry delay in seconds, doubled on each attempt
+RETRY_BACKOFF = 5
+# a job 'running' for longer than this is assumed lost with its worker and requeued
+JOB_LEASE_SECONDS = 300
+
+# kind -> handler(payload)
+JOB_HANDLERS = {}
+# modules whose handlers register themselves on import
+HANDLER_MODULES = ('services.order_jobs', 'services.stock', 'services.auction_maintainer')
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler for a job kind."""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(cursor, kind, payload, dedupe_key=None, delay=0):
+    """
+    Add a job on the caller's cursor/transaction (no commit). returns False if a job
+    with the same dedupe key already exists.
+    """
+    cursor.execute(
+        """
+        SET NOCOUNT ON
+        INSERT INTO JobQueue (Kind, Payload, DedupeKey, RunAfter)
+        SELECT ?, ?, ?, DATEADD(second, ?, GETDATE())
+        WHERE ? IS NULL OR NOT EXISTS (
+            SELECT 1 FROM JobQueue WITH (UPDLOCK, HOLDLOCK) WHERE DedupeKey = ?
+        )
+        SELECT @@ROWCOUNT
+        SET NOCOUNT OFF
+        """,
+        (kind, json.dumps(payload, default=str), dedupe_key, int(delay), dedupe_key, dedupe_key),
+    )
+    return bool(cursor.fetchone()[0])
+
+
+def enqueue_many(cursor, kind, jobs, delay=0):
+    """
+    enqueue() for many (payload, dedupe_key) pairs of one kind, sent in bulk on the
+    caller's cursor/transaction (no commit). returns how many were sent; ones whose
+    dedupe key already exists are skipped.
+    """
+    rows = [
+        (kind, json.dumps(payload, default=str), dedupe_key, int(delay), dedupe_key, dedupe_key)
+        for payload, dedupe_key in jobs
+    ]
+    return bulk_execute(
+        cursor,
+        """
+        INSERT INTO JobQueue (Kind, Payload, DedupeKey, RunAfter)
+        SELECT ?, ?, ?, DATEADD(second, ?, GETDATE())
+        WHERE ? IS NULL OR NOT EXISTS (
+            SELECT 1 FROM JobQueue WITH (UPDLOCK, HOLDLOCK) WHERE DedupeKey = ?
+        )
+        """,
+        rows,
+    )
+
+
+def schedule_periodic(kind, every, now=False):
+    """
+    Queue the next run of a recurring job at the next `every`-second boundary (or the
+    current one with now=True). the slot is the dedupe key, so however many processes
+    schedule it, each slot runs once; the handler calls this again to queue the next.
+    """
+    ensure_schema()
+    current = time.time()
+    slot = int(current // every) + (0 if now else 1)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        queued = enqueue(cursor, kind, {'slot': slot}, dedupe_key=f'{kind}:{slot}',
+                         delay=max(0, int(slot * every - current)))
+        conn.commit()
+    finally:
+        conn.close()
+    return queued
+
+
+# hand back jobs whose worker vanished (or park them as failed once they've used up
+# their attempts, so a job that kills or outlives its worker can't loop forever), then
+# claim the oldest due one. READPAST skips rows other workers have locked instead of
+# waiting for them
+_CLAIM_SQL = """
+    SET NOCOUNT ON
+    DECLARE @lease_expired DATETIME = DATEADD(second, ?, GETDATE()), @max_attempts INT = ?;
+    UPDATE JobQueue
+    SET Status = CASE WHEN Attempts < @max_attempts THEN 'queued' ELSE 'failed' END,
+        FinishedAt = CASE WHEN Attempts < @max_attempts THEN NULL ELSE GETDATE() END,
+        LastError = CASE WHEN Attempts < @max_attempts THEN LastError
+                         ELSE 'Lease expired: the job did not finish within its lease' END
+    WHERE Status = 'running' AND StartedAt < @lease_expired;
+
+    WITH next_job AS (
+        SELECT TOP (1) * FROM JobQueue WITH (ROWLOCK, READPAST, UPDLOCK)
+        WHERE Status = 'queued' AND RunAfter <= GETDATE()
+        ORDER BY RunAfter, JobId
+    )
+    UPDATE next_job SET Status = 'running', StartedAt = GETDATE(), Attempts = Attempts + 1
+    OUTPUT INSERTED.JobId, INSERTED.Kind, INSERTED.Payload, INSERTED.Attempts,
+           DATEDIFF(millisecond, INSERTED.CreatedAt, INSERTED.StartedAt) AS WaitMs;
+    SET NOCOUNT OFF;
+"""
+
+
+class JobWorker:
+    """A small pool of threads that run queued jobs."""
+
+    def __init__(self, threads=2, poll_interval=1.0):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'claimed': 0, 'done': 0, 'retried': 0, 'failed': 0, 'errors': 0}
+        # kind -> [jobs, total wait ms, total run ms, max wait ms]
+        self._latency = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+
+    def start(self):
+        for module in HANDLER_MODULES:
+            importlib.import_module(module)
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            self._stop.clear()
+            for n in range(len(self._threads), self.threads):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """Tell idle threads there's new work (e.g. right after checkout commits)."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:
+                # database unreachable etc.; keep the thread alive and try again later
+                print(f"Job worker error: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+                ran = False
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_CLAIM_SQL, (-JOB_LEASE_SECONDS, MAX_JOB_ATTEMPTS))
+            row = cursor.fetchone()
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, attempts, error=None):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            if error is None:
+                cursor.execute(
+                    "UPDATE JobQueue SET Status = 'done', FinishedAt = GETDATE(), LastError = NULL WHERE JobId = ?",
+                    (job_id,),
+                )
+            elif attempts >= MAX_JOB_ATTEMPTS:
+                cursor.execute(
+                    "UPDATE JobQueue SET Status = 'failed', FinishedAt = GETDATE(), LastError = ? WHERE JobId = ?",
+                    (error[:1000], job_id),
+                )
+            else:
+                cursor.execute(
+                    """
+                    UPDATE JobQueue SET Status = 'queued', LastError = ?,
+                        RunAfter = DATEADD(second, ?, GETDATE())
+                    WHERE JobId = ?
+                    """,
+                    (error[:1000], RETRY_BACKOFF * 2 ** (attempts - 1), job_id),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def run_once(self):
+        """Claim and run one due job. returns False when there was nothing to do."""
+        ensure_schema()
+        job = self._claim()
+        if job is None:
+            return False
+        handler = JOB_HANDLERS.get(job.Kind)
+        start = time.perf_counter()
+        error = None
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job.Kind!r}")
+            handler(json.loads(job.Payload))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Job {job.JobId} ({job.Kind}) failed on attempt {job.Attempts}: {error}")
+        run_ms = (time.perf_counter() - start) * 1000
+        self._finish(job.JobId, job.Attempts, error)
+
+        with self._lock:
+            self._stats['claimed'] += 1
+            if error is None:
+                self._stats['done'] += 1
+                latency = self._latency[job.Kind]
+                wait_ms = float(job.WaitMs or 0)
+                latency[0] += 1
+                latency[1] += wait_ms
+                latency[2] += run_ms
+                latency[3] = max(latency[3], wait_ms)
+            elif job.Attempts >= MAX_JOB_ATTEMPTS:
+                self._stats['failed'] += 1
+            else:
+                self._stats['retried'] += 1
+        return True
+
+    def drain(self, max_jobs=None):
+        """Run due jobs on the calling thread until none are left; returns how many ran."""
+        count = 0
+        while (max_jobs is None or count < max_jobs) and self.run_once():
+            count += 1
+        return count
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['latency_ms'] = {
+                kind: {
+                    'jobs': jobs,
+                    'avg_wait': round(wait / jobs, 1),
+                    'avg_run': round(run / jobs, 1),
+                    'max_wait': round(max_wait, 1),
+                }
+                for kind, (jobs, wait, run, max_wait) in self._latency.items()
+            }
+            snapshot['threads_alive'] = sum(1 for t in self._threads if t.is_alive())
+        snapshot['threads'] = self.threads
+        return snapshot
+
+
+job_worker = JobWorker(threads=int(os.getenv('THRIFTTECH_JOB_THREADS', '2')))
+
+
+def queue_depth():
+    """
+    Jobs per status plus the age of the oldest due job and the average enqueue-to-done
+    latency over the last hour (across every worker process, read from the table).
+    """
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT Status, COUNT(*) AS Jobs FROM JobQueue GROUP BY Status")
+        depth = {row.Status: int(row.Jobs) for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT
+                (SELECT DATEDIFF(second, MIN(RunAfter), GETDATE()) FROM JobQueue
+                 WHERE Status = 'queued' AND RunAfter <= GETDATE()) AS OldestDueSeconds,
+                (SELECT AVG(CAST(DATEDIFF(millisecond, CreatedAt, FinishedAt) AS FLOAT)) FROM JobQueue
+                 WHERE Status = 'done' AND FinishedAt >= DATEADD(hour, -1, GETDATE())) AS AvgLatencyMs
+        """)
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return {
+        'depth': depth,
+        'oldest_due_seconds': int(row.OldestDueSeconds or 0),
+        'avg_latency_ms_last_hour': round(float(row.AvgLatencyMs or 0), 1),
+    }
+
+
+def purge_finished(days=7):
+    """Delete jobs that finished successfully more than `days` ago; returns how many."""
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SET NOCOUNT ON
+            DELETE FROM JobQueue WHERE Status = 'done' AND FinishedAt < DATEADD(day, ?, GETDATE());
+            SELECT @@ROWCOUNT;
+            SET NOCOUNT OFF;
+            """,
+            (-int(days),),
+        )
+        deleted = int(cursor.fetchone()[0])
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
+def job_queue_stats():
+    stats = {'worker': job_worker.stats()}
+    try:
+        stats['queue'] = queue_depth()
+    except Exception as e:
+        stats['queue'] = {'error': str(e)}
+    return stats
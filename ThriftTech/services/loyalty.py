@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db_connection
+from migrations import ensure_schema
+
+# loyalty ledger: every change to a user's points is one append-only LoyaltyTransactions
+# row plus a single-statement update of the LoyaltyPoints balance, in the same
+# transaction. nothing reads the balance into python and writes it back, so concurrent
+# checkouts can't lose points. the ledger is the source of truth; reconcile() checks
+# the balances against it (see scripts/reconcile_loyalty.py).
+
+
+class InsufficientPoints(Exception):
+    """Raised when a redemption would take a balance below zero."""
+
+
+class BalanceCache:
+    """Recently read/written balances per user so the cart page can skip the query."""
+
+    def __init__(self, ttl=60.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, user_id, points):
+        with self._lock:
+            self._entries[user_id] = (points, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+        snapshot['ttl'] = self.ttl
+        return snapshot
+
+
+balance_cache = BalanceCache(ttl=float(os.getenv('THRIFTTECH_LOYALTY_TTL', '60')))
+
+# credits: create the balance row on a user's first points
+_CREDIT_SQL = """
+    SET NOCOUNT ON
+    MERGE LoyaltyPoints WITH (HOLDLOCK) AS target
+    USING (SELECT ? AS UserId, ? AS Points) AS source
+        ON target.UserId = source.UserId
+    WHEN MATCHED THEN
+        UPDATE SET Points = ISNULL(target.Points, 0) + source.Points
+    WHEN NOT MATCHED THEN
+        INSERT (UserId, Points) VALUES (source.UserId, source.Points)
+    OUTPUT INSERTED.Points;
+    SET NOCOUNT OFF;
+"""
+
+# debits: only succeed if the balance covers them
+_DEBIT_SQL = """
+    UPDATE LoyaltyPoints SET Points = Points - ?
+    OUTPUT INSERTED.Points
+    WHERE UserId = ? AND Points >= ?
+"""
+
+
+class LoyaltyLedger:
+    @staticmethod
+    def record(cursor, user_id, points, reason, order_id=None):
+        """
+        Apply a signed points change on the caller's cursor/transaction (no commit) and
+        return the new balance. raises InsufficientPoints if a debit isn't covered.
+        """
+        points = int(points)
+        if points >= 0:
+            cursor.execute(_CREDIT_SQL, (user_id, points))
+            row = cursor.fetchone()
+        else:
+            cursor.execute(_DEBIT_SQL, (-points, user_id, -points))
+            row = cursor.fetchone()
+            if row is None:
+                raise InsufficientPoints(f"User {user_id} doesn't have {-points} points")
+        cursor.execute(
+            "INSERT INTO LoyaltyTransactions (UserId, Points, Reason, OrderId) VALUES (?, ?, ?, ?)",
+            (user_id, points, reason, order_id),
+        )
+        return int(row[0])
+
+    @staticmethod
+    def balance(user_id, use_cache=True):
+        """Current points (0 without a balance row); served from the cache when possible."""
+        if use_cache:
+            cached = balance_cache.get(user_id)
+            if cached is not None:
+                return cached
+        ensure_schema()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT Points FROM LoyaltyPoints WHERE UserId = ?", (user_id,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        points = int(row.Points or 0) if row else 0
+        balance_cache.set(user_id, points)
+        return points
+
+    @staticmethod
+    def history(user_id, limit=50):
+        """Latest ledger rows for a user, newest first."""
+        ensure_schema()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT TOP (?) LoyaltyTransactionId, Points, Reason, OrderId, CreatedAt
+                FROM LoyaltyTransactions WHERE UserId = ?
+                ORDER BY LoyaltyTransactionId DESC
+                """,
+                (limit, user_id),
+            )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def reconcile(fix=False):
+        """
+        Compare every balance with the sum of its ledger rows. returns a list of
+        (UserId, Balance, LedgerPoints) mismatches; fix=True resets those balances to
+        the ledger total.
+        """
+        ensure_schema()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COALESCE(b.UserId, l.UserId) AS UserId,
+                       ISNULL(b.Points, 0) AS Balance,
+                       ISNULL(l.Points, 0) AS LedgerPoints
+                FROM LoyaltyPoints b
+                FULL OUTER JOIN (
+                    SELECT UserId, SUM(Points) AS Points FROM LoyaltyTransactions GROUP BY UserId
+                ) l ON l.UserId = b.UserId
+                WHERE ISNULL(b.Points, 0) <> ISNULL(l.Points, 0)
+            """)
+            mismatches = [(row.UserId, int(row.Balance), int(row.LedgerPoints)) for row in cursor.fetchall()]
+            if fix and mismatches:
+                cursor.execute("""
+                    SET NOCOUNT ON
+                    MERGE LoyaltyPoints WITH (HOLDLOCK) AS target
+                    USING (SELECT UserId, SUM(Points) AS Points FROM LoyaltyTransactions GROUP BY UserId) AS source
+                        ON target.UserId = source.UserId
+                    WHEN MATCHED AND ISNULL(target.Points, 0) <> source.Points THEN
+                        UPDATE SET Points = source.Points
+                    WHEN NOT MATCHED BY TARGET THEN
+                        INSERT (UserId, Points) VALUES (source.UserId, source.Points)
+                    WHEN NOT MATCHED BY SOURCE AND ISNULL(target.Points, 0) <> 0 THEN
+                        UPDATE SET Points = 0;
+                    SET NOCOUNT OFF;
+                """)
+                conn.commit()
+                balance_cache.discard()
+            return mismatches
+        finally:
+            conn.close()
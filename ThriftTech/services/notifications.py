@@ -0,0 +1,27 @@
+import os
+import smtplib
+from email.message import EmailMessage
+
+# outgoing email. with THRIFTTECH_SMTP_HOST unset (development) messages are only
+# printed. only called from background jobs, never while a request waits
+
+
+def send_email(to, subject, body):
+    if not to:
+        return False
+    host = os.getenv('THRIFTTECH_SMTP_HOST')
+    if not host:
+        print(f"[email] to={to} subject={subject!r}\n{body}")
+        return False
+    message = EmailMessage()
+    message['From'] = os.getenv('THRIFTTECH_MAIL_FROM', 'no-reply@thrifttech.local')
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    with smtplib.SMTP(host, int(os.getenv('THRIFTTECH_SMTP_PORT', '25')), timeout=30) as smtp:
+        user = os.getenv('THRIFTTECH_SMTP_USER')
+        if user:
+            smtp.starttls()
+            smtp.login(user, os.getenv('THRIFTTECH_SMTP_PASSWORD', ''))
+        smtp.send_message(message)
+    return True
@@ -0,0 +1,142 @@
+import os
+
+from database import get_db_connection
+from services.jobs import enqueue, enqueue_many, job_handler
+from services.loyalty import LoyaltyLedger, balance_cache
+from services.notifications import send_email
+from services.catalog_cache import invalidate_catalog
+
+# follow-up work for a placed order. checkout enqueues these in the order's transaction
+# and returns; a JobWorker runs them shortly after. every handler is safe to run twice.
+
+# same cut-off as the admin dashboard's low stock report
+LOW_STOCK_THRESHOLD = 5
+
+
+def enqueue_order_jobs(cursor, user_id, order_id, invoice_id, points_earned):
+    """Queue an order's follow-up jobs on the checkout cursor (no commit)."""
+    if points_earned:
+        enqueue(cursor, 'loyalty.award',
+                {'user_id': user_id, 'order_id': order_id, 'points': points_earned},
+                dedupe_key=f'loyalty.award:{order_id}')
+    enqueue(cursor, 'invoice.email', {'invoice_id': invoice_id}, dedupe_key=f'invoice.email:{invoice_id}')
+    enqueue(cursor, 'stock.low_stock', {'order_id': order_id}, dedupe_key=f'stock.low_stock:{order_id}')
+
+
+def enqueue_many_order_jobs(cursor, orders):
+    """enqueue_order_jobs for many (user_id, order_id, invoice_id, points_earned) at once (no commit)."""
+    enqueue_many(cursor, 'loyalty.award', [
+        ({'user_id': user_id, 'order_id': order_id, 'points': points}, f'loyalty.award:{order_id}')
+        for user_id, order_id, _invoice_id, points in orders if points
+    ])
+    enqueue_many(cursor, 'invoice.email', [
+        ({'invoice_id': invoice_id}, f'invoice.email:{invoice_id}') for _user_id, _order_id, invoice_id, _points in orders
+    ])
+    enqueue_many(cursor, 'stock.low_stock', [
+        ({'order_id': order_id}, f'stock.low_stock:{order_id}') for _user_id, order_id, _invoice_id, _points in orders
+    ])
+
+
+@job_handler('loyalty.award')
+def award_order_points(payload):
+    """Credit the points an order earned, unless its ledger row already exists."""
+    user_id, order_id, points = payload['user_id'], payload['order_id'], int(payload['points'])
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # the range lock keeps a second run of this job from crediting in parallel
+        cursor.execute(
+            "SELECT 1 FROM LoyaltyTransactions WITH (UPDLOCK, HOLDLOCK) WHERE OrderId = ? AND Reason = 'order'",
+            (order_id,),
+        )
+        if cursor.fetchone():
+            conn.rollback()
+            return
+        balance = LoyaltyLedger.record(cursor, user_id, points, 'order', order_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    balance_cache.set(user_id, balance)
+
+
+def render_invoice(invoice, items):
+    """Plain-text invoice for the confirmation email."""
+    lines = [
+        f"ThriftTech invoice #{invoice.InvoiceId}",
+        f"Order #{invoice.OrderId} - {invoice.CreatedAt:%Y-%m-%d %H:%M}",
+        '',
+    ]
+    for item in items:
+        lines.append(f"{item.Quantity} x {item.Title} @ R{item.Price:.2f} = R{item.Quantity * item.Price:.2f}")
+    lines += ['', f"Total: R{invoice.Total:.2f}", '', f"Thank you for shopping with us, {invoice.FullName}!"]
+    return '\n'.join(lines)
+
+
+@job_handler('invoice.email')
+def email_invoice(payload):
+    """Render the invoice and send it to the customer."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT i.InvoiceId, i.OrderId, i.Total, i.CreatedAt, u.FullName, u.Email
+            FROM Invoices i JOIN Users u ON u.UserId = i.UserId
+            WHERE i.InvoiceId = ?
+            """,
+            (payload['invoice_id'],),
+        )
+        invoice = cursor.fetchone()
+        if invoice is None:
+            return
+        cursor.execute(
+            """
+            SELECT oi.Quantity, oi.Price, p.Title
+            FROM OrderItems oi JOIN Products p ON p.ProductId = oi.ProductId
+            WHERE oi.OrderId = ?
+            """,
+            (invoice.OrderId,),
+        )
+        items = cursor.fetchall()
+    finally:
+        conn.close()
+    send_email(invoice.Email, f"Your ThriftTech invoice #{invoice.InvoiceId}", render_invoice(invoice, items))
+
+
+def _admin_emails(cursor):
+    configured = os.getenv('THRIFTTECH_ADMIN_EMAIL')
+    if configured:
+        return [configured]
+    cursor.execute("SELECT Email FROM Users WHERE Role = 'admin' AND Email IS NOT NULL")
+    return [row.Email for row in cursor.fetchall()]
+
+
+@job_handler('stock.low_stock')
+def check_low_stock(payload):
+    """Re-check stock for an order's products and alert the admins about low ones."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT p.ProductId, p.Title, p.Stock
+            FROM Products p
+            WHERE p.Stock < ? AND p.ProductId IN (SELECT ProductId FROM OrderItems WHERE OrderId = ?)
+            ORDER BY p.Stock
+            """,
+            (LOW_STOCK_THRESHOLD, payload['order_id']),
+        )
+        low = cursor.fetchall()
+        recipients = _admin_emails(cursor) if low else []
+    finally:
+        conn.close()
+    if not low:
+        return
+    # product pages show stock; refresh them once an item runs low
+    invalidate_catalog()
+    body = '\n'.join(f"{row.Title} (#{row.ProductId}): {row.Stock} left" for row in low)
+    for to in recipients:
+        send_email(to, f"Low stock after order #{payload['order_id']}", body)
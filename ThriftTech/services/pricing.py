@@ -0,0 +1,152 @@
+# cart pricing engine: plain functions and rule objects, no database, no flask, no side
+# effects, so it can be benchmarked (scripts/bench_pricing.py) and checked in isolation.
+# all money is Decimal and every reported amount is rounded half-up to the cent.
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+
+
+def to_decimal(value):
+    """Money as Decimal; floats go through str() so 19.99 stays 19.99."""
+    if isinstance(value, Decimal):
+        return value
+    if value is None:
+        return ZERO
+    if isinstance(value, float):
+        return Decimal(str(value))
+    return Decimal(value)
+
+
+def to_cents(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+# rules: each one reports one amount (a charge or a discount) under its field name.
+# an engine applies them in order; add, drop or swap rules to change the pricing.
+
+class TaxRule:
+    field = 'tax'
+    discount = False
+
+    def __init__(self, rate=Decimal('0.15')):
+        self.rate = to_decimal(rate)
+
+    def amount(self, subtotal, points):
+        return subtotal * self.rate
+
+
+class ShippingRule:
+    field = 'shipping'
+    discount = False
+
+    def __init__(self, free_over=Decimal('500'), fee=Decimal('85')):
+        self.free_over = to_decimal(free_over)
+        self.fee = to_decimal(fee)
+
+    def amount(self, subtotal, points):
+        return ZERO if subtotal > self.free_over else self.fee
+
+
+class LoyaltyRule:
+    """Points are worth point_value each and can cover at most cap_rate of the subtotal."""
+    field = 'loyalty_discount'
+    discount = True
+
+    def __init__(self, point_value=Decimal('0.10'), cap_rate=Decimal('0.10')):
+        self.point_value = to_decimal(point_value)
+        self.cap_rate = to_decimal(cap_rate)
+
+    def amount(self, subtotal, points):
+        # None = anonymous visitor (no loyalty account)
+        if points is None:
+            return ZERO
+        return min(Decimal(int(points)) * self.point_value, subtotal * self.cap_rate)
+
+
+class BulkDiscountRule:
+    """Tiered percentage off: the highest (threshold, rate) the subtotal is over wins."""
+    field = 'bulk_discount'
+    discount = True
+
+    def __init__(self, tiers=((Decimal('1000'), Decimal('0.05')),)):
+        self.tiers = sorted(((to_decimal(t), to_decimal(r)) for t, r in tiers), reverse=True)
+
+    def amount(self, subtotal, points):
+        for threshold, rate in self.tiers:
+            if subtotal > threshold:
+                return subtotal * rate
+        return ZERO
+
+
+DEFAULT_RULES = (TaxRule(), ShippingRule(), LoyaltyRule(), BulkDiscountRule())
+
+
+class PricingEngine:
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = tuple(rules)
+
+    def price(self, subtotal, loyalty_points=None):
+        """
+        Totals for one cart from its subtotal and the user's loyalty balance (None for
+        anonymous visitors): subtotal, one entry per rule, total_discount and total.
+        """
+        subtotal = to_decimal(subtotal)
+        totals = {'subtotal': to_cents(subtotal)}
+        charges = discounts = ZERO
+        for rule in self.rules:
+            amount = rule.amount(subtotal, loyalty_points)
+            totals[rule.field] = to_cents(amount)
+            if rule.discount:
+                discounts += amount
+            else:
+                charges += amount
+        totals['total_discount'] = to_cents(discounts)
+        totals['total'] = to_cents(subtotal + charges - discounts)
+        return totals
+
+    def price_cart(self, cart_items, loyalty_points=None):
+        return self.price(cart_subtotal(cart_items), loyalty_points)
+
+    def price_many(self, carts):
+        """
+        Price a batch of (subtotal, loyalty_points) pairs, e.g. every open cart after a
+        promo change. Same results as price(), with the rule lookups and method calls
+        hoisted out of the loop.
+        """
+        rules = [(rule.amount, rule.field, rule.discount) for rule in self.rules]
+        quantize = Decimal.quantize
+        results = []
+        append = results.append
+        for subtotal, points in carts:
+            subtotal = to_decimal(subtotal)
+            totals = {'subtotal': quantize(subtotal, CENT, ROUND_HALF_UP)}
+            charges = discounts = ZERO
+            for amount_of, field, is_discount in rules:
+                amount = amount_of(subtotal, points)
+                totals[field] = quantize(amount, CENT, ROUND_HALF_UP)
+                if is_discount:
+                    discounts += amount
+                else:
+                    charges += amount
+            totals['total_discount'] = quantize(discounts, CENT, ROUND_HALF_UP)
+            totals['total'] = quantize(subtotal + charges - discounts, CENT, ROUND_HALF_UP)
+            append(totals)
+        return results
+
+
+default_engine = PricingEngine()
+
+
+def cart_subtotal(cart_items):
+    return sum((to_decimal(item['Total']) for item in cart_items), ZERO)
+
+
+def cart_totals(subtotal, loyalty_points=None):
+    """Price one cart with the default rules (see PricingEngine.price)."""
+    return default_engine.price(subtotal, loyalty_points)
+
+
+def loyalty_discount(subtotal, points):
+    """Rand value of the user's points under the default loyalty rule."""
+    return to_cents(LoyaltyRule().amount(to_decimal(subtotal), points))
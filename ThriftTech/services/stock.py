@@ -0,0 +1,232 @@
+import os
+import threading
+
+from database import get_db_connection
+from migrations import ensure_schema
+from services.jobs import job_handler, schedule_periodic
+
+# stock control:
+# - putting an item in a (logged-in) cart reserves it for RESERVATION_SECONDS, so other
+#   buyers see it as taken; changing the line re-reserves, removing it releases it
+# - checkout takes the stock with one conditional UPDATE in the order's transaction:
+#   it only succeeds if every line still fits in stock minus what *other* carts hold,
+#   so two buyers can never both get the last unit
+# - expired reservations already count for nothing; a self-rescheduling job deletes
+#   them every SWEEP_SECONDS
+# a NULL Stock means the product isn't stock-tracked (never blocks, never decremented)
+
+RESERVATION_SECONDS = int(os.getenv('THRIFTTECH_RESERVATION_TTL', '900'))
+SWEEP_SECONDS = 300
+
+# what other users' live reservations hold of product p
+_HELD_BY_OTHERS = """
+    ISNULL((SELECT SUM(r.Quantity) FROM StockReservations r
+            WHERE r.ProductId = p.ProductId AND r.UserId <> ? AND r.ExpiresAt > GETDATE()), 0)
+"""
+
+# the product row lock (UPDLOCK, HOLDLOCK) queues concurrent reservations of one product
+_RESERVE_SQL = f"""
+    SET NOCOUNT ON
+    DECLARE @found BIT = 0, @available INT;
+    SELECT @found = 1, @available = p.Stock - {_HELD_BY_OTHERS}
+    FROM Products p WITH (UPDLOCK, HOLDLOCK) WHERE p.ProductId = ?;
+
+    IF @found = 1 AND (@available IS NULL OR @available >= ?)
+        MERGE StockReservations WITH (HOLDLOCK) AS target
+        USING (SELECT ? AS UserId, ? AS ProductId, ? AS Quantity) AS source
+            ON target.UserId = source.UserId AND target.ProductId = source.ProductId
+        WHEN MATCHED THEN
+            UPDATE SET Quantity = source.Quantity, ExpiresAt = DATEADD(second, ?, GETDATE())
+        WHEN NOT MATCHED THEN
+            INSERT (UserId, ProductId, Quantity, ExpiresAt)
+            VALUES (source.UserId, source.ProductId, source.Quantity, DATEADD(second, ?, GETDATE()));
+
+    SELECT @found AS Found, @available AS Available;
+    SET NOCOUNT OFF;
+"""
+
+
+class OutOfStock(Exception):
+    """Raised when an order wants more than is available; .shortages is {ProductId: available}."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(f"Not enough stock for products {sorted(shortages)}")
+
+
+_stats = {'reserved': 0, 'rejected': 0, 'released': 0, 'orders': 0, 'oversell_blocked': 0, 'swept': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+class StockService:
+    @staticmethod
+    def reserve_many(user_id, quantities):
+        """
+        Reserve {ProductId: cart quantity} for a user (0 releases the line). returns
+        {ProductId: units available} for the lines that couldn't be reserved
+        (0 for products that no longer exist).
+        """
+        if not quantities:
+            return {}
+        ensure_schema()
+        rejected = {}
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            for product_id, quantity in quantities.items():
+                if quantity <= 0:
+                    cursor.execute(
+                        "DELETE FROM StockReservations WHERE UserId = ? AND ProductId = ?", (user_id, product_id)
+                    )
+                    continue
+                cursor.execute(_RESERVE_SQL, (
+                    user_id, product_id, quantity,
+                    user_id, product_id, quantity, RESERVATION_SECONDS, RESERVATION_SECONDS,
+                ))
+                row = cursor.fetchone()
+                if not row.Found:
+                    rejected[product_id] = 0
+                elif row.Available is not None and row.Available < quantity:
+                    rejected[product_id] = max(0, int(row.Available))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        _count('reserved', len(quantities) - len(rejected))
+        _count('rejected', len(rejected))
+        return rejected
+
+    @staticmethod
+    def reserve(user_id, product_id, quantity):
+        """reserve_many for one line; returns None on success, else the units available."""
+        return StockService.reserve_many(user_id, {product_id: quantity}).get(product_id)
+
+    @staticmethod
+    def release(user_id, product_ids=None):
+        """Drop a user's reservations (all of them, or just these products)."""
+        ensure_schema()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            where, params = 'UserId = ?', [user_id]
+            if product_ids is not None:
+                product_ids = list(product_ids)
+                if not product_ids:
+                    return 0
+                where += f" AND ProductId IN ({', '.join('?' for _ in product_ids)})"
+                params += product_ids
+            cursor.execute(
+                f"SET NOCOUNT ON; DELETE FROM StockReservations WHERE {where}; SELECT @@ROWCOUNT; SET NOCOUNT OFF;",
+                params,
+            )
+            released = int(cursor.fetchone()[0])
+            conn.commit()
+        finally:
+            conn.close()
+        _count('released', released)
+        return released
+
+    @staticmethod
+    def take_for_order(cursor, user_id, items):
+        """
+        Decrement stock for [(ProductId, Quantity)] on the checkout cursor (no commit) and
+        drop the user's reservations. all or nothing: raises OutOfStock (the caller rolls
+        back) if any line doesn't fit in stock minus other users' reservations. the caller
+        invalidates the catalog once it has committed.
+        """
+        totals = {}
+        for product_id, quantity in items:
+            totals[int(product_id)] = totals.get(int(product_id), 0) + int(quantity)
+        if not totals:
+            return
+        rows = ', '.join('(?, ?)' for _ in totals)
+        params = [value for line in totals.items() for value in line]
+        # one UPDATE for every line; the final SELECT lists the lines it couldn't take
+        cursor.execute(
+            f"""
+            SET NOCOUNT ON
+            DECLARE @lines TABLE (ProductId INT PRIMARY KEY, Quantity INT);
+            DECLARE @taken TABLE (ProductId INT);
+            INSERT INTO @lines (ProductId, Quantity) VALUES {rows};
+
+            UPDATE p SET Stock = p.Stock - o.Quantity, UpdatedAt = GETDATE()
+            OUTPUT INSERTED.ProductId INTO @taken (ProductId)
+            FROM Products p WITH (UPDLOCK)
+            JOIN @lines o ON o.ProductId = p.ProductId
+            WHERE p.Stock IS NULL OR p.Stock - {_HELD_BY_OTHERS} >= o.Quantity;
+
+            SELECT o.ProductId, p.Stock - {_HELD_BY_OTHERS} AS Available
+            FROM @lines o
+            LEFT JOIN Products p ON p.ProductId = o.ProductId
+            WHERE o.ProductId NOT IN (SELECT ProductId FROM @taken);
+            SET NOCOUNT OFF;
+            """,
+            (*params, user_id, user_id),
+        )
+        shortages = {row.ProductId: max(0, int(row.Available or 0)) for row in cursor.fetchall()}
+        if shortages:
+            _count('oversell_blocked')
+            raise OutOfStock(shortages)
+        cursor.execute("DELETE FROM StockReservations WHERE UserId = ?", (user_id,))
+        _count('orders')
+
+    @staticmethod
+    def sweep_expired():
+        """Delete expired reservations; returns how many went."""
+        ensure_schema()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SET NOCOUNT ON; DELETE FROM StockReservations WHERE ExpiresAt <= GETDATE(); "
+                "SELECT @@ROWCOUNT; SET NOCOUNT OFF;"
+            )
+            swept = int(cursor.fetchone()[0])
+            conn.commit()
+        finally:
+            conn.close()
+        _count('swept', swept)
+        return swept
+
+    @staticmethod
+    def schedule_sweep():
+        """Queue the next sweep at the next SWEEP_SECONDS boundary (once, across processes)."""
+        return schedule_periodic('stock.sweep_reservations', SWEEP_SECONDS)
+
+
+@job_handler('stock.sweep_reservations')
+def sweep_reservations(payload):
+    try:
+        StockService.sweep_expired()
+    finally:
+        # keep the chain going even if this sweep failed (the retry is harmless)
+        StockService.schedule_sweep()
+
+
+def stock_stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot['reservation_seconds'] = RESERVATION_SECONDS
+    try:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) AS Lines, ISNULL(SUM(Quantity), 0) AS Units
+                FROM StockReservations WHERE ExpiresAt > GETDATE()
+            """)
+            row = cursor.fetchone()
+            snapshot['active_reservations'] = int(row.Lines)
+            snapshot['reserved_units'] = int(row.Units)
+        finally:
+            conn.close()
+    except Exception as e:
+        snapshot['active_reservations'] = f"unavailable: {e}"
+    return snapshot
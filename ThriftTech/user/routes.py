@@ -7,73 +7,22 @@ from flask import Flask, render_template, request, redirect, url_for, session, f
 # importing password security tools to hash and check passwords safely
 from werkzeug.security import generate_password_hash, check_password_hash
 # importing our custom database connection function
-from database import get_db_connection
-# importing loyalty program table setup function
-from services.transaction import _ensure_loyalty_table_exists
+from database import get_db_connection, insert_returning_id
+# importing the one-time schema migrations
+from migrations import ensure_schema
 # importing this blueprint to organize user-related routes
 from . import user_bp
 # importing models to work with invoices, cart, and products
 from models.invoice import Invoice
 from models.cart import Cart
 from models.product import Product
+# named column lists so the order pages skip the address/payment columns
+from models.columns import ORDER_COLUMNS
 
 # making sure all the order and invoice tables exist in database
 def _ensure_order_schema_exists():
-    # connecting to database to create necessary tables if they don't exist
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        # creating orders table if it doesn't already exist
-        cursor.execute(
-            """
-            IF OBJECT_ID('dbo.Orders', 'U') IS NULL
-            BEGIN
-                CREATE TABLE Orders (
-                    OrderId INT IDENTITY(1,1) PRIMARY KEY,
-                    UserId INT NOT NULL,
-                    TotalAmount DECIMAL(10,2) NOT NULL,
-                    TaxAmount DECIMAL(10,2) DEFAULT 0,
-                    ShippingAmount DECIMAL(10,2) DEFAULT 0,
-                    DiscountAmount DECIMAL(10,2) DEFAULT 0,
-                    Status NVARCHAR(20) DEFAULT 'pending',
-                    ShippingAddress NVARCHAR(MAX),
-                    PaymentMethod NVARCHAR(50),
-                    PaymentStatus NVARCHAR(20) DEFAULT 'pending',
-                    FOREIGN KEY (UserId) REFERENCES Users(UserId)
-                )
-            END
-
-            IF OBJECT_ID('dbo.OrderItems', 'U') IS NULL
-            BEGIN
-                CREATE TABLE OrderItems (
-                    OrderItemId INT IDENTITY(1,1) PRIMARY KEY,
-                    OrderId INT NOT NULL,
-                    ProductId INT NOT NULL,
-                    Quantity INT NOT NULL,
-                    Price DECIMAL(10,2) NOT NULL,
-                    FOREIGN KEY (OrderId) REFERENCES Orders(OrderId),
-                    FOREIGN KEY (ProductId) REFERENCES Products(ProductId)
-                )
-            END
-
-            IF OBJECT_ID('dbo.Invoices', 'U') IS NULL
-            BEGIN
-                CREATE TABLE Invoices (
-                    InvoiceId INT IDENTITY(1,1) PRIMARY KEY,
-                    UserId INT NOT NULL,
-                    OrderId INT NOT NULL,
-                    Total DECIMAL(10,2) NOT NULL,
-                    CreatedAt DATETIME DEFAULT GETDATE(),
-                    FOREIGN KEY (UserId) REFERENCES Users(UserId),
-                    FOREIGN KEY (OrderId) REFERENCES Orders(OrderId)
-                )
-            END
-            """
-        )
-        conn.commit()
-    finally:
-        conn.close()
-
+    # orders, order items and invoices are created by the migrations (no-op once they ran)
+    ensure_schema()
 
 
 # helper function to get database connection
@@ -109,7 +58,7 @@ def account():
 
     # loyalty points (ensure table exists first)
     try:
-        _ensure_loyalty_table_exists()
+        ensure_schema()
         cursor.execute("SELECT Points FROM LoyaltyPoints WHERE UserId = ?", (user_id,))
         lp = cursor.fetchone()
         loyalty_points = int(lp.Points) if lp else 0
@@ -280,10 +229,10 @@ def register():
                     flash('Email already exists. Please use a different email or try logging in.', 'error')
                     return redirect(url_for('user.register'))
                 
-                cursor.execute("""
-                    INSERT INTO Users (FullName, Username, PasswordHash, Email, Role) 
-                    VALUES (?, ?, ?, ?, ?)
-                """, (full_name, username, password_hash, email, 'customer'))
+                insert_returning_id(cursor, 'Users', {
+                    'FullName': full_name, 'Username': username, 'PasswordHash': password_hash,
+                    'Email': email, 'Role': 'customer',
+                }, 'UserId')
                 conn.commit()
                 
                 flash('Registration successful! Please log in.', 'success')
@@ -325,6 +274,12 @@ def login():
                 if user:
                     stored_password_hash = user.PasswordHash
                     if check_password_hash(stored_password_hash, password):
+                        # fold any anonymous cart into the saved one before switching users
+                        from services.cart_store import CartStore
+                        try:
+                            CartStore(session).merge_on_login(user.UserId)
+                        except Exception as e:
+                            print(f"Cart merge error: {e}")
                         session['logged_in'] = True
                         session['user_id'] = user.UserId
                         session['email'] = email
@@ -365,6 +320,10 @@ def login():
 
 @user_bp.route('/logout')
 def logout():
+    # write any queued cart changes before the session (and its cart) goes away
+    if 'user_id' in session:
+        from services.cart_store import cart_writer
+        cart_writer.flush(session['user_id'])
     session.clear()
     flash('You have been logged out successfully.', 'success')
     return redirect(url_for('home'))
@@ -376,16 +335,10 @@ def logout():
 def add_to_cart(product_id):
     """Add product to cart"""
     wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in (request.headers.get('Accept', '') or '')
-    if 'user_id' not in session:
-        if wants_json:
-            from flask import jsonify
-            return jsonify({'success': False, 'error': 'auth', 'message': 'Please log in to add items to cart'}), 401
-        flash('Please log in to add items to cart', 'error')
-        return redirect(url_for('user.login'))
-    
     try:
-        from models.cart import Cart
         from models.product import Product
+        from services.catalog_cache import catalog_cache
+        from services.cart_store import CartStore
         # accept quantity 
         quantity = 1
         if request.method == 'POST':
@@ -395,8 +348,8 @@ def add_to_cart(product_id):
         # clamp quantity between 1 and 10
         quantity = max(1, min(10, quantity))
 
-        # validate product exists
-        product = Product.get_by_id(product_id)
+        # validate product exists (cached catalog first, the database only for brand new products)
+        product = catalog_cache.get_product_index().get(product_id) or Product.get_by_id(product_id, 'list')
         if not product:
             if wants_json:
                 from flask import jsonify
@@ -404,18 +357,28 @@ def add_to_cart(product_id):
             flash('Product not found', 'error')
             return redirect(request.referrer or url_for('product_catalog'))
         
-        cart_item = Cart(user_id=session['user_id'], product_id=product_id, quantity=quantity)
-        if cart_item.save():
+        # the cart lives in the session; logged-in carts are saved in the background
+        store = CartStore(session)
+        if store.add(product_id, quantity):
             if wants_json:
                 from flask import jsonify
                 return jsonify({'success': True, 'message': 'Item added to cart'})
             flash('Item added to cart successfully!', 'success')
             return redirect(url_for('cart'))
+        elif product_id in store.rejected:
+            # the stock left (after other carts' reservations) can't cover it
+            left = store.rejected[product_id]
+            message = f'Only {left} left in stock' if left else 'This item is out of stock'
+            if wants_json:
+                from flask import jsonify
+                return jsonify({'success': False, 'error': 'out_of_stock', 'available': left, 'message': message}), 409
+            flash(message, 'error')
+            return redirect(request.referrer or url_for('product_catalog'))
         else:
             if wants_json:
                 from flask import jsonify
-                return jsonify({'success': False, 'error': 'server', 'message': 'Error adding item to cart'}), 500
-            flash('Error adding item to cart', 'error')
+                return jsonify({'success': False, 'error': 'full', 'message': 'Your cart is full'}), 400
+            flash('Your cart is full', 'error')
             
     except Exception as e:
         if wants_json:
@@ -426,15 +389,12 @@ def add_to_cart(product_id):
     
     return redirect(url_for('product_catalog'))
 
-## updating the cart 
-@user_bp.route('/update_cart/<int:cart_id>', methods=['POST'])
-def update_cart(cart_id):
+## updating the cart (cart lines are identified by product id)
+@user_bp.route('/update_cart/<int:product_id>', methods=['POST'])
+def update_cart(product_id):
     """Update cart item quantity"""
-    if 'user_id' not in session:
-        return redirect(url_for('user.login'))
-    
     try:
-        from models.cart import Cart
+        from services.cart_store import CartStore
         quantity = int(request.form.get('quantity', 1))
         # clamp quantity between 0 and 10 and also 0 is the removal 
         if quantity < 0:
@@ -442,11 +402,13 @@ def update_cart(cart_id):
         if quantity > 10:
             quantity = 10
         
-        if quantity > 0:
-            Cart.update_quantity(cart_id, session['user_id'], quantity)
+        store = CartStore(session)
+        store.set_quantity(product_id, quantity)
+        if product_id in store.rejected:
+            flash(f'Only {store.rejected[product_id]} left in stock', 'error')
+        elif quantity > 0:
             flash('Cart updated successfully!', 'success')
         else:
-            Cart.remove_item(cart_id, session['user_id'])
             flash('Item removed from cart', 'success')
             
     except Exception as e:
@@ -457,15 +419,12 @@ def update_cart(cart_id):
 
 # clearing or deleting the cart 
 
-@user_bp.route('/remove_from_cart/<int:cart_id>')
-def remove_from_cart(cart_id):
+@user_bp.route('/remove_from_cart/<int:product_id>')
+def remove_from_cart(product_id):
     """Remove item from cart"""
-    if 'user_id' not in session:
-        return redirect(url_for('user.login'))
-    
     try:
-        from models.cart import Cart
-        Cart.remove_item(cart_id, session['user_id'])
+        from services.cart_store import CartStore
+        CartStore(session).remove(product_id)
         flash('Item removed from cart', 'success')
     except Exception as e:
         flash('Error removing item from cart', 'error')
@@ -481,19 +440,22 @@ def checkout():
     if 'user_id' not in session:
         flash('Please log in to checkout', 'error')
         return redirect(url_for('user.login'))
-    from models.cart import Cart
     from models.invoice import Invoice
-    from services.transaction import TransactionService 
+    from services.checkout import CheckoutService
+    from services.loyalty import InsufficientPoints, balance_cache
+    from services.stock import OutOfStock
+    from services.cart_store import CartStore
 
     _ensure_order_schema_exists()
-    cart_items = Cart.get_user_cart(session['user_id'])
+    # save queued cart changes first so the order matches the saved cart, then price the
+    # lines from current product rows and the loyalty balance (one query)
+    store = CartStore(session)
+    store.persist()
+    cart_items, totals = store.summary(fresh=True)
     if not cart_items:
         flash('Your cart is empty', 'error')
         return redirect(url_for('cart'))
     
-    # calculate total with all transaction rules
-    totals = TransactionService.calculate_cart_totals(cart_items, session['user_id'])
-    
     # GET request - show checkout form
     if request.method == 'GET':
         return render_template('checkout.html', cart_items=cart_items, totals=totals)
@@ -507,34 +469,27 @@ def checkout():
                 flash(f'{field.replace("_", " ").title()} is required', 'error')
                 return render_template('checkout.html', cart_items=cart_items, totals=totals)
         
-        # create order
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO Orders (UserId, TotalAmount, Status) VALUES (?, ?, ?)", 
-                       (session['user_id'], totals['total'], 'completed'))
-        conn.commit()
-        order_id = cursor.execute("SELECT @@IDENTITY").fetchone()[0]
-        
-        # insert order items
-        for item in cart_items:
-            cursor.execute("INSERT INTO OrderItems (OrderId, ProductId, Quantity, Price) VALUES (?, ?, ?, ?)", 
-                           (order_id, item['ProductId'], item['Quantity'], item['Price']))
-        conn.commit()
-        conn.close()
-        
-        # generate invoice
-        invoice_id = Invoice.create(session['user_id'], order_id, totals['total'])
-        
-        # award loyalty points
-        points_earned = TransactionService.award_loyalty_points(session['user_id'], totals['total'])
-        
-        # use loyalty points if any discount was applied
-        if totals['loyalty_discount'] > 0:
-            points_used = int(totals['loyalty_discount'] / 0.10)
-            TransactionService.use_loyalty_points(session['user_id'], points_used)
-        
-        # clear cart
-        Cart.clear_user_cart(session['user_id'])
+        # stock, order, items, invoice, points redemption and emptying the cart in one transaction;
+        # earned points and the invoice email follow in background jobs
+        try:
+            result = CheckoutService.place_order(session['user_id'], cart_items, totals)
+        except InsufficientPoints:
+            # the balance changed since the page was priced (e.g. another checkout)
+            balance_cache.discard(session['user_id'])
+            flash('Your loyalty points balance changed. Please review your order.', 'error')
+            return redirect(url_for('user.checkout'))
+        except OutOfStock as e:
+            # someone else bought the last units since the items went into the cart
+            titles = [item['Title'] for item in cart_items if item['ProductId'] in e.shortages]
+            flash(f"Not enough stock left for: {', '.join(titles) or 'some items'}. Please update your cart.", 'error')
+            return redirect(url_for('cart'))
+        except Exception as e:
+            print(f"Checkout failed: {e}")
+            flash('Could not complete your order. Please try again.', 'error')
+            return render_template('checkout.html', cart_items=cart_items, totals=totals)
+        invoice_id = result['invoice_id']
+        points_earned = result['points_earned']
+        store.clear()
         
         flash(f'Checkout complete! Invoice generated. You earned {points_earned} loyalty points!', 'success')
         return redirect(url_for('user.invoice_detail', invoice_id=invoice_id))
@@ -575,8 +530,8 @@ def orders():
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        """
-        SELECT OrderId, UserId, TotalAmount, TaxAmount, ShippingAmount, DiscountAmount, Status
+        f"""
+        SELECT {ORDER_COLUMNS.select('list')}
         FROM Orders WHERE UserId = ? ORDER BY OrderId DESC
         """,
         (session['user_id'],)
@@ -594,7 +549,7 @@ def order_detail(order_id):
     _ensure_order_schema_exists()
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM Orders WHERE OrderId = ?", (order_id,))
+    cursor.execute(f"SELECT {ORDER_COLUMNS.select('list')} FROM Orders WHERE OrderId = ?", (order_id,))
     order = cursor.fetchone()
     if not order or order.UserId != session['user_id']:
         conn.close()
@@ -667,14 +622,8 @@ def reorder(order_id):
     cursor.execute("SELECT ProductId, Quantity FROM OrderItems WHERE OrderId = ?", (order_id,))
     items = cursor.fetchall()
     conn.close()
-    from models.cart import Cart
-    added = 0
-    for it in items:
-        try:
-            ci = Cart(user_id=session['user_id'], product_id=it.ProductId, quantity=int(it.Quantity))
-            ci.save()
-            added += 1
-        except Exception:
-            pass
+    from services.cart_store import CartStore
+    # straight into the session cart, saved in one batch by the cart writer
+    added = CartStore(session).add_many([(it.ProductId, it.Quantity) for it in items])
     flash(f'Re-added {added} items to your cart.', 'success')
     return redirect(url_for('cart'))
\ No newline at end of file